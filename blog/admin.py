@@ -1,5 +1,73 @@
-from django.contrib import admin
-from .models import Post, Comment
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models import Case, IntegerField, When
+
+from .models import Post, Comment, OutgoingEmail
+from .pagination import EstimatedCountPaginator
+from .search import get_backend
+
+
+class AutocompleteFilter(admin.ListFilter):
+    """
+    Фильтр списка объектов по внешнему ключу с полем автодополнения.
+    В отличие от фильтра по полю, он не загружает все связанные объекты:
+    варианты запрашиваются по мере ввода у представления автодополнения
+    панели администратора (по search_fields администратора связанной модели).
+    """
+
+    template = 'admin/blog/autocomplete_filter.html'
+
+    # Имя внешнего ключа, по которому фильтруется список
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.field = model._meta.get_field(self.field_name)
+        self.title = self.field.verbose_name
+        super().__init__(request, params, model, model_admin)
+        self.parameter_name = f'{self.field_name}__{self.field.target_field.name}__exact'
+        value = params.pop(self.parameter_name, None)
+        # В Django 5 значения параметров передаются списками
+        self.value = value[-1] if isinstance(value, list) else value
+        if self.value:
+            self.used_parameters[self.parameter_name] = self.value
+        # Поле формы задает виджету варианты выбора, из которых загружается
+        # только выбранный объект
+        self.widget = forms.ModelChoiceField(
+            queryset=self.field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(self.field, model_admin.admin_site),
+            required=False,
+        ).widget
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.parameter_name]
+
+    def queryset(self, request, queryset):
+        if self.value:
+            return queryset.filter(**{self.parameter_name: self.value})
+        return queryset
+
+    def choices(self, changelist):
+        yield {
+            'selected': not self.value,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'All',
+        }
+
+    def rendered_widget(self):
+        """ Поле автодополнения с выбранным объектом (загружается только он) """
+        return self.widget.render(self.parameter_name, self.value, attrs={'id': f'filter_{self.field_name}'})
+
+
+class AuthorFilter(AutocompleteFilter):
+    """ Фильтр постов по автору с автодополнением """
+
+    field_name = 'author'
 
 
 @admin.register(Post) # регистрирует модель в панели администратора
@@ -13,17 +81,29 @@ class PostAdmin(admin.ModelAdmin):
     )
 
     # Создает фильтр в панели администратора по 
-    # указанным полям.
+    # указанным полям. Автор выбирается полем автодополнения,
+    # а не списком всех пользователей.
     list_filter = (
-        'status', 'created', 'publish', 'author',
+        'status', 'created', 'publish', AuthorFilter,
     )
 
     # Добавляет строку поиска и определяет список полей,
-    # по которым будет происходить поиск.
+    # по которым будет происходить поиск. Поиск выполняет
+    # полнотекстовый бэкенд (см. get_search_results).
     search_fields = (
         'title', 'body',
     )
 
+    # Автор загружается тем же запросом, что и посты страницы
+    list_select_related = (
+        'author',
+    )
+
+    # Число постов большой таблицы берется из статистики базы данных,
+    # а общее число постов без фильтров не подсчитывается
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     # Позволяет автоматически заполнять поле slag при
     # вводе заголовка статьи.
     prepopulated_fields = {
@@ -44,6 +124,62 @@ class PostAdmin(admin.ModelAdmin):
         'status', 'publish',
     )
 
+    @property
+    def media(self):
+        # Скрипты и стили поля автодополнения фильтра по автору
+        return super().media + AutocompleteSelect(
+            Post._meta.get_field('author'), self.admin_site
+        ).media
+
+    def get_list_filter(self, request):
+        # На больших таблицах фильтр по дате создания не используется:
+        # по этому полю нет индекса
+        if settings.BLOG_ADMIN_LARGE_TABLES:
+            return tuple(name for name in self.list_filter if name != 'created')
+        return self.list_filter
+
+    def get_ordering(self, request):
+        # На больших таблицах порядок соответствует индексу (status, -publish, -id)
+        if settings.BLOG_ADMIN_LARGE_TABLES:
+            return ('status', '-publish', '-id')
+        return self.ordering
+
+    def get_changelist_instance(self, request):
+        # Навигация по иерархии дат для каждого уровня выбирает все
+        # различные даты публикации, поэтому на больших таблицах отключается
+        changelist = super().get_changelist_instance(request)
+        if settings.BLOG_ADMIN_LARGE_TABLES:
+            changelist.date_hierarchy = None
+        return changelist
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Ищет посты (в том числе неопубликованные) по индексу полнотекстового
+        бэкенда вместо LIKE '%...%' по заголовкам и телам всех постов.
+        Возвращается не больше BLOG_SEARCH_MAX_RESULTS наиболее
+        релевантных постов, о чем редактор предупреждается сообщением.
+        """
+        if not search_term:
+            return queryset, False
+        backend = get_backend()
+        post_ids = backend.search(search_term, published_only=False)
+        if len(post_ids) >= backend.max_results:
+            self.message_user(
+                request,
+                f'Only the {backend.max_results} most relevant posts are shown. '
+                'Refine the search to see the others.',
+                messages.WARNING,
+            )
+        queryset = queryset.filter(id__in=post_ids)
+        # Найденные посты выводятся в порядке релевантности, если порядок
+        # не выбран в заголовке столбца
+        if ORDER_VAR not in request.GET:
+            queryset = queryset.order_by(Case(
+                *[When(id=post_id, then=position) for position, post_id in enumerate(post_ids)],
+                output_field=IntegerField(),
+            ))
+        return queryset, False
+
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -58,3 +194,54 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = (
         'name', 'email', 'body'
     )
+
+    # Пост выбирается по идентификатору, а не списком всех постов
+    raw_id_fields = (
+        'post',
+    )
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # Действия модерации над выбранными комментариями. Статус меняется
+    # одним UPDATE (см. CommentQuerySet.set_active)
+    actions = (
+        'approve_comments', 'hide_comments',
+    )
+
+    def get_queryset(self, request):
+        # Пост выводится в списке, поэтому загружается тем же запросом,
+        # что и комментарии страницы (иначе по запросу на комментарий).
+        # Из поста нужен только заголовок, поэтому тело поста, его html
+        # и поисковый вектор не загружаются
+        return super().get_queryset(request).select_related('post').defer(
+            'post__body', 'post__body_html', 'post__body_excerpt', 'post__search_vector'
+        )
+
+    @admin.action(description='Approve selected comments')
+    def approve_comments(self, request, queryset):
+        """ Делает выбранные комментарии активными """
+        updated = queryset.set_active(True)
+        self.message_user(request, f'{updated} comment(s) approved.')
+
+    @admin.action(description='Hide selected comments')
+    def hide_comments(self, request, queryset):
+        """ Скрывает выбранные комментарии """
+        updated = queryset.set_active(False)
+        self.message_user(request, f'{updated} comment(s) hidden.')
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    """ Класс внешнего вида очереди писем в панели администратора """
+
+    list_display = (
+        'subject', 'to', 'status', 'attempts', 'next_attempt', 'sent'
+    )
+    list_filter = (
+        'status',
+    )
+    search_fields = (
+        'subject', 'to'
+    )
+
@@ -0,0 +1,90 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivePeriod, Post
+
+
+# Архив публикаций по годам, месяцам и дням. Число постов за каждый
+# период хранится в таблице ArchivePeriod и пересчитывается целиком за
+# затронутый год при публикации, снятии с публикации, переносе и удалении
+# поста (см. blog.signals), поэтому страницы архива и дерево архива в
+# боковой панели не выполняют агрегирующих запросов по таблице постов.
+
+
+def _periods(posts) -> list[ArchivePeriod]:
+    """ Строки архива за дни, месяцы и годы по опубликованным постам posts """
+    # Даты публикации приводятся к текущему часовому поясу в базе данных
+    day_counts = (
+        posts.annotate(day=TruncDate('publish')).order_by()
+        .values_list('day').annotate(total=Count('id'))
+    )
+    counts = Counter()
+    for day, total in day_counts:
+        counts[day.year, day.month, day.day] += total
+        counts[day.year, day.month, 0] += total
+        counts[day.year, 0, 0] += total
+    return [
+        ArchivePeriod(year=year, month=month, day=day, post_count=total)
+        for (year, month, day), total in counts.items()
+    ]
+
+
+def refresh_archive(dates) -> None:
+    """
+    Пересчитывает архив за годы, к которым относятся даты публикации dates
+    (прежняя и новая дата измененного поста). Периоды без постов удаляются.
+    """
+    years = {timezone.localtime(value).year for value in dates if value is not None}
+    for year in years:
+        rows = _periods(Post.published.published_on(year))
+        periods = {(row.month, row.day) for row in rows}
+        with transaction.atomic():
+            # Строки заменяются через INSERT ... ON CONFLICT, а удаляются
+            # только периоды без постов, поэтому параллельный пересчет того
+            # же года не нарушает уникальность периода
+            existing = ArchivePeriod.objects.filter(year=year).values_list('id', 'month', 'day')
+            ArchivePeriod.objects.filter(
+                id__in=[pk for pk, *period in existing if tuple(period) not in periods]
+            ).delete()
+            ArchivePeriod.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['year', 'month', 'day'],
+                update_fields=['post_count'],
+            )
+
+
+def rebuild_archive(batch_size=1000) -> int:
+    """ Полностью пересчитывает архив одним агрегирующим запросом. Возвращает число периодов """
+    rows = _periods(Post.published.all())
+    with transaction.atomic():
+        ArchivePeriod.objects.all().delete()
+        ArchivePeriod.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def archive_children(period: ArchivePeriod):
+    """ Возвращает набор запросов вложенных периодов: месяцев года или дней месяца """
+    if period.day:
+        return ArchivePeriod.objects.none()
+    if period.month:
+        return ArchivePeriod.objects.filter(year=period.year, month=period.month, day__gt=0)
+    return ArchivePeriod.objects.filter(year=period.year, month__gt=0, day=0)
+
+
+def archive_tree() -> list[dict]:
+    """
+    Возвращает годы архива с месяцами (строки без разбивки по дням) от
+    новых к старым. Выполняет один запрос.
+    """
+    years = {}
+    for period in ArchivePeriod.objects.filter(day=0).order_by('-year', 'month'):
+        if not period.month:
+            years[period.year] = {'period': period, 'months': []}
+        elif period.year in years:
+            years[period.year]['months'].insert(0, period)
+    return list(years.values())
@@ -0,0 +1,176 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.sites.shortcuts import get_current_site
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render
+from django.views.decorators.http import condition
+from taggit.models import Tag
+
+from .archive import archive_children
+from .comments import comment_page_json, comment_paginator
+from .feeds import aload_feed, feed_etag, feed_last_modified
+from .forms import CommentForm, SearchForm
+from .http import public_page
+from .models import ArchivePeriod, Post, SimilarPost, TagStats
+from .pagination import InvalidCursor, apaginate_ids, apaginate_posts
+from .search import search_posts
+from .sitemaps import (
+    asection_state, astream_urls, render_index, section_etag,
+    section_last_modified, section_page, section_rows, sections_queryset,
+)
+
+
+# Асинхронные версии публичных представлений блога для обслуживания
+# через ASGI (см. BLOG_ASYNC_VIEWS). Запросы к базе данных выполняются
+# асинхронным ORM, а прорисовка шаблонов, в которой теги боковой панели
+# могут обращаться к базе данных, - в потоке через sync_to_async.
+arender = sync_to_async(render)
+
+
+@public_page
+async def post_list(request, tag_slug=None):
+    """ Асинхронное представление списка постов на странице """
+    posts = Post.published.for_list()
+    tag = None
+
+    if tag_slug:
+        stats = await TagStats.objects.select_related('tag').filter(tag__slug=tag_slug).afirst()
+        if stats is None:
+            tag, post_ids = await aget_object_or_404(Tag, slug=tag_slug), []
+        else:
+            tag, post_ids = stats.tag, stats.post_ids
+        posts = await apaginate_ids(request, post_ids, 3, posts)
+    else:
+        posts = await apaginate_posts(request, posts, 3)
+
+    context = {'posts': posts, 'tag': tag}
+    return await arender(request, 'blog/post/list.html', context)
+
+
+@public_page
+async def post_archive(request, year, month=None, day=None):
+    """ Асинхронное представление архива постов за год, месяц или день """
+    period = await aget_object_or_404(ArchivePeriod, year=year, month=month or 0, day=day or 0)
+    posts = Post.published.for_list().published_on(year, month, day)
+    posts = await apaginate_posts(request, posts, 3)
+    children = [child async for child in archive_children(period)]
+
+    context = {'posts': posts, 'period': period, 'children': children}
+    return await arender(request, 'blog/post/list.html', context)
+
+
+@public_page
+async def post_detail(request, year, month, day, post):
+    """ Асинхронное представление одиночного поста на странице """
+    post = await aget_object_or_404(
+        Post.published.published_on(year, month, day).select_related('author'),
+        slug=post,
+    )
+
+    async def load_comments():
+        return await comment_paginator(post).apage()
+
+    async def load_similar_posts():
+        links = SimilarPost.objects.filter(
+            post=post, neighbor__status=Post.Status.PUBLISHED
+        ).select_related('neighbor').order_by('-score', '-neighbor__publish')[:4]
+        return [link.neighbor async for link in links]
+
+    # Комментарии и похожие посты не зависят друг от друга,
+    # поэтому загружаются одновременно
+    comments, similar_posts = await asyncio.gather(load_comments(), load_similar_posts())
+
+    context = {
+        'post': post, 'comments': comments, 'form': CommentForm(), 'similar_posts': similar_posts
+    }
+    return await arender(request, 'blog/post/detail.html', context)
+
+
+@public_page
+async def post_comments(request, post_id):
+    """ Асинхронное представление страницы комментариев поста """
+    post = await aget_object_or_404(Post.published.only('id'), id=post_id)
+
+    paginator = comment_paginator(post)
+    try:
+        comments = await paginator.apage(request.GET.get('cursor'))
+    except InvalidCursor:
+        comments = await paginator.apage()
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse(comment_page_json(post, comments))
+
+    context = {'post': post, 'comments': comments}
+    return await arender(request, 'blog/post/includes/comments.html', context)
+
+
+@public_page
+async def post_search(request):
+    """ Асинхронное представление для поиска """
+    form = SearchForm()
+    query = None
+    results = []
+
+    if 'query' in request.GET:
+        form = SearchForm(request.GET)
+        if form.is_valid():
+            query = form.cleaned_data['query']
+            post_ids = await sync_to_async(search_posts)(query)
+            results = await apaginate_ids(request, post_ids, 10, Post.published.for_list())
+
+    context = {'form': form, 'query': query, 'results': results}
+    return await arender(request, 'blog/post/search.html', context)
+
+
+@condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
+async def _post_feed(request, tag_slug=None):
+    feed = request._blog_feed
+    return HttpResponse(feed['content'], content_type=feed['content_type'])
+
+
+async def post_feed(request, tag_slug=None):
+    """ Асинхронное представление новостной ленты (общей или по тегу) """
+    # Лента загружается из кеша заранее асинхронно, так как condition()
+    # вызывает функции валидаторов синхронно
+    await aload_feed(request, tag_slug)
+    return await _post_feed(request, tag_slug)
+
+
+# Заголовок, которым представления карты сайта Django запрещают
+# индексировать саму карту сайта
+X_ROBOTS_TAG = 'noindex, noodp, noarchive'
+
+
+async def asite_url(request) -> str:
+    """ Асинхронная версия blog.sitemaps.site_url() """
+    site = await sync_to_async(get_current_site)(request)
+    return f'{request.scheme}://{site.domain}'
+
+
+@public_page
+async def sitemap_index(request):
+    """ Асинхронное представление индекса карты сайта """
+    sections = [section async for section in sections_queryset()]
+    response = HttpResponse(render_index(await asite_url(request), sections), content_type='application/xml')
+    response.headers['X-Robots-Tag'] = X_ROBOTS_TAG
+    return response
+
+
+@condition(etag_func=section_etag, last_modified_func=section_last_modified)
+async def _sitemap_section(request, year, month):
+    page = section_page(request, request._blog_sitemap_section['count'])
+    rows = section_rows(year, month, page)
+    response = StreamingHttpResponse(
+        astream_urls(await asite_url(request), rows), content_type='application/xml'
+    )
+    response.headers['X-Robots-Tag'] = X_ROBOTS_TAG
+    return response
+
+
+async def sitemap_section(request, year, month):
+    """ Асинхронное представление части карты сайта за месяц """
+    # Состояние части вычисляется заранее асинхронно, так как condition()
+    # вызывает функции валидаторов синхронно
+    await asection_state(request, year, month)
+    return await _sitemap_section(request, year, month)
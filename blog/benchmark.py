@@ -0,0 +1,330 @@
+import asyncio
+import math
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from itertools import cycle, islice
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count
+from django.template import Engine, RequestContext, engines
+from django.template.backends.django import DjangoTemplates
+from django.test import AsyncClient, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from taggit.models import Tag
+
+from .archive import archive_tree
+from .comments import comment_paginator
+from .forms import CommentForm
+from .models import Post, SimilarPost
+from .pagination import KeysetPaginator, paginate_posts
+from .tagstats import tag_cloud_entries
+
+
+def percentile(values, p: float) -> float:
+    """ Возвращает p-й процентиль (0-100) значений методом ближайшего ранга """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(latencies, elapsed: float, errors: int = 0) -> dict:
+    """ Возвращает сводку нагрузочного теста: пропускную способность и задержки в мс """
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50': round(percentile(latencies, 50) * 1000, 2),
+        'p95': round(percentile(latencies, 95) * 1000, 2),
+        'p99': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def run_wsgi(urls, requests: int, concurrency: int) -> dict:
+    """
+    Выполняет requests запросов к urls через обработчик WSGI
+    в concurrency потоках и возвращает сводку
+    """
+    def worker(worker_urls):
+        client = Client()
+        latencies, errors = [], 0
+        try:
+            for url in worker_urls:
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code >= 400
+        finally:
+            # Каждый поток открывает собственное соединение с базой данных
+            connections.close_all()
+        return latencies, errors
+
+    plan = list(islice(cycle(urls), requests))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, [plan[i::concurrency] for i in range(concurrency)]))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+    return summarize(latencies, elapsed, sum(errors for _, errors in results))
+
+
+def run_asgi(urls, requests: int, concurrency: int) -> dict:
+    """
+    Выполняет requests запросов к urls через обработчик ASGI,
+    держа не больше concurrency одновременных запросов, и возвращает сводку
+    """
+    async def main():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+
+        async def fetch(url):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code >= 400
+
+        start = time.perf_counter()
+        await asyncio.gather(*(fetch(url) for url in islice(cycle(urls), requests)))
+        return summarize(latencies, time.perf_counter() - start, errors)
+
+    return asyncio.run(main())
+
+
+def endpoint_urls() -> dict:
+    """
+    Возвращает url-адреса публичных страниц блога для нагрузочного теста,
+    выбирая пост, тег и месяц с наибольшим объемом данных
+    """
+    post = Post.published.order_by('-active_comment_count', '-publish').first()
+    if post is None:
+        return {}
+    tag = Tag.objects.annotate(posts=Count('taggit_taggeditem_items')).order_by('-posts').first()
+    next_cursor = KeysetPaginator(Post.published.for_list(), 3).page().next_cursor
+    query = post.title.split()[0]
+
+    urls = {
+        'post_list': reverse('blog:post_list'),
+        'post_list_next_page': reverse('blog:post_list') + (f'?cursor={next_cursor}' if next_cursor else ''),
+        'post_list_offset_page': reverse('blog:post_list') + '?page=2',
+        'post_detail': post.get_absolute_url(),
+        'post_search': reverse('blog:post_search') + f'?query={query}',
+        'post_feed': reverse('blog:post_feed'),
+        'sitemap_index': reverse('sitemap_index'),
+        'sitemap_section': reverse('sitemap_section', args=[post.publish.year, post.publish.month]),
+    }
+    if tag is not None:
+        urls['post_list_by_tag'] = reverse('blog:post_list_by_tag', args=[tag.slug])
+        urls['post_feed_by_tag'] = reverse('blog:post_feed_by_tag', args=[tag.slug])
+    return urls
+
+
+def _fetch(client, url):
+    """ Выполняет запрос и читает ответ целиком (включая потоковый) """
+    response = client.get(url)
+    if response.streaming:
+        b''.join(response)
+    return response
+
+
+def measure_endpoint(client, url, iterations: int, warmup: int = 3, cold_cache: bool = False) -> dict:
+    """
+    Измеряет страницу url: процентили задержки (мс) по iterations запросам,
+    число SQL-запросов ко всем базам данных и пиковый объем выделенной
+    памяти (КБ) одного запроса. С cold_cache кеш по умолчанию сбрасывается
+    перед каждым запросом, поэтому этот режим нельзя использовать с общим
+    кешем рабочего сервера
+    """
+    for _ in range(warmup):
+        _fetch(client, url)
+
+    latencies, errors = [], 0
+    for _ in range(iterations):
+        if cold_cache:
+            cache.clear()
+        start = time.perf_counter()
+        response = _fetch(client, url)
+        latencies.append(time.perf_counter() - start)
+        errors += response.status_code >= 400
+
+    # Запросы и память измеряются отдельным запросом, так как
+    # tracemalloc замедляет выполнение. Запросы учитываются по всем
+    # подключениям, в том числе к репликам (см. blog.routers)
+    if cold_cache:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(connection))
+                for connection in connections.all(initialized_only=False)
+            ]
+            _fetch(client, url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'url': url,
+        'iterations': iterations,
+        'errors': errors,
+        'mean': round(sum(latencies) / len(latencies) * 1000, 2),
+        'p50': round(percentile(latencies, 50) * 1000, 2),
+        'p95': round(percentile(latencies, 95) * 1000, 2),
+        'p99': round(percentile(latencies, 99) * 1000, 2),
+        'queries': sum(len(queries.captured_queries) for queries in captured),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    Сравнивает результаты двух прогонов по страницам. Возвращает строки
+    (страница, метрика, было, стало, изменение в %, признак регрессии).
+    Регрессией считается рост p95 или памяти больше чем на threshold %
+    и любой рост числа запросов
+    """
+    rows = []
+    for name, result in current['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        for metric in ('p50', 'p95', 'queries', 'peak_kb'):
+            old, new = before[metric], result[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            if metric == 'queries':
+                regression = new > old
+            else:
+                regression = metric != 'p50' and change > threshold
+            rows.append((name, metric, old, new, round(change, 1), regression))
+    return rows
+
+
+# Загрузчики шаблонов без кеширования, как при APP_DIRS = True
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+class CountingEngine(Engine):
+    """
+    Движок шаблонов, считающий загрузки шаблонов: самого шаблона,
+    родительских шаблонов extends, шаблонов include и тегов включения
+    """
+
+    loads = 0
+
+    def find_template(self, name, dirs=None, skip=None):
+        self.loads += 1
+        return super().find_template(name, dirs, skip)
+
+
+def template_engine(cached: bool) -> CountingEngine:
+    """
+    Возвращает движок шаблонов с настройками проекта и кеширующим
+    (cached) или обычными загрузчиками шаблонов
+    """
+    base = next(
+        backend.engine for backend in engines.all() if isinstance(backend, DjangoTemplates)
+    )
+    return CountingEngine(
+        dirs=base.dirs,
+        context_processors=base.context_processors,
+        loaders=[('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)] if cached else TEMPLATE_LOADERS,
+        string_if_invalid=base.string_if_invalid,
+        libraries=base.libraries,
+        autoescape=base.autoescape,
+    )
+
+
+def template_contexts(request) -> dict:
+    """
+    Возвращает контексты прорисовки шаблонов блога, построенные так же,
+    как в представлениях: страницы списка и поста, а также шаблонов,
+    подключаемых через include и теги включения боковой панели
+    """
+    post = Post.published.order_by('-active_comment_count', '-publish').select_related('author').first()
+    if post is None:
+        return {}
+    posts = paginate_posts(request, Post.published.for_list(), 3)
+    comments = comment_paginator(post).page()
+    similar_posts = [
+        link.neighbor for link in SimilarPost.objects.filter(
+            post=post, neighbor__status=Post.Status.PUBLISHED
+        ).select_related('neighbor').order_by('-score', '-neighbor__publish')[:4]
+    ]
+    return {
+        'blog/post/list.html': {'posts': posts, 'tag': None},
+        'blog/post/detail.html': {
+            'post': post, 'comments': comments, 'form': CommentForm(), 'similar_posts': similar_posts
+        },
+        'pagination.html': {'page': posts},
+        'blog/post/includes/comments.html': {'post': post, 'comments': comments},
+        'blog/post/includes/comment_form.html': {'post': post, 'form': CommentForm()},
+        'blog/post/latest_posts.html': {
+            'latest_posts': list(Post.published.for_links().order_by('-publish')[:3])
+        },
+        'blog/post/tag_cloud.html': {'tags': tag_cloud_entries(30)},
+        'blog/post/archive_tree.html': {'years': archive_tree()},
+    }
+
+
+def measure_template(engine: CountingEngine, name: str, context: dict, request,
+                     iterations: int, warmup: int = 5) -> dict:
+    """
+    Измеряет прорисовку шаблона name движком engine: процентили времени
+    (мс) по iterations прорисовкам, включая загрузку шаблона, и число
+    загруженных за одну прорисовку шаблонов
+    """
+    def render():
+        return engine.get_template(name).render(RequestContext(request, context))
+
+    for _ in range(warmup):
+        render()
+
+    timings = []
+    loads = engine.loads
+    for _ in range(iterations):
+        start = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'mean': round(sum(timings) / len(timings) * 1000, 3),
+        'p50': round(percentile(timings, 50) * 1000, 3),
+        'p95': round(percentile(timings, 95) * 1000, 3),
+        'loads': round((engine.loads - loads) / iterations, 1),
+    }
+
+
+def measure_templates(names=None, iterations: int = 200, warmup: int = 5) -> dict:
+    """
+    Измеряет прорисовку шаблонов блога с кеширующим загрузчиком и без
+    него. Данные боковой панели берутся из прогретого кеша, поэтому
+    измеряется работа движка шаблонов, а не запросы к базе данных.
+    Возвращает результаты по шаблонам в режимах uncached и cached
+    """
+    request = RequestFactory().get('/blog/')
+    request.user = AnonymousUser()
+    contexts = template_contexts(request)
+    if names:
+        contexts = {name: context for name, context in contexts.items() if name in names}
+
+    results = {}
+    for name, context in contexts.items():
+        results[name] = {
+            mode: measure_template(template_engine(cached), name, context, request, iterations, warmup)
+            for mode, cached in (('uncached', False), ('cached', True))
+        }
+    return results
@@ -0,0 +1,134 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+
+# Ключ, хранящий текущее поколение данных боковой панели. Ключи кеша
+# панели содержат номер поколения, поэтому для сброса всех данных
+# панели достаточно сменить поколение, не перечисляя ключи.
+SIDEBAR_GENERATION_KEY = 'blog:sidebar:generation'
+
+# Ключ, хранящий время последнего изменения постов или комментариев.
+# По нему вычисляются валидаторы ETag/Last-Modified публичных страниц
+# и префикс ключей кеша страниц (см. blog.http).
+LAST_MODIFIED_KEY = 'blog:last_modified'
+
+# Ключ поколения данных боковой панели, зависящих от комментариев
+# (самые комментируемые посты). Комментарии сменяют только его.
+COMMENTS_GENERATION_KEY = 'blog:sidebar:comments_generation'
+
+# Данные боковой панели, зависящие от комментариев
+COMMENT_SIDEBAR = {'most_commented_posts'}
+
+# Ключ, хранящий идентификаторы самых комментируемых постов в том порядке,
+# в котором они выведены в боковой панели. Если комментарий меняет этот
+# список, то меняется боковая панель всех страниц блога.
+MOST_COMMENTED_KEY = 'blog:most_commented'
+
+# Префикс ключей, хранящих время последнего изменения отдельной страницы
+# (url-адреса). Комментарии к посту меняют только страницу поста, поэтому
+# сбрасывают только ее, а не все страницы блога.
+PAGE_MODIFIED_KEY_PREFIX = 'blog:page_modified:'
+
+# Ключ, хранящий время последней записи в базу данных блога (включая
+# комментарии). По нему маршрутизатор реплик определяет, могут ли реплики
+# отставать (см. blog.routers).
+LAST_WRITE_KEY = 'blog:last_write'
+
+# Префикс ключей, хранящих готовый XML новостных лент по схеме и хосту
+# запроса (см. blog.feeds). Общая лента хранится под ключом с пустым
+# слагом тега.
+FEED_KEY_PREFIX = 'blog:feed:'
+
+
+def _generation(key: str) -> int:
+    """ Возвращает текущее поколение кеша, создавая его при отсутствии """
+    return cache.get_or_set(key, time.time_ns, timeout=None)
+
+
+def _bump(key: str) -> None:
+    """ Сменяет поколение кеша, делая недоступными все ранее сохраненные ключи """
+    cache.set(key, time.time_ns(), timeout=None)
+
+
+def sidebar_key(name: str, *args) -> str:
+    """ Возвращает ключ кеша для данных боковой панели """
+    parts = [str(_generation(SIDEBAR_GENERATION_KEY)), name, *map(str, args)]
+    if name in COMMENT_SIDEBAR:
+        parts.insert(1, str(_generation(COMMENTS_GENERATION_KEY)))
+    return 'blog:sidebar:' + ':'.join(parts)
+
+
+def cached_sidebar(name: str, compute, *args):
+    """
+    Возвращает данные боковой панели из кеша. При промахе вычисляет
+    их функцией compute и сохраняет на BLOG_SIDEBAR_CACHE_TIMEOUT секунд.
+    """
+    return cache.get_or_set(
+        sidebar_key(name, *args), compute, timeout=settings.BLOG_SIDEBAR_CACHE_TIMEOUT
+    )
+
+
+def invalidate_sidebar() -> None:
+    """ Сбрасывает кешированные данные боковой панели """
+    _bump(SIDEBAR_GENERATION_KEY)
+
+
+def set_last_modified(value) -> None:
+    """ Сохраняет время последнего изменения содержимого блога """
+    cache.set(LAST_MODIFIED_KEY, value, timeout=None)
+
+
+def content_changed() -> None:
+    """
+    Сбрасывает кеши, зависящие от постов и комментариев: данные боковой
+    панели и закешированные страницы (сменой времени последнего изменения)
+    """
+    invalidate_sidebar()
+    now = timezone.now()
+    cache.set_many({LAST_MODIFIED_KEY: now, LAST_WRITE_KEY: now}, timeout=None)
+
+
+def page_modified_key(path: str) -> str:
+    """ Возвращает ключ времени последнего изменения страницы path """
+    return PAGE_MODIFIED_KEY_PREFIX + path
+
+
+def remember_most_commented(post_ids) -> None:
+    """ Запоминает самые комментируемые посты, выведенные в боковой панели """
+    cache.set(MOST_COMMENTED_KEY, list(post_ids), timeout=None)
+
+
+def shown_most_commented():
+    """ Возвращает выведенные в боковой панели самые комментируемые посты или None """
+    return cache.get(MOST_COMMENTED_KEY)
+
+
+def comments_changed(paths, most_commented_changed: bool = False) -> None:
+    """
+    Сбрасывает кеши, зависящие от комментариев к постам со страницами
+    paths: сами эти страницы и самые комментируемые посты боковой панели.
+    Остальные страницы блога комментарии не меняют, если не изменился
+    список самых комментируемых постов (most_commented_changed). Иначе
+    сбрасываются все страницы
+    """
+    if most_commented_changed:
+        content_changed()
+    now = timezone.now()
+    _bump(COMMENTS_GENERATION_KEY)
+    cache.set_many(
+        {LAST_WRITE_KEY: now, **{page_modified_key(path): now for path in paths}},
+        timeout=None,
+    )
+
+
+def feed_key(tag_slug=None) -> str:
+    """ Возвращает ключ кеша новостной ленты (общей или по тегу) """
+    return FEED_KEY_PREFIX + (tag_slug or '')
+
+
+def invalidate_feeds(tag_slugs=()) -> None:
+    """ Сбрасывает общую новостную ленту и ленты по тегам tag_slugs """
+    cache.delete_many([feed_key(), *map(feed_key, tag_slugs)])
@@ -0,0 +1,139 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.urls import reverse
+
+from .models import Comment, adjust_comment_count, post_comments_changed
+from .pagination import KeysetPaginator
+
+
+# Буферизованная запись комментариев. При BLOG_COMMENT_BUFFER = True
+# принятые комментарии не сохраняются по одному, а накапливаются в памяти
+# процесса и записываются одним bulk_create раз в
+# BLOG_COMMENT_FLUSH_INTERVAL секунд или при накоплении
+# BLOG_COMMENT_BUFFER_SIZE комментариев. При аварийном завершении процесса
+# комментарии, накопленные за последний интервал, теряются.
+
+logger = logging.getLogger(__name__)
+
+
+def write_comments(comments) -> None:
+    """
+    Сохраняет комментарии одним INSERT, корректирует счетчики активных
+    комментариев и сбрасывает кеши страниц постов
+    """
+    per_post = Counter(comment.post_id for comment in comments if comment.active)
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        for post_id, total in per_post.items():
+            adjust_comment_count(post_id, total)
+    # bulk_create не отправляет сигналы post_save
+    post_comments_changed({comment.post_id for comment in comments})
+
+
+class CommentBuffer:
+    """ Буфер комментариев, ожидающих записи в базу данных """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, comment) -> None:
+        """ Добавляет комментарий в буфер и планирует запись буфера """
+        with self._lock:
+            self._pending.append(comment)
+            full = len(self._pending) >= settings.BLOG_COMMENT_BUFFER_SIZE
+            if not full and self._timer is None:
+                self._timer = threading.Timer(
+                    settings.BLOG_COMMENT_FLUSH_INTERVAL, self._flush_in_thread
+                )
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """ Записывает накопленные комментарии. Возвращает их число """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if pending:
+            try:
+                write_comments(pending)
+            except Exception:
+                logger.error('Lost %d buffered comment(s)', len(pending))
+                raise
+        return len(pending)
+
+    def _flush_in_thread(self) -> None:
+        """ Записывает буфер по таймеру в отдельном потоке """
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to write buffered comments')
+        finally:
+            # Поток таймера открывает собственное соединение с базой данных
+            connections.close_all()
+
+
+comment_buffer = CommentBuffer()
+
+# Комментарии, оставшиеся в буфере, записываются при штатном завершении процесса
+atexit.register(comment_buffer.flush)
+
+
+def save_comment(comment) -> None:
+    """ Сохраняет комментарий сразу или через буфер (BLOG_COMMENT_BUFFER) """
+    if settings.BLOG_COMMENT_BUFFER:
+        comment_buffer.add(comment)
+    else:
+        comment.save()
+
+
+def comment_paginator(post) -> KeysetPaginator:
+    """
+    Постраничная разбивка активных комментариев поста по курсору на полях
+    (created, id). Первая страница выводится на странице поста, а следующие
+    загружаются по запросу (представление post_comments).
+    """
+    # Поле post загружается, так как набор комментариев поста сверяет
+    # post_id каждого комментария с постом (иначе запрос на комментарий)
+    return KeysetPaginator(
+        post.comments.filter(active=True).only('post', 'name', 'body', 'created'),
+        settings.BLOG_COMMENTS_PER_PAGE,
+        ordering=('created', 'id'),
+    )
+
+
+def comments_url(post_id, cursor, **params):
+    """ Возвращает url-адрес страницы комментариев после курсора cursor или None """
+    if not cursor:
+        return None
+    query = '&'.join(f'{name}={value}' for name, value in {'cursor': cursor, **params}.items())
+    return f"{reverse('blog:post_comments', args=[post_id])}?{query}"
+
+
+def comment_page_json(post, page) -> dict:
+    """ Возвращает страницу комментариев в виде словаря для ответа JSON """
+    return {
+        'comments': [
+            {
+                'id': comment.id,
+                'name': comment.name,
+                'created': comment.created.isoformat(),
+                'body': comment.body,
+            }
+            for comment in page
+        ],
+        'next': comments_url(post.id, page.next_cursor, format='json'),
+    }
@@ -0,0 +1,181 @@
+import random
+from datetime import timedelta
+from itertools import batched
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import router, transaction
+from django.db.models import Q
+from django.utils import timezone
+from taggit.models import Tag, TaggedItem
+
+from .archive import rebuild_archive
+from .cache import content_changed, invalidate_feeds
+from .models import Comment, Post, SimilarPost
+from .search import get_backend
+from .similarity import rebuild_similar_posts
+from .tagstats import rebuild_tag_stats
+
+
+# Синтетический набор постов для нагрузочных тестов (см. команды
+# generate_corpus и run_benchmarks). Посты создаются массовыми INSERT
+# без сигналов, поэтому прорисованный html, счетчики комментариев,
+# поисковый индекс и похожие посты заполняются явно.
+
+# Слаги синтетических постов начинаются с этого префикса
+CORPUS_PREFIX = 'corpus-'
+
+WORDS = (
+    'django', 'python', 'query', 'cache', 'index', 'template', 'request', 'response',
+    'model', 'view', 'database', 'latency', 'throughput', 'server', 'async', 'thread',
+    'middleware', 'signal', 'feed', 'sitemap', 'search', 'vector', 'cursor', 'page',
+    'markdown', 'render', 'profile', 'memory', 'benchmark', 'deploy', 'replica', 'pool',
+    'migration', 'schema', 'join', 'filter', 'aggregate', 'tag', 'comment', 'author',
+    'queue', 'worker', 'batch', 'stream', 'chunk', 'header', 'session', 'token',
+)
+
+CODE_SNIPPETS = (
+    'posts = Post.published.filter(tags__slug={word!r})\nfor post in posts:\n    print(post.title)',
+    'def {word}_view(request):\n    context = {{"items": range(10)}}\n    return render(request, "{word}.html", context)',
+    'from django.core.cache import cache\n\nvalue = cache.get_or_set("{word}", compute, timeout=300)',
+)
+
+
+def sentence(rng, words=12) -> str:
+    """ Возвращает случайное предложение """
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(words // 2, words)))
+    return text.capitalize() + '.'
+
+
+def markdown_body(rng, paragraphs: int, code_blocks: int) -> str:
+    """ Возвращает тело поста в markdown с абзацами, списком и блоками кода """
+    parts = []
+    for i in range(paragraphs):
+        words = [rng.choice(WORDS) for _ in range(3)]
+        parts.append(
+            f'{sentence(rng)} **{words[0]}** and `{words[1]}` {sentence(rng, 20)} '
+            f'[{words[2]}](https://example.com/{words[2]}) {sentence(rng)}'
+        )
+        if i == paragraphs // 2:
+            parts.append('## ' + sentence(rng, 6).rstrip('.'))
+            parts.append('\n'.join(f'- {sentence(rng, 6)}' for _ in range(3)))
+    for _ in range(code_blocks):
+        snippet = rng.choice(CODE_SNIPPETS).format(word=rng.choice(WORDS))
+        parts.insert(rng.randint(1, len(parts)), f'```python\n{snippet}\n```')
+    return '\n\n'.join(parts)
+
+
+def _ensure_tags(count: int) -> list:
+    """ Возвращает теги синтетического набора, создавая недостающие """
+    names = [f'topic-{i}' for i in range(count)]
+    existing = set(Tag.objects.filter(name__in=names).values_list('name', flat=True))
+    Tag.objects.bulk_create(
+        [Tag(name=name, slug=name) for name in names if name not in existing]
+    )
+    return list(Tag.objects.filter(name__in=names))
+
+
+def _raw_delete(queryset) -> int:
+    """ Удаляет строки набора запросов одним DELETE без каскада и сигналов """
+    return queryset._raw_delete(router.db_for_write(queryset.model))
+
+
+def clear_corpus(batch_size: int = 1000) -> int:
+    """
+    Удаляет синтетические посты. Возвращает число удаленных постов.
+
+    QuerySet.delete() отправил бы сигналы удаления для каждого поста
+    и комментария, и архив, данные тегов и похожие посты пересчитывались
+    бы после каждого из них. Поэтому посты и зависящие от них строки
+    удаляются порциями массовых DELETE, а производные данные
+    перестраиваются один раз, как в generate_corpus.
+    """
+    posts = Post.objects.filter(slug__startswith=CORPUS_PREFIX)
+    post_ids = list(posts.values_list('id', flat=True))
+    content_type = ContentType.objects.get_for_model(Post)
+    tag_slugs = set(
+        Tag.objects.filter(
+            taggit_taggeditem_items__content_type=content_type,
+            taggit_taggeditem_items__object_id__in=posts.values('id'),
+        ).values_list('slug', flat=True)
+    )
+
+    search = get_backend()
+    for batch in batched(post_ids, batch_size):
+        with transaction.atomic():
+            _raw_delete(SimilarPost.objects.filter(Q(post_id__in=batch) | Q(neighbor_id__in=batch)))
+            _raw_delete(TaggedItem.objects.filter(content_type=content_type, object_id__in=batch))
+            _raw_delete(Comment.objects.filter(post_id__in=batch))
+            _raw_delete(Post.objects.filter(id__in=batch))
+            search.remove_posts(batch)
+
+    rebuild_similar_posts()
+    rebuild_tag_stats()
+    rebuild_archive()
+    content_changed()
+    invalidate_feeds(tag_slugs)
+    return len(post_ids)
+
+
+def generate_corpus(
+    author, posts: int, tags: int = 50, tags_per_post: int = 3, comments_per_post: int = 5,
+    paragraphs: int = 6, code_blocks: int = 1, days: int = 730, draft_ratio: float = 0.05,
+    seed=None, batch_size: int = 500,
+) -> dict:
+    """
+    Создает posts синтетических постов автора author с тегами, комментариями
+    и телами из paragraphs абзацев и code_blocks блоков кода. Даты публикации
+    распределены по последним days дням. Возвращает число созданных объектов
+    """
+    rng = random.Random(seed)
+    tag_objects = _ensure_tags(tags)
+    tags_per_post = min(tags_per_post, len(tag_objects))
+    content_type = ContentType.objects.get_for_model(Post)
+    start = Post.objects.filter(slug__startswith=CORPUS_PREFIX).count()
+    now = timezone.now()
+    created = {'posts': 0, 'tagged_items': 0, 'comments': 0}
+
+    for offset in range(0, posts, batch_size):
+        batch = []
+        for number in range(start + offset, start + min(offset + batch_size, posts)):
+            post = Post(
+                title=sentence(rng, 8).rstrip('.'),
+                slug=f'{CORPUS_PREFIX}{number}',
+                body=markdown_body(rng, paragraphs, code_blocks),
+                author=author,
+                publish=now - timedelta(seconds=rng.randint(0, days * 86400)),
+                status=Post.Status.DRAFT if rng.random() < draft_ratio else Post.Status.PUBLISHED,
+                active_comment_count=comments_per_post,
+            )
+            post.render_body()
+            batch.append(post)
+
+        with transaction.atomic():
+            Post.objects.bulk_create(batch)
+            tagged_items = [
+                TaggedItem(tag=tag, content_type=content_type, object_id=post.pk)
+                for post in batch
+                for tag in rng.sample(tag_objects, tags_per_post)
+            ]
+            TaggedItem.objects.bulk_create(tagged_items)
+            comments = [
+                Comment(
+                    post=post, name=rng.choice(WORDS), email=f'reader{i}@example.com',
+                    body=sentence(rng, 30),
+                )
+                for post in batch
+                for i in range(comments_per_post)
+            ]
+            Comment.objects.bulk_create(comments, batch_size=batch_size)
+
+        created['posts'] += len(batch)
+        created['tagged_items'] += len(tagged_items)
+        created['comments'] += len(comments)
+
+    # Массовые INSERT не отправляют сигналы, поэтому производные
+    # данные перестраиваются явно
+    get_backend().rebuild()
+    rebuild_similar_posts()
+    rebuild_tag_stats()
+    rebuild_archive()
+    content_changed()
+    return created
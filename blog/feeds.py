@@ -1,22 +1,50 @@
-import markdown
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
 from django.template.defaultfilters import truncatechars_html
-from django.urls import reverse_lazy
+from django.urls import reverse
+from django.utils.http import parse_http_date
+from taggit.models import Tag
 
+from .cache import feed_key
 from .models import Post
 
 
 class LatestPostaFeed(Feed):
-    """ Класс новостной ленты """
+    """ Класс новостной ленты (общей или по тегу) """
 
     # Атрибуты соответстиуют элементам RSS
-    title = 'My blog'
-    link = reverse_lazy('blog:post_list') # генерирует url-адреса
     description = 'New posts of my blog.'
 
-    def items(self):
+    def get_object(self, request, tag_slug=None):
+        """ Возвращает тег ленты по тегу или None для общей ленты """
+        if tag_slug is None:
+            return None
+        return get_object_or_404(Tag, slug=tag_slug)
+
+    def title(self, obj=None):
+        """ Возвращает заголовок ленты """
+        if obj is None:
+            return 'My blog'
+        return f'My blog: posts tagged "{obj.name}"'
+
+    def link(self, obj=None):
+        """ Возвращает url-адрес страницы, соответствующей ленте """
+        if obj is None:
+            return reverse('blog:post_list')
+        return reverse('blog:post_list_by_tag', args=[obj.slug])
+
+    def items(self, obj=None):
         """ Возвращает включаемые в новостную ленту объекты """
-        return Post.published.all()[:5]
+        posts = Post.published.for_feed()
+        if obj is not None:
+            posts = posts.filter(tags__in=[obj])
+        return posts[:5]
     
     def item_title(self, item):
         """ Возвращает заголовок объекта """
@@ -24,8 +52,81 @@ class LatestPostaFeed(Feed):
     
     def item_description(self, item):
         """ Возвращает описание объекта """
-        return truncatechars_html(markdown.markdown(item.body), 30)
+        return truncatechars_html(item.rendered_excerpt, 30)
     
-    def item_pubdata(self, item):
+    def item_pubdate(self, item):
         """ Возвращает дату публикации объекта """
-        return item.publish
\ No newline at end of file
+        return item.publish
+
+
+# Новостные ленты читатели запрашивают постоянно, а меняются они только
+# при изменении опубликованных постов. Поэтому XML ленты формируется один
+# раз и хранится в кеше до изменения постов ленты (см. blog.signals),
+# а запросы ленты отдают его без обращения к базе данных и отвечают 304
+# по ETag и Last-Modified сохраненной ленты.
+#
+# Сигналы только сбрасывают ленты, а заново лента формируется первым
+# запросом к ней: абсолютные ссылки ленты зависят от схемы и хоста
+# запроса, которых в обработчике сигнала нет, а сохранение поста в
+# панели администратора не должно формировать общую ленту и ленты всех
+# тегов поста, в том числе те, которые никто не читает. Под ключом ленты
+# хранится словарь лент по схеме и хосту запроса, поэтому сброс ленты
+# удаляет ее для всех хостов.
+
+def build_feed(request, tag_slug=None) -> dict:
+    """ Формирует ленту и возвращает ее XML с валидаторами для хранения в кеше """
+    response = LatestPostaFeed()(request, tag_slug=tag_slug)
+    content = response.content
+    last_modified = response.get('Last-Modified')
+    return {
+        'content': content,
+        'content_type': response['Content-Type'],
+        'etag': hashlib.sha256(content).hexdigest()[:32],
+        'last_modified': (
+            datetime.fromtimestamp(parse_http_date(last_modified), tz=dt_timezone.utc)
+            if last_modified else None
+        ),
+    }
+
+
+def _origin(request) -> str:
+    """ Возвращает схему и хост запроса, от которых зависят ссылки ленты """
+    return f'{request.scheme}://{request.get_host()}'
+
+
+def load_feed(request, tag_slug=None) -> dict:
+    """
+    Возвращает ленту из кеша, формируя ее при отсутствии. Значение
+    запоминается в запросе, так как его используют оба валидатора
+    """
+    if hasattr(request, '_blog_feed'):
+        return request._blog_feed
+    key = feed_key(tag_slug)
+    feeds = cache.get(key) or {}
+    feed = feeds.get(_origin(request))
+    if feed is None:
+        feed = build_feed(request, tag_slug)
+        cache.set(key, {**feeds, _origin(request): feed}, settings.BLOG_FEED_CACHE_TIMEOUT)
+    request._blog_feed = feed
+    return feed
+
+
+async def aload_feed(request, tag_slug=None) -> dict:
+    """ Асинхронная версия load_feed() """
+    if hasattr(request, '_blog_feed'):
+        return request._blog_feed
+    feed = (await cache.aget(feed_key(tag_slug)) or {}).get(_origin(request))
+    if feed is None:
+        return await sync_to_async(load_feed)(request, tag_slug)
+    request._blog_feed = feed
+    return feed
+
+
+def feed_etag(request, tag_slug=None) -> str:
+    """ Возвращает ETag ленты (хеш ее XML) """
+    return load_feed(request, tag_slug)['etag']
+
+
+def feed_last_modified(request, tag_slug=None):
+    """ Возвращает время публикации последнего поста ленты """
+    return load_feed(request, tag_slug)['last_modified']
@@ -0,0 +1,194 @@
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.middleware.csrf import get_token
+from django.utils.cache import get_cache_key, has_vary_header, learn_cache_key
+from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.http import condition
+
+from .cache import LAST_MODIFIED_KEY, page_modified_key, set_last_modified
+from .models import Comment, Post
+
+
+def _latest(*values):
+    """ Возвращает наибольшее из заданных значений времени или None """
+    return max((value for value in values if value is not None), default=None)
+
+
+def content_last_modified(request=None, *args, **kwargs) -> datetime:
+    """
+    Возвращает время последнего изменения постов или комментариев. Значение
+    хранится в кеше и обновляется сигналами (см. blog.cache.content_changed),
+    а при его отсутствии вычисляется как максимум полей updated. Для страницы
+    запроса учитывается и время изменения ее комментариев
+    (см. blog.cache.comments_changed).
+    """
+    if request is not None and hasattr(request, '_blog_last_modified'):
+        return request._blog_last_modified
+
+    keys = [LAST_MODIFIED_KEY] + ([page_modified_key(request.path)] if request is not None else [])
+    values = cache.get_many(keys)
+    value = values.get(LAST_MODIFIED_KEY)
+    if value is None:
+        value = _latest(
+            Post.objects.aggregate(value=Max('updated'))['value'],
+            Comment.objects.aggregate(value=Max('updated'))['value'],
+        ) or datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+        set_last_modified(value)
+    value = _latest(value, values.get(keys[-1]))
+
+    if request is not None:
+        request._blog_last_modified = value
+    return value
+
+
+async def acontent_last_modified(request) -> datetime:
+    """ Асинхронная версия content_last_modified() """
+    if hasattr(request, '_blog_last_modified'):
+        return request._blog_last_modified
+    page_key = page_modified_key(request.path)
+    values = await cache.aget_many([LAST_MODIFIED_KEY, page_key])
+    if LAST_MODIFIED_KEY not in values:
+        return await sync_to_async(content_last_modified)(request)
+    request._blog_last_modified = _latest(values[LAST_MODIFIED_KEY], values.get(page_key))
+    return request._blog_last_modified
+
+
+def content_etag(request, *args, **kwargs) -> str:
+    """ Возвращает ETag страницы, меняющийся при любом изменении содержимого """
+    return f'{int(content_last_modified(request).timestamp() * 1_000_000):x}'
+
+
+# Заполнитель CSRF-токена в кешируемых страницах. Маскированный токен
+# различается для каждого ответа и связан с cookie посетителя, поэтому
+# страница сохраняется в кеше с заполнителем, а токен подставляется в
+# ответ после обращения к кешу (см. cache_response).
+CSRF_TOKEN_PLACEHOLDER = 'blog-csrf-token-placeholder'
+
+
+def csrf_token_placeholder(request) -> dict:
+    """
+    Контекстный процессор, заменяющий CSRF-токен заполнителем при
+    прорисовке кешируемых страниц. Выполняется после встроенного
+    процессора django.template.context_processors.csrf.
+    """
+    if getattr(request, '_blog_csrf_placeholder', False):
+        return {'csrf_token': CSRF_TOKEN_PLACEHOLDER}
+    return {}
+
+
+def _insert_csrf_token(request, response):
+    """ Подставляет в ответ CSRF-токен запроса вместо заполнителя """
+    placeholder = CSRF_TOKEN_PLACEHOLDER.encode()
+    if placeholder in response.content:
+        # get_token() помечает cookie токена для установки в csrf_protect
+        response.content = response.content.replace(placeholder, get_token(request).encode())
+    return response
+
+
+def _cacheable(response) -> bool:
+    """
+    Проверяет, можно ли сохранить ответ в кеше. Как и в UpdateCacheMiddleware,
+    не кешируются ответы, устанавливающие cookie. CSRF-токен в кешируемые
+    страницы подставляется после обращения к кешу (см. cache_response).
+    """
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not (response.cookies and has_vary_header(response, 'Cookie'))
+        and 'private' not in response.get('Cache-Control', '')
+    )
+
+
+def cache_response(view):
+    """
+    Декоратор кеширования ответов GET по url-адресу. Префикс ключей
+    содержит ETag содержимого, поэтому при изменении постов или
+    комментариев все страницы сбрасываются без перечисления ключей.
+    Страницы прорисовываются и сохраняются с заполнителем CSRF-токена,
+    а токен запроса подставляется в отдаваемый ответ. Запросы HEAD
+    отдаются из кеша страниц GET, но их ответы не сохраняются.
+    """
+    def store(request, response, key_prefix):
+        if request.method == 'GET' and _cacheable(response):
+            timeout = settings.BLOG_PAGE_CACHE_TIMEOUT
+            key = learn_cache_key(request, response, timeout, key_prefix, cache=cache)
+            cache.set(key, response, timeout)
+        return _insert_csrf_token(request, response)
+
+    def lookup(request, key_prefix):
+        cache_key = get_cache_key(request, key_prefix, 'GET', cache=cache)
+        response = cache.get(cache_key) if cache_key is not None else None
+        return _insert_csrf_token(request, response) if response is not None else None
+
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+
+            key_prefix = f'blog:page:{content_etag(request)}'
+            response = await sync_to_async(lookup)(request, key_prefix)
+            if response is not None:
+                return response
+
+            request._blog_csrf_placeholder = True
+            response = await view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                # Ответ сохраняется после прорисовки, которую обработчик
+                # ASGI выполняет в отдельном потоке
+                response.add_post_render_callback(lambda r: store(request, r, key_prefix))
+                return response
+            return await sync_to_async(store)(request, response, key_prefix)
+
+        return wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+
+        key_prefix = f'blog:page:{content_etag(request)}'
+        response = lookup(request, key_prefix)
+        if response is not None:
+            return response
+
+        request._blog_csrf_placeholder = True
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.add_post_render_callback(lambda r: store(request, r, key_prefix))
+            return response
+        return store(request, response, key_prefix)
+
+    return wrapper
+
+
+def public_page(view):
+    """
+    Декоратор публичных страниц блога. На условные запросы с заголовками
+    If-None-Match/If-Modified-Since отвечает 304 до вызова представления,
+    а полный ответ сохраняет в кеше по url-адресу.
+    """
+    # csrf_protect применяется снаружи кеширования: cookie CSRF-токена и
+    # заголовок Vary: Cookie добавляются к отдаваемому ответу после его
+    # сохранения в кеше, если в ответ был подставлен токен
+    wrapped = condition(etag_func=content_etag, last_modified_func=content_last_modified)(
+        csrf_protect(cache_response(view))
+    )
+    if not iscoroutinefunction(view):
+        return wrapped
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Время последнего изменения вычисляется заранее асинхронно, так как
+        # condition() вызывает функции валидаторов синхронно, а при промахе
+        # кеша для этого нужны запросы к базе данных
+        await acontent_last_modified(request)
+        return await wrapped(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+def enqueue_mail(subject, message, from_email, recipient_list) -> list[OutgoingEmail]:
+    """ Ставит письмо в очередь отправки, по одной строке на получателя """
+    return OutgoingEmail.objects.bulk_create([
+        OutgoingEmail(subject=subject, message=message, from_email=from_email or '', to=to)
+        for to in recipient_list
+    ])
+
+
+def _claim(batch_size: int) -> list[OutgoingEmail]:
+    """
+    Выбирает письма, которые пора отправить, и откладывает их следующую
+    попытку на время аренды, чтобы параллельные обработчики очереди
+    не взяли те же письма. Блокировка строк снимается до отправки.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.Status.PENDING, next_attempt__lte=now)
+            .order_by('next_attempt')[:batch_size]
+        )
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt=now + timedelta(seconds=settings.BLOG_MAIL_LEASE)
+        )
+    return emails
+
+
+def _fail(email: OutgoingEmail, error: Exception) -> None:
+    """ Учитывает неудачную попытку отправки и назначает следующую """
+    email.attempts += 1
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= settings.BLOG_MAIL_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.Status.FAILED
+    else:
+        delay = settings.BLOG_MAIL_RETRY_DELAY * 2 ** (email.attempts - 1)
+        email.next_attempt = timezone.now() + timedelta(seconds=delay)
+
+
+def send_queued_mail(batch_size: int = 100) -> tuple[int, int]:
+    """
+    Отправляет порцию писем из очереди через одно соединение с почтовым
+    сервером. Возвращает число отправленных и неотправленных писем.
+    """
+    emails = _claim(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = []
+    failed = []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as error:
+        # Почтовый сервер недоступен: повторить всю порцию позже
+        for email in emails:
+            _fail(email, error)
+        failed = emails
+    else:
+        try:
+            for email in emails:
+                try:
+                    EmailMessage(
+                        subject=email.subject,
+                        body=email.message,
+                        from_email=email.from_email or None,
+                        to=[email.to],
+                        connection=connection,
+                    ).send()
+                except Exception as error:
+                    _fail(email, error)
+                    failed.append(email)
+                else:
+                    email.status = OutgoingEmail.Status.SENT
+                    email.sent = timezone.now()
+                    sent.append(email)
+        finally:
+            connection.close()
+
+    OutgoingEmail.objects.bulk_update(
+        emails, ['status', 'attempts', 'next_attempt', 'last_error', 'sent']
+    )
+    return len(sent), len(failed)
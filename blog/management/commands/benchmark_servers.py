@@ -0,0 +1,98 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.benchmark import run_asgi, run_wsgi
+
+
+SERVERS = {'wsgi': run_wsgi, 'asgi': run_asgi}
+
+
+class Command(BaseCommand):
+    """ Команда сравнения пропускной способности обработчиков WSGI и ASGI """
+
+    help = (
+        'Measures throughput and latency of blog pages served through the WSGI '
+        'handler (synchronous views) and the ASGI handler (async views) at a '
+        'fixed concurrency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='*', default=['/blog/'],
+            help='Paths requested in a round-robin order.'
+        )
+        parser.add_argument(
+            '--server', choices=['wsgi', 'asgi', 'both'], default='both',
+            help='Handler to benchmark.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Total number of requests per handler.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=10,
+            help='Number of requests in flight at the same time.'
+        )
+        parser.add_argument(
+            '--page-cache', action='store_true',
+            help='Keep the per-URL page cache enabled (disabled by default to measure the views).'
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Print results as JSON.'
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--requests and --concurrency must be positive.')
+
+        if options['server'] == 'both':
+            # Набор представлений выбирается при импорте url-адресов
+            # (BLOG_ASYNC_VIEWS), поэтому каждый обработчик измеряется
+            # в отдельном процессе
+            results = {server: self.run_child(server, options) for server in SERVERS}
+        else:
+            results = {options['server']: self.run_server(options['server'], options)}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+
+        for server, summary in results.items():
+            self.stdout.write(
+                f'{server.upper()}: {summary["rps"]} req/s, '
+                f'p50 {summary["p50"]} ms, p95 {summary["p95"]} ms, p99 {summary["p99"]} ms, '
+                f'{summary["errors"]} error(s) in {summary["requests"]} request(s)'
+            )
+
+    def run_server(self, server, options):
+        """ Измеряет обработчик server в текущем процессе """
+        expected = server == 'asgi'
+        if settings.BLOG_ASYNC_VIEWS != expected:
+            raise CommandError(
+                f'Run with BLOG_ASYNC_VIEWS={expected} to benchmark the {server.upper()} handler.'
+            )
+        # Тестовые клиенты обращаются к серверу testserver
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        if not options['page_cache']:
+            settings.BLOG_PAGE_CACHE_TIMEOUT = 0
+        return SERVERS[server](options['urls'], options['requests'], options['concurrency'])
+
+    def run_child(self, server, options):
+        """ Измеряет обработчик server в дочернем процессе """
+        command = [
+            sys.executable, sys.argv[0], 'benchmark_servers', *options['urls'],
+            '--server', server, '--json',
+            '--requests', str(options['requests']),
+            '--concurrency', str(options['concurrency']),
+        ]
+        if options['page_cache']:
+            command.append('--page-cache')
+        env = {**os.environ, 'BLOG_ASYNC_VIEWS': str(server == 'asgi')}
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+        return json.loads(output.stdout)[server]
@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.benchmark import measure_templates
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    """ Команда измерения времени прорисовки шаблонов блога """
+
+    help = (
+        'Measures render time of every blog template (including extends, include and '
+        'inclusion-tag templates) with plain template loaders and with the cached loader.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'templates', nargs='*',
+            help='Template names to measure (all by default), e.g. blog/post/list.html.'
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=200, help='Measured renders per template and loader.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5, help='Unmeasured renders per template and loader.'
+        )
+        parser.add_argument('--output', help='Write results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be positive.')
+        if not Post.published.exists():
+            raise CommandError('There are no published posts. Run generate_corpus first.')
+        results = measure_templates(options['templates'], options['iterations'], options['warmup'])
+        unknown = set(options['templates']) - set(results)
+        if unknown:
+            raise CommandError(f'Unknown template(s): {", ".join(sorted(unknown))}.')
+
+        self.stdout.write(
+            f'{"template":<40} {"uncached p50":>13} {"cached p50":>11} {"speedup":>8} {"loads":>6}'
+        )
+        for name, result in results.items():
+            uncached, cached = result['uncached'], result['cached']
+            speedup = uncached['p50'] / cached['p50'] if cached['p50'] else 0.0
+            self.stdout.write(
+                f'{name:<40} {uncached["p50"]:>13.3f} {cached["p50"]:>11.3f} '
+                f'{speedup:>7.1f}x {uncached["loads"]:>6}'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}.')
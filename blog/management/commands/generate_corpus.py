@@ -0,0 +1,62 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from blog.corpus import clear_corpus, generate_corpus
+
+
+class Command(BaseCommand):
+    """ Команда создания синтетического набора постов для нагрузочных тестов """
+
+    help = (
+        'Generates synthetic published posts with tags, comments and Markdown bodies '
+        '(including code blocks) for benchmarking.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000, help='Number of posts to create.')
+        parser.add_argument('--tags', type=int, default=50, help='Number of distinct tags.')
+        parser.add_argument('--tags-per-post', type=int, default=3, help='Tags attached to each post.')
+        parser.add_argument(
+            '--comments-per-post', type=int, default=5, help='Comments attached to each post.'
+        )
+        parser.add_argument(
+            '--paragraphs', type=int, default=6, help='Paragraphs in each post body.'
+        )
+        parser.add_argument(
+            '--code-blocks', type=int, default=1, help='Fenced Python code blocks in each post body.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=730, help='Publication dates are spread over this many days.'
+        )
+        parser.add_argument('--seed', type=int, help='Random seed for a reproducible corpus.')
+        parser.add_argument(
+            '--author', default='benchmark', help='Username of the author (created if missing).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500, help='Number of posts inserted per batch.'
+        )
+        parser.add_argument(
+            '--clear', action='store_true', help='Delete previously generated posts first.'
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f'Deleted {clear_corpus()} generated post(s).')
+
+        author, _ = User.objects.get_or_create(username=options['author'])
+        created = generate_corpus(
+            author,
+            posts=options['posts'],
+            tags=options['tags'],
+            tags_per_post=options['tags_per_post'],
+            comments_per_post=options['comments_per_post'],
+            paragraphs=options['paragraphs'],
+            code_blocks=options['code_blocks'],
+            days=options['days'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created["posts"]} post(s), {created["tagged_items"]} tag link(s) '
+            f'and {created["comments"]} comment(s).'
+        ))
@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.transfer import FORMATS, import_posts, read_records
+
+
+class Command(BaseCommand):
+    """ Команда массового импорта постов с тегами и комментариями """
+
+    help = (
+        'Imports posts with tags and comments from JSON Lines or CSV in batches, '
+        'upserting existing posts and comments by id.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Input file path, or "-" to read from stdin.')
+        parser.add_argument(
+            '--format', choices=FORMATS, default='jsonl', help='Input format.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500, help='Number of posts upserted per batch.'
+        )
+
+    def progress(self, counts):
+        rate = counts['posts'] / counts['seconds'] if counts['seconds'] else 0
+        self.stdout.write(f'{counts["posts"]} post(s) imported ({rate:.0f} rows/s)...')
+
+    def handle(self, *args, **options):
+        stream = sys.stdin if options['input'] == '-' else open(options['input'], encoding='utf-8', newline='')
+        try:
+            counts = import_posts(
+                read_records(stream, options['format']),
+                batch_size=options['batch_size'],
+                progress=self.progress if options['verbosity'] > 1 else None,
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        rows = counts['posts'] + counts['tagged_items'] + counts['comments']
+        rate = rows / counts['seconds'] if counts['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {counts["posts"]} post(s), {counts["tagged_items"]} tag link(s) and '
+            f'{counts["comments"]} comment(s) in {counts["seconds"]:.2f}s ({rate:.0f} rows/s).'
+        ))
+        if counts['skipped']:
+            self.stdout.write(self.style.WARNING(
+                f'Skipped {counts["skipped"]} record(s) with an unknown status '
+                f'(expected one of {", ".join(Post.Status.values)}).'
+            ))
@@ -0,0 +1,78 @@
+import json
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from blog.benchmark import percentile
+from blog.perf import TIMINGS
+
+
+class Command(BaseCommand):
+    """ Команда построения отчета по журналу метрик запросов blog.perf """
+
+    help = (
+        'Aggregates blog.perf JSON log lines into per-view p50/p95/p99 latency '
+        'and average query and timing figures.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files', nargs='*',
+            help='Log files to read (standard input if omitted).'
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Print the report as JSON.'
+        )
+
+    def handle(self, *args, **options):
+        records = defaultdict(list)
+        for line in self.read_lines(options['files']):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Строки других журналов пропускаются
+                continue
+            if isinstance(record, dict) and 'total_ms' in record:
+                records[record.get('view') or record.get('path')].append(record)
+
+        report = {view: self.summarize(view_records) for view, view_records in records.items()}
+
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+
+        header = f'{"view":<32} {"count":>7} {"p50":>9} {"p95":>9} {"p99":>9} {"queries":>8} {"db":>8}'
+        self.stdout.write(header)
+        for view, summary in sorted(report.items(), key=lambda item: -item[1]['p95']):
+            self.stdout.write(
+                f'{str(view):<32} {summary["count"]:>7} {summary["p50"]:>9.1f} '
+                f'{summary["p95"]:>9.1f} {summary["p99"]:>9.1f} '
+                f'{summary["db_queries"]:>8.1f} {summary["db_ms"]:>8.1f}'
+            )
+
+    def read_lines(self, files):
+        """ Генерирует строки журналов files или стандартного ввода """
+        if not files:
+            yield from sys.stdin
+            return
+        for path in files:
+            with open(path, encoding='utf-8') as file:
+                yield from file
+
+    def summarize(self, records):
+        """ Возвращает процентили времени ответа (мс) и средние метрики запросов """
+        totals = [record['total_ms'] for record in records]
+        summary = {
+            'count': len(records),
+            'p50': percentile(totals, 50),
+            'p95': percentile(totals, 95),
+            'p99': percentile(totals, 99),
+            'db_queries': sum(record.get('db_queries', 0) for record in records) / len(records),
+        }
+        for name in TIMINGS:
+            summary[f'{name}_ms'] = round(
+                sum(record.get(f'{name}_ms', 0) for record in records) / len(records), 2
+            )
+        return summary
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog.scheduling import next_scheduled_publish, publish_due_posts
+
+
+class Command(BaseCommand):
+    """ Команда публикации запланированных постов """
+
+    help = 'Publishes scheduled posts whose publish date has come and invalidates blog caches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of posts published per pass.'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep running and publish posts as they become due.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=60.0,
+            help='Maximum number of seconds to sleep between passes (with --loop).'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            posts = publish_due_posts(batch_size=options['batch_size'])
+            total += len(posts)
+            for post in posts:
+                self.stdout.write(f'Published "{post.title}" ({post.publish:%Y-%m-%d %H:%M}).')
+            if len(posts) == options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            # Ждем до ближайшей запланированной публикации, но не дольше
+            # интервала, чтобы заметить посты, запланированные за это время
+            delay = options['interval']
+            upcoming = next_scheduled_publish()
+            if upcoming is not None:
+                delay = min(delay, (upcoming - timezone.now()).total_seconds())
+            time.sleep(max(delay, 0.1))
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {total} post(s) published.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from blog.archive import rebuild_archive
+
+
+class Command(BaseCommand):
+    """ Команда полного пересчета архива публикаций по годам, месяцам и дням """
+
+    help = 'Recomputes the ArchivePeriod table (published post counts per year, month and day).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of ArchivePeriod rows inserted per INSERT statement.'
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_archive(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {total} archive period(s).'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from blog.search import get_backend
+
+
+class Command(BaseCommand):
+    """ Команда перестроения поискового индекса постов """
+
+    help = 'Rebuilds the search index of the configured search backend in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of posts indexed per batch.'
+        )
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        total = backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {total} post(s) with {type(backend).__name__}.'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from blog.similarity import rebuild_similar_posts
+
+
+class Command(BaseCommand):
+    """ Команда полного пересчета таблицы похожих постов """
+
+    help = 'Recomputes the SimilarPost table from tag sets of all published posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of SimilarPost rows inserted per INSERT statement.'
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_similar_posts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {total} similar post link(s).'))
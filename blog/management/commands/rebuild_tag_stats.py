@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from blog.tagstats import rebuild_tag_stats
+
+
+class Command(BaseCommand):
+    """ Команда полного пересчета денормализованных данных тегов """
+
+    help = 'Recomputes the TagStats table (post counts and ordered post ids of every tag).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of TagStats rows inserted per INSERT statement.'
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_tag_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Stored stats for {total} tag(s).'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from blog.models import Comment, Post
+
+
+class Command(BaseCommand):
+    """ Команда пересчета счетчиков активных комментариев постов """
+
+    help = 'Recomputes Post.active_comment_count from the comments table in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of posts reconciled per batch.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Post.objects.only('id', 'active_comment_count').order_by('id')
+
+        last_id = 0
+        fixed = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            # Фактическое число активных комментариев для постов порции
+            counts = dict(
+                Comment.objects.filter(post_id__in=[post.id for post in batch], active=True)
+                .order_by().values_list('post_id').annotate(total=Count('id'))
+            )
+
+            stale = []
+            for post in batch:
+                actual = counts.get(post.id, 0)
+                if post.active_comment_count != actual:
+                    post.active_comment_count = actual
+                    stale.append(post)
+            Post.objects.bulk_update(stale, ['active_comment_count'])
+            fixed += len(stale)
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {fixed} post(s).'))
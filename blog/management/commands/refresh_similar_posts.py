@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.similarity import refresh_queued_posts
+
+
+class Command(BaseCommand):
+    """ Команда пересчета похожих постов для постов из очереди """
+
+    help = 'Recomputes similar posts for posts queued by post and tag changes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of queued posts recomputed per pass.'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep draining the queue instead of exiting when it is empty.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help='Seconds to wait before polling an empty queue again (with --loop).'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            refreshed = refresh_queued_posts(batch_size=options['batch_size'])
+            total += refreshed
+            if refreshed:
+                self.stdout.write(f'Refreshed similar posts of {refreshed} queued post(s).')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {total} post(s) refreshed.'))
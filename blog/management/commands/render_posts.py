@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    """ Команда заполнения прорисованного html тел постов """
+
+    help = 'Renders body_html and body_excerpt for posts whose body has changed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of posts rendered and updated per batch.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Re-render every post even if its body hash is up to date.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['body_html', 'body_excerpt', 'body_hash']
+
+        # Посты перебираются порциями по первичному ключу, чтобы
+        # не загружать в память весь архив сразу
+        queryset = Post.objects.only('id', 'body', *fields).order_by('id')
+        if options['force']:
+            queryset.update(body_hash='')
+
+        last_id = 0
+        total = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            changed = [post for post in batch if post.render_body()]
+            Post.objects.bulk_update(changed, fields)
+            total += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered {total} post(s).'))
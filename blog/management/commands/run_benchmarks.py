@@ -0,0 +1,126 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.utils import timezone
+
+from blog.benchmark import compare_results, endpoint_urls, measure_endpoint
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    """ Команда нагрузочного теста публичных страниц блога """
+
+    help = (
+        'Benchmarks every public blog endpoint through the test client and reports '
+        'latency percentiles, queries per request and peak memory. Results can be '
+        'written to JSON and compared with a previous run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'endpoints', nargs='*',
+            help='Endpoint names to run (all by default), e.g. post_list post_detail.'
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=50, help='Measured requests per endpoint.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3, help='Unmeasured requests per endpoint.'
+        )
+        parser.add_argument(
+            '--cold-cache', action='store_true',
+            help='Clear the default cache before each request (never with a cache shared with a live site).'
+        )
+        parser.add_argument('--output', help='Write results to this JSON file.')
+        parser.add_argument('--compare', help='Compare results with this JSON file.')
+        parser.add_argument(
+            '--threshold', type=float, default=10.0,
+            help='Percentage growth of p95 or peak memory reported as a regression.'
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help='Exit with an error if the comparison finds regressions.'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be positive.')
+
+        urls = endpoint_urls()
+        if not urls:
+            raise CommandError('There are no published posts. Run generate_corpus first.')
+        unknown = set(options['endpoints']) - set(urls)
+        if unknown:
+            raise CommandError(f'Unknown endpoint(s): {", ".join(sorted(unknown))}.')
+        if options['endpoints']:
+            urls = {name: url for name, url in urls.items() if name in options['endpoints']}
+
+        # Тестовый клиент обращается к серверу testserver
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        client = Client()
+
+        results = {'meta': self.metadata(options), 'endpoints': {}}
+        self.stdout.write(
+            f'{"endpoint":<24} {"p50":>8} {"p95":>8} {"p99":>8} {"queries":>8} {"peak KB":>9}'
+        )
+        for name, url in urls.items():
+            result = measure_endpoint(
+                client, url, options['iterations'], options['warmup'], options['cold_cache']
+            )
+            results['endpoints'][name] = result
+            self.stdout.write(
+                f'{name:<24} {result["p50"]:>8.2f} {result["p95"]:>8.2f} {result["p99"]:>8.2f} '
+                f'{result["queries"]:>8} {result["peak_kb"]:>9.1f}'
+                + (f'  ({result["errors"]} error(s))' if result['errors'] else '')
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}.')
+
+        if options['compare']:
+            self.compare(results, options)
+
+    def metadata(self, options):
+        """ Возвращает описание прогона для сравнения результатов между коммитами """
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'posts': Post.published.count(),
+            'iterations': options['iterations'],
+            'cold_cache': options['cold_cache'],
+        }
+
+    def compare(self, results, options):
+        """ Выводит сравнение с результатами из файла --compare """
+        with open(options['compare'], encoding='utf-8') as file:
+            baseline = json.load(file)
+
+        self.stdout.write(f'\nCompared with {baseline["meta"].get("commit") or options["compare"]}:')
+        regressions = 0
+        for name, metric, old, new, change, regression in compare_results(
+            baseline, results, options['threshold']
+        ):
+            line = f'{name:<24} {metric:<8} {old:>10} -> {new:<10} {change:>+7.1f}%'
+            if regression:
+                regressions += 1
+                line = self.style.ERROR(line + '  REGRESSION')
+            self.stdout.write(line)
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{regressions} regression(s) found.')
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.mail import send_queued_mail
+
+
+class Command(BaseCommand):
+    """ Команда отправки писем из очереди """
+
+    help = 'Sends queued e-mails in batches over a single mail server connection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of e-mails sent per connection.'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep draining the queue instead of exiting when it is empty.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help='Seconds to wait before polling an empty queue again (with --loop).'
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_queued_mail(batch_size=options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} e-mail(s), {failed} failed.')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {total_sent} sent, {total_failed} failed.'
+        ))
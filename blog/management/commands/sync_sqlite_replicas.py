@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """ Команда копирования основной базы SQLite в файлы реплик """
+
+    help = (
+        'Copies the primary SQLite database into the replica files listed in '
+        'DB_REPLICAS, emulating replication for local testing.'
+    )
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('The primary database is not SQLite.')
+
+        replicas = {alias: db for alias, db in settings.DATABASES.items() if alias != 'default'}
+        if not replicas:
+            raise CommandError('No replicas are configured (set DB_REPLICAS).')
+
+        with sqlite3.connect(primary['NAME']) as source:
+            for alias, database in replicas.items():
+                # Резервное копирование SQLite создает согласованную копию
+                # даже при одновременной записи в основную базу
+                with sqlite3.connect(database['NAME']) as target:
+                    source.backup(target)
+                self.stdout.write(f'Copied {primary["NAME"]} to {alias} ({database["NAME"]}).')
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-18 04:33
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_active_comment_count(apps, schema_editor):
+    """ Заполняет счетчики активных комментариев существующих постов """
+    Post = apps.get_model('blog', 'Post')
+    Comment = apps.get_model('blog', 'Comment')
+    active_comments = Comment.objects.filter(
+        post=OuterRef('pk'), active=True
+    ).order_by().values('post').annotate(total=Count('id')).values('total')
+    Post.objects.update(active_comment_count=Coalesce(Subquery(active_comments), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_post_body_html'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='active_comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-active_comment_count'], name='blog_post_active__762281_idx'),
+        ),
+        migrations.RunPython(fill_active_comment_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-18 04:35
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# GIN-индекс поддерживается только в PostgreSQL, поэтому он создается
+# отдельной операцией, а не через Meta.indexes модели
+INDEX_NAME = 'blog_post_search_vector_gin'
+
+
+def create_search_index(apps, schema_editor):
+    """ Создает GIN-индекс и заполняет поисковые векторы существующих постов """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Post = apps.get_model('blog', 'Post')
+    schema_editor.execute(
+        f'CREATE INDEX {INDEX_NAME} ON {Post._meta.db_table} USING gin (search_vector)'
+    )
+    Post.objects.update(
+        search_vector=(
+            django.contrib.postgres.search.SearchVector('title', weight='A')
+            + django.contrib.postgres.search.SearchVector('body', weight='B')
+        )
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    """ Удаляет GIN-индекс поисковых векторов """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_post_active_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Виртуальная таблица FTS5 поискового бэкенда SQLite
+# (см. blog.search.sqlite.SQLiteSearchBackend)
+FTS_TABLE = 'blog_post_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    """ Создает таблицу FTS5 и индексирует опубликованные посты """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"title, body, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    Post = apps.get_model('blog', 'Post')
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, body) "
+        f"SELECT id, title, body FROM {Post._meta.db_table} WHERE status = 'PB'"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    """ Удаляет таблицу FTS5 """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 04:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_post_search_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blog.post')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='blog.post')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['post', '-score'], name='blog_simila_post_id_386e71_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'neighbor'), name='blog_similarpost_unique_pair')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-18 04:57
+
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_tag_stats(apps, schema_editor):
+    """ Заполняет данные тегов по существующим опубликованным постам """
+    Post = apps.get_model('blog', 'Post')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TagStats = apps.get_model('blog', 'TagStats')
+
+    order = {
+        post_id: position for position, post_id in enumerate(
+            Post.objects.filter(status='PB').order_by('-publish', '-id').values_list('id', flat=True)
+        )
+    }
+    post_ids = defaultdict(list)
+    links = TaggedItem.objects.filter(
+        content_type__app_label='blog', content_type__model='post'
+    ).values_list('tag_id', 'object_id')
+    for tag_id, post_id in links:
+        if post_id in order:
+            post_ids[tag_id].append(post_id)
+
+    TagStats.objects.bulk_create([
+        TagStats(tag_id=tag_id, post_count=len(ids), post_ids=sorted(ids, key=order.__getitem__))
+        for tag_id, ids in post_ids.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_outgoingemail'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagStats',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='taggit.tag')),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('post_ids', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name_plural': 'tag stats',
+                'indexes': [models.Index(fields=['-post_count'], name='blog_tagsta_post_co_9c2422_idx')],
+            },
+        ),
+        migrations.RunPython(fill_tag_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_future_posts(apps, schema_editor):
+    """
+    Переводит опубликованные посты с будущей датой публикации в статус
+    SCHEDULED и исключает их из данных тегов
+    """
+    Post = apps.get_model('blog', 'Post')
+    TagStats = apps.get_model('blog', 'TagStats')
+
+    future = Post.objects.filter(status='PB', publish__gt=timezone.now())
+    scheduled = set(future.values_list('id', flat=True))
+    if not scheduled:
+        return
+    future.update(status='SC')
+
+    changed = []
+    for stats in TagStats.objects.all():
+        post_ids = [post_id for post_id in stats.post_ids if post_id not in scheduled]
+        if len(post_ids) != len(stats.post_ids):
+            stats.post_ids, stats.post_count = post_ids, len(post_ids)
+            changed.append(stats)
+    TagStats.objects.bulk_update(changed, ['post_ids', 'post_count'], batch_size=1000)
+    TagStats.objects.filter(post_count=0).delete()
+
+
+def unschedule_posts(apps, schema_editor):
+    """ Возвращает запланированным постам статус PUBLISHED """
+    apps.get_model('blog', 'Post').objects.filter(status='SC').update(status='PB')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_tagstats'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='status',
+            field=models.CharField(choices=[('DF', 'Draft'), ('PB', 'Published'), ('SC', 'Scheduled')], default='DF', max_length=2),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-publish'], name='blog_post_status_bb6f7a_idx'),
+        ),
+        migrations.RunPython(schedule_future_posts, unschedule_posts),
+    ]
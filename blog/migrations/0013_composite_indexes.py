@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_scheduled_posts'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='blog_post_active__762281_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='blog_post_status_bb6f7a_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('active', True)), fields=['post', 'created'], name='blog_comment_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-active_comment_count'], name='blog_post_most_commented_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-publish', '-id'], name='blog_post_status_publish_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('status', 'PB')), fields=['slug', 'publish'], name='blog_post_published_slug_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Виртуальная таблица FTS5 поискового бэкенда SQLite
+# (см. blog.search.sqlite.SQLiteSearchBackend)
+FTS_TABLE = 'blog_post_fts'
+
+
+def index_unpublished_posts(apps, schema_editor):
+    """
+    Добавляет в индекс FTS5 неопубликованные посты, чтобы поиск в панели
+    администратора находил и их
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('blog', 'Post')
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, body) "
+        f"SELECT id, title, body FROM {Post._meta.db_table} WHERE status != 'PB'"
+    )
+
+
+def unindex_unpublished_posts(apps, schema_editor):
+    """ Удаляет неопубликованные посты из индекса FTS5 """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('blog', 'Post')
+    schema_editor.execute(
+        f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+        f"(SELECT id FROM {Post._meta.db_table} WHERE status != 'PB')"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_comment_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_unpublished_posts, unindex_unpublished_posts),
+    ]
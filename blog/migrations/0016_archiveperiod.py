@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:12
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_archive(apps, schema_editor):
+    """ Заполняет архив по существующим опубликованным постам """
+    Post = apps.get_model('blog', 'Post')
+    ArchivePeriod = apps.get_model('blog', 'ArchivePeriod')
+
+    counts = Counter()
+    for publish in Post.objects.filter(status='PB').values_list('publish', flat=True).iterator():
+        day = timezone.localtime(publish)
+        counts[day.year, day.month, day.day] += 1
+        counts[day.year, day.month, 0] += 1
+        counts[day.year, 0, 0] += 1
+    ArchivePeriod.objects.bulk_create([
+        ArchivePeriod(year=year, month=month, day=day, post_count=total)
+        for (year, month, day), total in counts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_index_unpublished_posts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivePeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField(default=0)),
+                ('day', models.PositiveSmallIntegerField(default=0)),
+                ('post_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-year', '-month', '-day'],
+                'constraints': [models.UniqueConstraint(fields=('year', 'month', 'day'), name='blog_archiveperiod_unique_period')],
+            },
+        ),
+        migrations.RunPython(fill_archive, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_archiveperiod'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.BigIntegerField(unique=True)),
+                ('requested', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['requested'], name='blog_simila_request_ecb27a_idx')],
+            },
+        ),
+    ]
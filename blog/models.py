@@ -1,13 +1,80 @@
-from django.db import models
+from datetime import date, datetime, timedelta
+
+from django.db import models, transaction
+from django.db.models import Count, F
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.urls import reverse
+from django.utils.safestring import mark_safe
 
 from taggit.managers import TaggableManager
+from taggit.models import Tag
+
+from .cache import comments_changed, shown_most_commented
+from .rendering import body_hash, make_excerpt, markdown_to_html
+
+
+def period_range(year, month=None, day=None):
+    """
+    Возвращает полуинтервал [начало периода, начало следующего периода)
+    года, месяца или дня в текущем часовом поясе. Для несуществующей даты
+    возбуждает ValueError.
+    """
+    start = datetime(year, month or 1, day or 1)
+    if day:
+        end = start + timedelta(days=1)
+    elif month:
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+    else:
+        end = datetime(year + 1, 1, 1)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+class PostQuerySet(models.QuerySet):
+    """
+    Набор запросов постов с оптимизированными выборками для страниц,
+    на которых пост выводится не целиком.
+    """
+
+    # Объемные поля, которые не нужны при выводе списков постов
+    HEAVY_FIELDS = ('body', 'body_html', 'search_vector')
+
+    def for_list(self):
+        """
+        Выборка для списков постов: автор загружается тем же запросом,
+        теги - одним дополнительным запросом на всю страницу, а тело
+        поста не загружается (выводится заранее прорисованный отрывок).
+        """
+        return self.select_related('author').prefetch_related('tags').defer(*self.HEAVY_FIELDS)
+
+    def for_feed(self):
+        """ Выборка для новостной ленты: заголовок, отрывок и даты """
+        return self.only('title', 'slug', 'publish', 'updated', 'body_excerpt')
 
+    def for_links(self):
+        """ Выборка для ссылок на посты: только поля канонического url-адреса """
+        return self.only('title', 'slug', 'publish', 'updated')
 
+    def most_commented(self, count: int):
+        """ Посты с наибольшим числом активных комментариев (для ссылок) """
+        return self.for_links().order_by('-active_comment_count')[:count]
 
-class PublishedManager(models.Manager):
+    def published_on(self, year, month=None, day=None):
+        """
+        Посты, опубликованные в заданный год, месяц или день. Вместо
+        извлечения частей даты (publish__year/__month/__day), для которых
+        не используется индекс, задается полуинтервал дат периода (см.
+        period_range). Для несуществующей даты возвращается пустой набор.
+        """
+        try:
+            start, end = period_range(year, month, day)
+        except ValueError:
+            return self.none()
+        return self.filter(publish__gte=start, publish__lt=end)
+
+
+class PublishedManager(models.Manager.from_queryset(PostQuerySet)):
     """ Класс модельного менеджера. Позволяет извлекать посты со статусом PUBLISHED """
     
     def get_queryset(self):
@@ -23,6 +90,9 @@ class Post(models.Model):
 
         DRAFT = 'DF', 'Draft'
         PUBLISHED = 'PB', 'Published'
+        # Пост, дата публикации которого еще не наступила. В момент
+        # публикации команда publish_scheduled переводит его в PUBLISHED
+        SCHEDULED = 'SC', 'Scheduled'
 
     # Заголовок поста. Поле с типом CharField, которое
     # транслируется в солбец VARCHAR в базе данных SQL
@@ -43,6 +113,23 @@ class Post(models.Model):
     # транслируется в солбец Text в базе данных SQL.
     body = models.TextField()
 
+    # Заранее прорисованный из markdown html тела поста и его отрывок
+    # для списка постов. Обновляются при сохранении поста, если
+    # изменился хеш тела поста, хранящийся в поле body_hash.
+    body_html = models.TextField(
+        blank=True,
+        editable=False # поле не отображается в формах
+    )
+    body_excerpt = models.TextField(
+        blank=True,
+        editable=False
+    )
+    body_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False
+    )
+
     # Поле для хранения даты и времени публикации поста.
     # Поле с типом DateTimeField транслируется в солбец
     # DATETIME в базе данных SQL.
@@ -81,7 +168,25 @@ class Post(models.Model):
         related_name='blog_posts', # имя обратной связи, от  User к Post (по сути это имя таблицы в базе)
     )
 
-    objects = models.Manager() # стандарный менеджер, применяемый по умолчанию
+    # Денормализованный счетчик активных комментариев к посту.
+    # Поддерживается атомарными UPDATE с F-выражениями при создании,
+    # модерации и удалении комментариев (см. Comment.save и
+    # CommentQuerySet.set_active) и пересчитывается командой
+    # reconcile_comment_counts.
+    active_comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+
+    # Хранимый взвешенный поисковый вектор заголовка и тела поста.
+    # В PostgreSQL по нему построен GIN-индекс, а значение обновляется
+    # при сохранении поста (см. blog.signals) и командой rebuild_search_index.
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager() # стандарный менеджер, применяемый по умолчанию
     published = PublishedManager() # конкретно-прикладной менеджер
     tags = TaggableManager() # этот менеджер позволит добавлять, извлекать и удалять теги из объекта Post
 
@@ -103,13 +208,119 @@ class Post(models.Model):
         indexes = [
             models.Index(
                 fields=['-publish'] # поле по которому будет проходить индексация
-            )
+            ),
+            # Индекс для выборки самых комментируемых опубликованных постов
+            models.Index(
+                fields=['status', '-active_comment_count'],
+                name='blog_post_most_commented_idx'
+            ),
+            # Составной индекс для запросов менеджера published
+            # (status = PUBLISHED с сортировкой списка постов по
+            # (-publish, -id), в том числе по курсору) и для поиска
+            # запланированных постов, которые пора опубликовать
+            models.Index(
+                fields=['status', '-publish', '-id'],
+                name='blog_post_status_publish_idx'
+            ),
+            # Частичный индекс для страницы поста: слаг и полуинтервал
+            # даты публикации (см. PostQuerySet.published_on)
+            models.Index(
+                fields=['slug', 'publish'],
+                condition=models.Q(status='PB'),
+                name='blog_post_published_slug_idx'
+            ),
         ]
 
     def __str__(self):
         """ Возвращает строковый литерал объекта в удобочитаемом представлении """
         return self.title
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """ Запоминает загруженные из базы значения полей """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def status_changed(self) -> bool:
+        """ Возвращает True, если статус поста отличается от загруженного из базы """
+        loaded = getattr(self, '_loaded_values', {})
+        return loaded.get('status', None) != self.status
+
+    def schedule(self) -> bool:
+        """
+        Переводит опубликованный пост с будущей датой публикации в статус
+        SCHEDULED, а запланированный пост с наступившей датой - в PUBLISHED.
+        Поэтому менеджеру published не нужно условие publish <= now(), и
+        результаты его запросов не зависят от времени. Возвращает True,
+        если статус изменился.
+        """
+        if self.status not in (self.Status.PUBLISHED, self.Status.SCHEDULED):
+            return False
+        status = self.Status.SCHEDULED if self.publish > timezone.now() else self.Status.PUBLISHED
+        changed, self.status = status != self.status, status
+        return changed
+
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет пост, предварительно обновляя прорисованный html тела
+        и статус поста с отложенной публикацией
+        """
+        if self.schedule() and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'status'}
+        if self.render_body() and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {
+                *kwargs['update_fields'], 'body_html', 'body_excerpt', 'body_hash'
+            }
+        with transaction.atomic(savepoint=False):
+            self.refresh_comment_count(kwargs.get('update_fields'))
+            super().save(*args, **kwargs)
+        self._loaded_values = {
+            **getattr(self, '_loaded_values', {}), 'status': self.status, 'publish': self.publish
+        }
+
+    def refresh_comment_count(self, update_fields=None) -> None:
+        """
+        Перед полным сохранением загруженного поста перечитывает счетчик
+        активных комментариев, блокируя строку поста до конца транзакции.
+        Счетчик меняется атомарными UPDATE (см. adjust_comment_count),
+        поэтому значение в памяти могло устареть.
+        """
+        if self._state.adding or update_fields is not None:
+            return
+        if 'active_comment_count' in self.get_deferred_fields():
+            return
+        count = (
+            Post.objects.select_for_update().filter(pk=self.pk)
+            .values_list('active_comment_count', flat=True).first()
+        )
+        # Если строка поста удалена, то пост будет вставлен заново
+        if count is not None:
+            self.active_comment_count = count
+
+    def render_body(self) -> bool:
+        """
+        Прорисовывает html тела поста и его отрывок, если тело изменилось.
+        Возвращает True, если поля были обновлены.
+        """
+        digest = body_hash(self.body)
+        if digest == self.body_hash:
+            return False
+        self.body_html = markdown_to_html(self.body)
+        self.body_excerpt = make_excerpt(self.body_html)
+        self.body_hash = digest
+        return True
+
+    @property
+    def rendered_body(self) -> str:
+        """ Возвращает html тела поста """
+        return mark_safe(self.body_html or markdown_to_html(self.body))
+
+    @property
+    def rendered_excerpt(self) -> str:
+        """ Возвращает html отрывка тела поста """
+        return mark_safe(self.body_excerpt or make_excerpt(markdown_to_html(self.body)))
+
     def get_absolute_url(self):
         """ Возвращает канонический url-адрес объекта """
         return reverse('blog:post_detail', args=[
@@ -121,6 +332,61 @@ class Post(models.Model):
         )
 
 
+def post_comments_changed(post_ids) -> None:
+    """
+    Сбрасывает кеши, зависящие от комментариев постов post_ids:
+    страницы этих постов, страницы их комментариев и самые
+    комментируемые посты боковой панели. Если изменился выведенный
+    в боковой панели список самых комментируемых постов, то и все
+    страницы блога. Вызывается после изменения счетчиков комментариев
+    """
+    posts = Post.objects.filter(pk__in=set(post_ids)).only('slug', 'publish')
+    shown = shown_most_commented()
+    current = shown is not None and [post.id for post in Post.published.most_commented(len(shown))]
+    comments_changed(
+        [
+            path for post in posts
+            for path in (post.get_absolute_url(), reverse('blog:post_comments', args=[post.id]))
+        ],
+        most_commented_changed=current != shown,
+    )
+
+
+def adjust_comment_count(post_id, delta: int) -> None:
+    """ Атомарно изменяет счетчик активных комментариев поста на delta """
+    if delta:
+        Post.objects.filter(pk=post_id).update(
+            active_comment_count=F('active_comment_count') + delta
+        )
+
+
+class CommentQuerySet(models.QuerySet):
+    """ Набор запросов комментариев """
+
+    def set_active(self, active: bool) -> int:
+        """
+        Одним UPDATE меняет статус комментариев и корректирует счетчики
+        активных комментариев затронутых постов. Возвращает число
+        измененных комментариев.
+        """
+        changed = self.filter(active=not active)
+        sign = 1 if active else -1
+
+        with transaction.atomic():
+            # Число меняющихся комментариев по каждому посту
+            per_post = list(
+                changed.order_by().values_list('post_id').annotate(total=Count('id'))
+            )
+            updated = changed.update(active=active, updated=timezone.now())
+            for post_id, total in per_post:
+                adjust_comment_count(post_id, sign * total)
+
+        # Массовый UPDATE не отправляет сигналы post_save,
+        # поэтому кеши страниц затронутых постов сбрасываются явно
+        post_comments_changed(post_id for post_id, _ in per_post)
+        return updated
+
+
 class Comment(models.Model):
     """ Модель комментария к посту """
 
@@ -152,12 +418,247 @@ class Comment(models.Model):
         default=True
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ['created']
         indexes = [
-            models.Index(fields=['created'])
+            models.Index(fields=['created']),
+            # Частичный индекс для списка активных комментариев поста
+            # в порядке создания (страницы по курсору на (created, id))
+            models.Index(
+                fields=['post', 'created', 'id'],
+                condition=models.Q(active=True),
+                name='blog_comment_active_idx'
+            ),
         ]
 
     def __str__(self):
         return f'Comment by {self.name} on {self.post}'
- 
\ No newline at end of file
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """ Запоминает загруженные из базы значения полей """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """ Сохраняет комментарий и корректирует счетчики активных комментариев """
+        loaded = getattr(self, '_loaded_values', {})
+        old_post_id = loaded.get('post_id', self.post_id)
+        was_active = loaded.get('active', False) is True
+
+        # Счетчики корректируются до сохранения, чтобы обработчики
+        # сигнала post_save видели новые значения (см. post_comments_changed)
+        with transaction.atomic():
+            if old_post_id == self.post_id:
+                adjust_comment_count(self.post_id, int(self.active) - int(was_active))
+            else:
+                adjust_comment_count(old_post_id, -int(was_active))
+                adjust_comment_count(self.post_id, int(self.active))
+            super().save(*args, **kwargs)
+
+        self._loaded_values = {**loaded, 'post_id': self.post_id, 'active': self.active}
+
+
+class SimilarPost(models.Model):
+    """
+    Предвычисленная связь поста с похожим на него постом. Строки
+    пересчитываются модулем blog.similarity через очередь SimilarRefresh
+    при изменении тегов поста и командой rebuild_similar_posts.
+    """
+
+    post = models.ForeignKey(
+        to=Post,
+        on_delete=models.CASCADE,
+        related_name='similar_links'
+    )
+    neighbor = models.ForeignKey(
+        to=Post,
+        on_delete=models.CASCADE,
+        related_name='+' # обратная связь не нужна
+    )
+
+    # Мера сходства наборов тегов постов (коэффициент Жаккара)
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['-score']
+        indexes = [
+            # Индекс для выборки похожих постов одного поста
+            models.Index(fields=['post', '-score'])
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'neighbor'], name='blog_similarpost_unique_pair'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.neighbor_id} is similar to {self.post_id} ({self.score:.2f})'
+
+
+class SimilarRefresh(models.Model):
+    """
+    Пост в очереди пересчета похожих постов. Сигналы ставят посты в
+    очередь в транзакции изменения, а команда refresh_similar_posts
+    пересчитывает их порциями (см. blog.similarity).
+    """
+
+    # Идентификатор, а не внешний ключ: при удалении поста в очередь
+    # ставятся ссылавшиеся на него посты, которые могут удаляться тем же
+    # запросом. Такие строки просто удаляются из очереди при пересчете
+    post_id = models.BigIntegerField(
+        unique=True
+    )
+
+    # Время последней постановки в очередь. Строка, обновленная во время
+    # пересчета, остается в очереди до следующего прохода
+    requested = models.DateTimeField(
+        default=timezone.now
+    )
+
+    class Meta:
+        indexes = [
+            # Индекс для выборки постов в порядке постановки в очередь
+            models.Index(fields=['requested'])
+        ]
+
+    def __str__(self):
+        return f'Refresh similar posts of {self.post_id}'
+
+
+class ArchivePeriod(models.Model):
+    """
+    Число опубликованных постов за год, месяц или день. Строки за месяц
+    имеют day = 0, за год - month = 0 и day = 0. Периоды без постов в
+    таблице отсутствуют. Строки пересчитываются модулем blog.archive при
+    публикации, снятии с публикации, переносе и удалении постов и командой
+    rebuild_archive.
+    """
+
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField(
+        default=0 # 0 - строка за весь год
+    )
+    day = models.PositiveSmallIntegerField(
+        default=0 # 0 - строка за весь месяц
+    )
+    post_count = models.PositiveIntegerField(
+        default=0
+    )
+
+    class Meta:
+        ordering = ['-year', '-month', '-day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['year', 'month', 'day'], name='blog_archiveperiod_unique_period'
+            )
+        ]
+
+    def __str__(self):
+        period = '-'.join(str(part) for part in (self.year, self.month, self.day) if part)
+        return f'{period}: {self.post_count} post(s)'
+
+    @property
+    def start(self) -> date:
+        """ Первый день периода (для вывода названия месяца и дня) """
+        return date(self.year, self.month or 1, self.day or 1)
+
+    def get_absolute_url(self):
+        """ Возвращает url-адрес архива за период """
+        args = [part for part in (self.year, self.month, self.day) if part]
+        name = {1: 'post_archive_year', 2: 'post_archive_month', 3: 'post_archive_day'}[len(args)]
+        return reverse(f'blog:{name}', args=args)
+
+
+class TagStats(models.Model):
+    """
+    Денормализованные данные тега: число опубликованных постов с тегом
+    и их идентификаторы в порядке списка постов (-publish, -id). Строки
+    пересчитываются модулем blog.tagstats при изменении тегов и статуса
+    постов и командой rebuild_tag_stats.
+    """
+
+    tag = models.OneToOneField(
+        to=Tag,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    post_count = models.PositiveIntegerField(
+        default=0
+    )
+    post_ids = models.JSONField(
+        default=list
+    )
+
+    class Meta:
+        verbose_name_plural = 'tag stats'
+        indexes = [
+            # Индекс для выборки самых популярных тегов (облако тегов)
+            models.Index(fields=['-post_count'])
+        ]
+
+    def __str__(self):
+        return f'{self.tag_id}: {self.post_count} post(s)'
+
+
+class OutgoingEmail(models.Model):
+    """
+    Письмо в очереди отправки. Представления ставят письма в очередь,
+    а команда send_queued_mail отправляет их порциями (см. blog.mail).
+    """
+
+    class Status(models.TextChoices):
+        """ Подкласс перечисления статуса письма """
+
+        PENDING = 'PD', 'Pending'
+        SENT = 'ST', 'Sent'
+        FAILED = 'FL', 'Failed'
+
+    subject = models.CharField(
+        max_length=512
+    )
+    message = models.TextField()
+    from_email = models.CharField(
+        max_length=254,
+        blank=True
+    )
+    to = models.EmailField()
+    status = models.CharField(
+        max_length=2,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+
+    # Число неудачных попыток отправки и время следующей попытки.
+    # После каждой неудачи интервал до следующей попытки удваивается.
+    attempts = models.PositiveSmallIntegerField(
+        default=0
+    )
+    next_attempt = models.DateTimeField(
+        default=timezone.now
+    )
+    last_error = models.TextField(
+        blank=True
+    )
+    created = models.DateTimeField(
+        auto_now_add=True
+    )
+    sent = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            # Индекс для выборки писем, которые пора отправить
+            models.Index(fields=['status', 'next_attempt'])
+        ]
+
+    def __str__(self):
+        return f'{self.subject} to {self.to}'
+
@@ -0,0 +1,262 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    """ Исключение для поврежденного или чужого курсора """
+
+
+class KeysetPage(Sequence):
+    """ Страница объектов, полученная по курсору """
+
+    # Признак, по которому шаблон pagination.html отличает страницу
+    # по курсору от страницы классического Paginator
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        """ Курсор следующей страницы (после последнего объекта) """
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], forward=True)
+
+    @property
+    def previous_cursor(self):
+        """ Курсор предыдущей страницы (перед первым объектом) """
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], forward=False)
+
+
+class KeysetPaginator:
+    """
+    Постраничная разбивка по ключу (keyset/cursor pagination).
+
+    Вместо OFFSET и COUNT(*) следующая страница выбирается условием
+    "после последнего показанного объекта" по полям сортировки, поэтому
+    стоимость запроса не растет с номером страницы и использует индекс
+    по этим полям. Последнее поле сортировки должно быть уникальным.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-publish', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        opts = object_list.model._meta
+        self._fields = [
+            (opts.get_field(name.lstrip('-')), name.startswith('-'))
+            for name in self.ordering
+        ]
+
+    def encode_cursor(self, obj, forward=True) -> str:
+        """ Возвращает непрозрачный курсор для позиции объекта obj """
+        values = [field.value_to_string(obj) for field, _ in self._fields]
+        payload = json.dumps([values, 'n' if forward else 'p'], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str):
+        """ Возвращает значения полей и направление, закодированные в курсоре """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values, direction = json.loads(base64.urlsafe_b64decode(padded))
+            if len(values) != len(self._fields) or direction not in ('n', 'p'):
+                raise InvalidCursor(cursor)
+            values = [field.to_python(value) for (field, _), value in zip(self._fields, values)]
+        except (ValueError, TypeError, binascii.Error, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+        return values, direction == 'n'
+
+    def _seek(self, values, forward: bool) -> Q:
+        """
+        Возвращает условие "строго после" (forward=True) или "строго до"
+        позиции, заданной значениями полей сортировки:
+        (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ...
+        """
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(self._fields, values):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal & Q(**{f'{field.name}__{lookup}': value})
+            equal &= Q(**{field.name: value})
+        return condition
+
+    def _query(self, cursor):
+        """
+        Возвращает набор запросов страницы (на один объект больше размера
+        страницы, чтобы узнать, есть ли следующая), направление перехода
+        и признак наличия курсора
+        """
+        if not cursor:
+            return self.object_list.order_by(*self.ordering)[:self.per_page + 1], True, False
+
+        values, forward = self.decode_cursor(cursor)
+        queryset = self.object_list.filter(self._seek(values, forward))
+        if forward:
+            ordering = self.ordering
+        else:
+            # Для предыдущей страницы объекты выбираются в обратном порядке
+            # и затем разворачиваются
+            ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+        return queryset.order_by(*ordering)[:self.per_page + 1], forward, True
+
+    def _make_page(self, items, forward, has_cursor) -> KeysetPage:
+        """ Создает страницу из выбранных объектов """
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if forward:
+            return KeysetPage(items, self, has_more, has_cursor)
+        return KeysetPage(items[::-1], self, True, has_more)
+
+    def page(self, cursor=None) -> KeysetPage:
+        """ Возвращает страницу, заданную курсором. Без курсора - первую страницу """
+        queryset, forward, has_cursor = self._query(cursor)
+        return self._make_page(list(queryset), forward, has_cursor)
+
+    async def apage(self, cursor=None) -> KeysetPage:
+        """ Асинхронная версия page() """
+        queryset, forward, has_cursor = self._query(cursor)
+        return self._make_page([obj async for obj in queryset], forward, has_cursor)
+
+
+def paginate_posts(request, queryset, per_page):
+    """
+    Возвращает страницу постов для запроса request.
+
+    В режиме BLOG_PAGINATION_MODE = 'keyset' страница выбирается по
+    GET-параметру cursor. Ссылки вида ?page=N, а также режим 'offset',
+    обрабатываются классическим Paginator.
+    """
+    if settings.BLOG_PAGINATION_MODE == 'keyset' and 'page' not in request.GET:
+        paginator = KeysetPaginator(queryset, per_page)
+        try:
+            return paginator.page(request.GET.get('cursor'))
+        except InvalidCursor:
+            # Если курсор поврежден, то выдать первую страницу
+            return paginator.page()
+
+    paginator = Paginator(queryset, per_page)
+    page_number = request.GET.get('page', 1)
+    try:
+        return paginator.page(page_number)
+    except PageNotAnInteger:
+        # Если page_number не целое число, то выдать первую страницу
+        return paginator.page(1)
+    except EmptyPage:
+        # Если page_number находиться вне диапазона, то
+        # выдать последнюю страницу
+        return paginator.page(paginator.num_pages)
+
+
+async def apaginate_posts(request, queryset, per_page):
+    """ Асинхронная версия paginate_posts() """
+    if settings.BLOG_PAGINATION_MODE == 'keyset' and 'page' not in request.GET:
+        paginator = KeysetPaginator(queryset, per_page)
+        try:
+            return await paginator.apage(request.GET.get('cursor'))
+        except InvalidCursor:
+            return await paginator.apage()
+
+    # Классический Paginator не имеет асинхронного интерфейса
+    return await sync_to_async(paginate_posts)(request, queryset, per_page)
+
+
+def paginate_ids(request, post_ids, per_page, queryset):
+    """
+    Возвращает страницу постов по готовому упорядоченному списку их
+    идентификаторов (результаты поиска, посты тега). Список разбивается
+    на страницы в памяти, а из базы загружаются только посты страницы.
+    """
+    page = Paginator(post_ids, per_page).get_page(request.GET.get('page'))
+    posts = queryset.in_bulk(page.object_list)
+    page.object_list = [posts[post_id] for post_id in page.object_list if post_id in posts]
+    return page
+
+
+async def apaginate_ids(request, post_ids, per_page, queryset):
+    """ Асинхронная версия paginate_ids() """
+    page = Paginator(post_ids, per_page).get_page(request.GET.get('page'))
+    posts = await queryset.ain_bulk(page.object_list)
+    page.object_list = [posts[post_id] for post_id in page.object_list if post_id in posts]
+    return page
+
+
+def estimate_table_rows(model, using) -> int | None:
+    """
+    Возвращает приблизительное число строк таблицы модели по статистике
+    планировщика базы данных (pg_class.reltuples в PostgreSQL, sqlite_stat1
+    после ANALYZE в SQLite) или None, если статистики нет.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql, params = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table]
+    elif connection.vendor == 'sqlite':
+        sql, params = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table]
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        # Таблица sqlite_stat1 создается только командой ANALYZE
+        return None
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для больших таблиц (списки объектов панели администратора).
+
+    COUNT(*) по большой таблице читает ее целиком, поэтому число строк
+    нефильтрованной таблицы берется из статистики базы данных, а число
+    отфильтрованных строк считается не дальше BLOG_ADMIN_COUNT_LIMIT строк.
+    Небольшие таблицы считаются точно.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        limit = settings.BLOG_ADMIN_COUNT_LIMIT
+        if not queryset.query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
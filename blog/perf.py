@@ -0,0 +1,206 @@
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.apps import apps
+from django.conf import settings
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.decorators import sync_and_async_middleware
+
+
+# Инструментирование запросов. Middleware создает для каждого запроса
+# объект RequestMetrics и делает его текущим через контекстную переменную,
+# а обработчики запросов к базе данных, прорисовки шаблонов, фильтра
+# markdown и тегов боковой панели добавляют в него затраченное время.
+# Контекстная переменная копируется в потоки sync_to_async, поэтому
+# учитываются и запросы асинхронных представлений.
+
+logger = logging.getLogger('blog.perf')
+
+_current_metrics = ContextVar('blog_perf_metrics', default=None)
+
+# Метрики в порядке вывода в заголовке Server-Timing и в журнале
+TIMINGS = ('db', 'template', 'markdown', 'sidebar')
+
+
+class RequestMetrics:
+    """ Метрики одного запроса: время по видам работы и число SQL-запросов """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings = defaultdict(float)
+        self.queries = 0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.timings[name] += seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+
+@contextmanager
+def timed(name: str):
+    """
+    Контекстный менеджер (и декоратор), добавляющий время выполнения
+    блока к метрике name текущего запроса. Вне запроса ничего не делает
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - start)
+
+
+def query_timer(execute, sql, params, many, context):
+    """ Обработчик connection.execute_wrappers, учитывающий SQL-запросы запроса """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add('db', time.perf_counter() - start)
+        metrics.queries += 1
+
+
+class TimedTemplate(Template):
+    """ Шаблон, учитывающий время прорисовки в метрике template """
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Бэкенд шаблонов Django, учитывающий время прорисовки шаблонов.
+    Вложенные шаблоны (extends, include) прорисовываются движком без
+    бэкенда, поэтому время учитывается один раз
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def blog_template_names() -> list[str]:
+    """ Возвращает имена всех шаблонов приложения blog """
+    root = Path(apps.get_app_config('blog').path) / 'templates'
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob('*.html'))
+
+
+def warm_templates() -> list[str]:
+    """
+    Загружает и компилирует шаблоны приложения blog во всех движках Django
+    с кеширующим загрузчиком (cached.Loader), чтобы первые запросы после
+    запуска не читали и не разбирали шаблоны. Движки без кеширующего
+    загрузчика пропускаются. Возвращает имена загруженных шаблонов.
+    """
+    names = blog_template_names()
+    warmed = []
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        if not any(isinstance(loader, CachedLoader) for loader in backend.engine.template_loaders):
+            continue
+        for name in names:
+            backend.engine.get_template(name)
+        warmed = names
+    return warmed
+
+
+def warm_templates_on_startup() -> None:
+    """
+    Прогревает шаблоны при запуске процесса сервера, если включен
+    BLOG_TEMPLATE_WARMUP. Вызывается из config/wsgi.py и config/asgi.py,
+    поэтому команды manage.py и тесты шаблоны не прогревают
+    """
+    if settings.BLOG_TEMPLATE_WARMUP:
+        warm_templates()
+
+
+def server_timing(metrics: RequestMetrics, total: float) -> str:
+    """ Возвращает значение заголовка Server-Timing (длительности в мс) """
+    entries = [f'total;dur={total * 1000:.1f}']
+    for name in TIMINGS:
+        if name in metrics.timings:
+            entry = f'{name};dur={metrics.timings[name] * 1000:.1f}'
+            if name == 'db':
+                entry += f';desc="{metrics.queries} queries"'
+            entries.append(entry)
+    return ', '.join(entries)
+
+
+def log_record(request, response, metrics: RequestMetrics, total: float) -> dict:
+    """ Возвращает запись журнала blog.perf для запроса """
+    match = request.resolver_match
+    record = {
+        'view': match.view_name if match else None,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'total_ms': round(total * 1000, 2),
+        'db_queries': metrics.queries,
+    }
+    for name in TIMINGS:
+        record[f'{name}_ms'] = round(metrics.timings.get(name, 0.0) * 1000, 2)
+    return record
+
+
+def _finish(request, response, metrics: RequestMetrics) -> None:
+    total = metrics.elapsed()
+    if settings.BLOG_PERF_SERVER_TIMING:
+        response.headers['Server-Timing'] = server_timing(metrics, total)
+    if random.random() < settings.BLOG_PERF_LOG_SAMPLE_RATE:
+        logger.info(json.dumps(log_record(request, response, metrics, total)))
+
+
+@sync_and_async_middleware
+def performance_middleware(get_response):
+    """
+    Middleware, собирающее метрики запроса и отдающее их в заголовке
+    Server-Timing (BLOG_PERF_SERVER_TIMING) и в журнале blog.perf
+    (доля запросов BLOG_PERF_LOG_SAMPLE_RATE). Должно быть первым
+    в MIDDLEWARE, чтобы учитывать время остальных middleware
+    """
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            metrics = RequestMetrics()
+            token = _current_metrics.set(metrics)
+            try:
+                response = await get_response(request)
+            finally:
+                _current_metrics.reset(token)
+            _finish(request, response, metrics)
+            return response
+
+        return markcoroutinefunction(middleware)
+
+    def middleware(request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        try:
+            response = get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        _finish(request, response, metrics)
+        return response
+
+    return middleware
@@ -0,0 +1,50 @@
+import math
+import time
+
+from django.core.cache import cache
+
+
+# Ограничение частоты запросов алгоритмом token bucket. Состояние
+# корзины (число жетонов и время его вычисления) хранится в кеше, поэтому
+# ограничение общее для всех процессов. Чтение и запись состояния не
+# атомарны, и при одновременных запросах ограничение приблизительное.
+
+RATELIMIT_KEY_PREFIX = 'blog:ratelimit:'
+
+
+def take_tokens(buckets):
+    """
+    Забирает по жетону из каждой корзины buckets - кортежей (scope,
+    identity, capacity, period), где capacity - емкость корзины
+    scope:identity, которая полностью наполняется за period секунд.
+    Жетоны забираются, только если они есть во всех корзинах, поэтому
+    отклоненный запрос не расходует остальные корзины. Возвращает 0,
+    если жетоны получены, иначе число секунд до появления жетонов
+    """
+    now = time.time()
+    keys = [f'{RATELIMIT_KEY_PREFIX}{scope}:{identity}' for scope, identity, _, _ in buckets]
+    states = cache.get_many(keys)
+
+    retry_after = 0
+    refilled = {}
+    for key, (_, _, capacity, period) in zip(keys, buckets):
+        rate = capacity / period
+        tokens, updated = states.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        refilled[key] = (tokens, period)
+        if tokens < 1:
+            retry_after = max(retry_after, (1 - tokens) / rate)
+
+    for key, (tokens, period) in refilled.items():
+        if not retry_after:
+            tokens -= 1
+        cache.set(key, (tokens, now), timeout=math.ceil(period))
+    return retry_after
+
+
+def client_ip(request) -> str:
+    """
+    Возвращает ip-адрес клиента. За обратным прокси сервер должен передавать
+    адрес клиента в REMOTE_ADDR (например, через ProxyFix-подобное middleware)
+    """
+    return request.META.get('REMOTE_ADDR', '')
@@ -0,0 +1,36 @@
+import hashlib
+from functools import lru_cache
+
+import markdown
+from django.conf import settings
+from django.utils.text import Truncator
+
+
+# Расширения markdown, с которыми прорисовываются тела постов
+MARKDOWN_EXTENSIONS = ['extra', 'codehilite']
+
+
+def body_hash(text: str) -> str:
+    """ Возвращает хеш тела поста, по которому определяется актуальность HTML """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def markdown_to_html(text: str) -> str:
+    """ Конвертирует markdown в html без кеширования (тела постов) """
+    return markdown.markdown(text=text, extensions=MARKDOWN_EXTENSIONS)
+
+
+# Ограниченный LRU-кеш для произвольного текста, который прорисовывается
+# фильтром markdown вне полей модели Post. Размер кеша задается в настройках.
+# Тела постов через него не прорисовываются: их html хранится в полях
+# модели, а кеш, ограниченный числом записей, удерживал бы в памяти
+# целые тела постов.
+@lru_cache(maxsize=settings.BLOG_MARKDOWN_CACHE_SIZE)
+def render_markdown(text: str) -> str:
+    """ Конвертирует markdown в html """
+    return markdown_to_html(text)
+
+
+def make_excerpt(html: str) -> str:
+    """ Возвращает отрывок html, усеченный до заданного числа слов """
+    return Truncator(html).words(settings.BLOG_EXCERPT_WORDS, html=True, truncate=' …')
@@ -0,0 +1,134 @@
+import random
+from contextvars import ContextVar
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.decorators import sync_and_async_middleware
+
+from .cache import LAST_MODIFIED_KEY, LAST_WRITE_KEY
+
+
+# Маршрутизация чтения на реплики базы данных. Middleware разрешает
+# чтение с реплик только в безопасных (GET, HEAD) запросах к публичным
+# страницам, отмечая это контекстной переменной, а маршрутизатор
+# направляет на реплики чтение моделей блога. Запись, админ-панель и
+# запросы клиента в течение BLOG_REPLICA_STICKY_SECONDS после его
+# POST-запроса (cookie STICKY_COOKIE) обслуживаются основной базой данных.
+# Основной базой обслуживается и чтение в течение того же времени после
+# любой записи в базу данных блога, пока реплики могут отставать.
+
+_read_from_replicas = ContextVar('blog_read_from_replicas', default=False)
+
+# Приложения, чтение моделей которых направляется на реплики
+REPLICA_APPS = {'blog', 'taggit'}
+
+# Cookie, по которому чтение клиента выполняется с основной базы данных
+STICKY_COOKIE = 'blog_primary'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRouter:
+    """ Маршрутизатор, направляющий чтение данных блога на реплики """
+
+    def __init__(self):
+        # Репликами считаются все базы данных, кроме default
+        self.replicas = [alias for alias in settings.DATABASES if alias != 'default']
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or not _read_from_replicas.get():
+            return 'default'
+        if model._meta.app_label not in REPLICA_APPS:
+            return 'default'
+        # Связанные объекты читаются из той же базы, что и исходный объект
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база данных
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик повторяет основную базу данных
+        return db == 'default'
+
+
+def _may_use_replicas(request) -> bool:
+    return (
+        len(settings.DATABASES) > 1
+        and request.method in SAFE_METHODS
+        and STICKY_COOKIE not in request.COOKIES
+        and not request.path_info.startswith(reverse('admin:index'))
+    )
+
+
+# Время последней записи берется из ключа LAST_WRITE_KEY, а при его
+# отсутствии - из времени последнего изменения содержимого
+WRITE_KEYS = [LAST_WRITE_KEY, LAST_MODIFIED_KEY]
+
+
+def _replicas_caught_up(values) -> bool:
+    """
+    Проверяет, что с последней записи в базу данных блога прошло больше
+    BLOG_REPLICA_STICKY_SECONDS. Иначе реплики могут отставать, а данные,
+    прочитанные с них, попали бы в кеши страниц, лент и боковой панели
+    """
+    last_write = max(values.values(), default=None)
+    if last_write is None:
+        return False
+    return timezone.now() - last_write > timedelta(seconds=settings.BLOG_REPLICA_STICKY_SECONDS)
+
+
+def reads_from_replicas(request) -> bool:
+    """ Проверяет, можно ли читать данные запроса request с реплик """
+    return _may_use_replicas(request) and _replicas_caught_up(cache.get_many(WRITE_KEYS))
+
+
+async def areads_from_replicas(request) -> bool:
+    """ Асинхронная версия reads_from_replicas() """
+    return _may_use_replicas(request) and _replicas_caught_up(await cache.aget_many(WRITE_KEYS))
+
+
+def _stick(request, response):
+    """ После небезопасного запроса закрепляет чтение клиента за основной базой """
+    if request.method not in SAFE_METHODS and settings.BLOG_REPLICA_STICKY_SECONDS:
+        response.set_cookie(
+            STICKY_COOKIE, '1', max_age=settings.BLOG_REPLICA_STICKY_SECONDS,
+            httponly=True, samesite='Lax',
+        )
+    return response
+
+
+@sync_and_async_middleware
+def replica_middleware(get_response):
+    """ Middleware, разрешающее чтение с реплик в безопасных запросах """
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token = _read_from_replicas.set(await areads_from_replicas(request))
+            try:
+                response = await get_response(request)
+            finally:
+                _read_from_replicas.reset(token)
+            return _stick(request, response)
+
+        return markcoroutinefunction(middleware)
+
+    def middleware(request):
+        token = _read_from_replicas.set(reads_from_replicas(request))
+        try:
+            response = get_response(request)
+        finally:
+            _read_from_replicas.reset(token)
+        return _stick(request, response)
+
+    return middleware
@@ -0,0 +1,49 @@
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .models import Post
+
+
+def next_scheduled_publish():
+    """ Возвращает ближайшее время публикации запланированного поста или None """
+    return (
+        Post.objects.filter(status=Post.Status.SCHEDULED)
+        .order_by('publish').values_list('publish', flat=True).first()
+    )
+
+
+def publish_due_posts(batch_size: int = 100) -> list[Post]:
+    """
+    Публикует запланированные посты, дата публикации которых наступила.
+    Возвращает опубликованные посты.
+
+    Статус каждого поста меняется условным UPDATE, поэтому пост публикует
+    только один из параллельных обработчиков, а пост, который успели
+    вернуть в черновики, не публикуется. Затем отправляется сигнал
+    post_save, по которому сбрасываются кеши страниц, лент и боковой
+    панели и обновляются поисковый индекс, похожие посты и данные тегов
+    (см. blog.signals). Между запланированными публикациями кеши остаются
+    действительными.
+    """
+    now = timezone.now()
+    due = list(
+        Post.objects.filter(status=Post.Status.SCHEDULED, publish__lte=now)
+        .order_by('publish')[:batch_size]
+    )
+    published = []
+    for post in due:
+        claimed = Post.objects.filter(pk=post.pk, status=Post.Status.SCHEDULED).update(
+            status=Post.Status.PUBLISHED, updated=now
+        )
+        if not claimed:
+            continue
+        # Загруженный статус SCHEDULED остается в post._loaded_values,
+        # поэтому обработчики сигнала видят смену статуса
+        post.status, post.updated = Post.Status.PUBLISHED, now
+        post_save.send(
+            sender=Post, instance=post, created=False,
+            update_fields=frozenset({'status', 'updated'}), raw=False, using=post._state.db,
+        )
+        post._loaded_values['status'] = post.status
+        published.append(post)
+    return published
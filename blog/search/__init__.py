@@ -0,0 +1,38 @@
+from functools import cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router
+from django.utils.module_loading import import_string
+
+from ..models import Post
+from .base import BaseSearchBackend
+
+
+# Бэкенды поиска, выбираемые по типу базы данных, если
+# настройка BLOG_SEARCH_BACKEND не задана
+DEFAULT_BACKENDS = {
+    'postgresql': 'blog.search.postgres.PostgresSearchBackend',
+    'sqlite': 'blog.search.sqlite.SQLiteSearchBackend',
+}
+
+
+@cache
+def get_backend() -> BaseSearchBackend:
+    """ Возвращает экземпляр поискового бэкенда проекта """
+    path = settings.BLOG_SEARCH_BACKEND
+    if not path:
+        vendor = connections[router.db_for_read(Post)].vendor
+        try:
+            path = DEFAULT_BACKENDS[vendor]
+        except KeyError:
+            raise ImproperlyConfigured(
+                f'No default blog search backend for the {vendor!r} database; '
+                'set BLOG_SEARCH_BACKEND.'
+            )
+    return import_string(path)()
+
+
+def search_posts(query: str) -> list[int]:
+    """ Возвращает идентификаторы опубликованных постов по убыванию релевантности """
+    return get_backend().search(query)
@@ -0,0 +1,53 @@
+from django.conf import settings
+
+from ..models import Post
+
+
+class BaseSearchBackend:
+    """
+    Базовый класс поискового бэкенда.
+
+    Бэкенд возвращает идентификаторы опубликованных постов (для панели
+    администратора - всех постов), упорядоченные по релевантности, и
+    поддерживает собственный индекс в актуальном состоянии при сохранении
+    и удалении постов (см. blog.signals).
+    """
+
+    # Вес совпадений в заголовке относительно совпадений в теле поста
+    title_weight = 2.5
+    body_weight = 1.0
+
+    def search(self, query: str, published_only: bool = True) -> list[int]:
+        """
+        Возвращает идентификаторы постов, соответствующих запросу. Если
+        published_only=False, то и неопубликованных постов
+        """
+        raise NotImplementedError
+
+    def index_posts(self, posts) -> None:
+        """ Добавляет посты в индекс или обновляет их """
+        raise NotImplementedError
+
+    def remove_posts(self, post_ids) -> None:
+        """ Удаляет посты из индекса """
+        raise NotImplementedError
+
+    def rebuild(self, batch_size: int = 1000) -> int:
+        """ Перестраивает индекс всех постов порциями. Возвращает число постов """
+        queryset = Post.objects.only('id', 'title', 'body', 'status').order_by('id')
+
+        last_id = 0
+        total = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            self.index_posts(batch)
+            last_id = batch[-1].id
+            total += len(batch)
+        return total
+
+    @property
+    def max_results(self) -> int:
+        """ Максимальное число постов в результатах поиска """
+        return settings.BLOG_SEARCH_MAX_RESULTS
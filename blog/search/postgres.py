@@ -0,0 +1,59 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import F
+
+from ..models import Post
+from .base import BaseSearchBackend
+
+
+# Минимальный ранг поста, попадающего в результаты поиска
+MIN_RANK = 0.3
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Полнотекстовый поиск PostgreSQL по хранимому полю Post.search_vector,
+    по которому построен GIN-индекс.
+    """
+
+    # Взвешенный поисковый вектор поста: совпадения в заголовке (вес A)
+    # ранжируются выше совпадений в теле поста (вес B)
+    search_vector = SearchVector('title', weight='A') + SearchVector('body', weight='B')
+
+    def search(self, query, published_only=True):
+        """ Ранжирует посты по хранимому вектору. Условие @@ использует GIN-индекс """
+        search_query = SearchQuery(query)
+        posts = Post.published if published_only else Post.objects
+        # Веса рангов в порядке D, C, B, A
+        weights = [0.1, 0.2, self.body_weight / self.title_weight, 1.0]
+        return list(
+            posts.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query, weights=weights))
+            .filter(rank__gte=MIN_RANK)
+            .order_by('-rank', '-publish')
+            .values_list('id', flat=True)[:self.max_results]
+        )
+
+    def index_posts(self, posts):
+        """ Пересчитывает хранимые поисковые векторы постов одним UPDATE """
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(
+            search_vector=self.search_vector
+        )
+
+    def remove_posts(self, post_ids):
+        """ Векторы удаленных постов удаляются вместе со строками постов """
+
+    def rebuild(self, batch_size=1000):
+        """ Пересчитывает векторы порциями по первичному ключу без загрузки постов """
+        ids = Post.objects.order_by('id').values_list('id', flat=True)
+
+        last_id = 0
+        total = 0
+        while True:
+            batch = list(ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            total += Post.objects.filter(id__gte=batch[0], id__lte=batch[-1]).update(
+                search_vector=self.search_vector
+            )
+            last_id = batch[-1]
+        return total
@@ -0,0 +1,81 @@
+import re
+
+from django.db import connections, router
+
+from ..models import Post
+from .base import BaseSearchBackend
+
+
+# Виртуальная таблица FTS5 с инвертированным индексом заголовков и тел
+# постов. rowid строки совпадает с идентификатором поста. Таблица
+# создается миграцией 0008_post_search_fts, а неопубликованные посты
+# индексируются с миграции 0015_index_unpublished_posts.
+FTS_TABLE = 'blog_post_fts'
+
+# Слова поискового запроса
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(query: str) -> str:
+    """
+    Возвращает выражение MATCH для FTS5. Каждое слово запроса берется
+    в кавычки, чтобы символы синтаксиса FTS5 не интерпретировались,
+    а слова объединяются неявным AND.
+    """
+    return ' '.join(f'"{word}"' for word in WORD_RE.findall(query))
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    Полнотекстовый поиск SQLite на основе FTS5 с ранжированием BM25,
+    в котором совпадения в заголовке весят больше совпадений в теле поста.
+    """
+
+    def search(self, query, published_only=True):
+        """
+        Ранжирует посты функцией bm25(). Меньшее значение - более релевантный
+        пост. Статус постов проверяется соединением с таблицей постов
+        по первичному ключу
+        """
+        match = build_match_query(query)
+        if not match:
+            return []
+        posts = Post._meta.db_table
+        status = f'AND {posts}.status = %s ' if published_only else ''
+        with connections[router.db_for_read(Post)].cursor() as cursor:
+            cursor.execute(
+                f'SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} '
+                f'JOIN {posts} ON {posts}.id = {FTS_TABLE}.rowid '
+                f'WHERE {FTS_TABLE} MATCH %s {status}'
+                f'ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s',
+                [
+                    match, *([Post.Status.PUBLISHED] if published_only else []),
+                    self.title_weight, self.body_weight, self.max_results,
+                ],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_posts(self, posts):
+        """ Индексирует посты, заменяя их прежние строки в индексе """
+        posts = list(posts)
+        with connections[router.db_for_write(Post)].cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(post.pk,) for post in posts]
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+                [(post.pk, post.title, post.body) for post in posts],
+            )
+
+    def remove_posts(self, post_ids):
+        """ Удаляет посты из индекса FTS5 """
+        with connections[router.db_for_write(Post)].cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(post_id,) for post_id in post_ids]
+            )
+
+    def rebuild(self, batch_size=1000):
+        """ Очищает индекс FTS5 и заполняет его заново """
+        with connections[router.db_for_write(Post)].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        return super().rebuild(batch_size)
@@ -0,0 +1,209 @@
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from taggit.models import Tag
+
+from .archive import refresh_archive
+from .cache import content_changed, invalidate_feeds
+from .models import Comment, Post, SimilarPost, adjust_comment_count, post_comments_changed
+from .perf import query_timer
+from .search import get_backend
+from .similarity import schedule_similar_refresh
+from .tagstats import refresh_tag_stats
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_blog_caches(sender, **kwargs):
+    """ Сбрасывает кеши блога при изменении постов """
+    content_changed()
+
+
+def _deleted_with_post(origin) -> bool:
+    """
+    Проверяет, что удаление начато с поста или набора постов. Тогда
+    комментарии удаляются каскадно вместе со своим постом, а кеши
+    сбрасывает обработчик удаления поста, поэтому счетчик и кеши
+    по каждому комментарию не обновляются
+    """
+    return isinstance(origin, Post) or (isinstance(origin, QuerySet) and origin.model is Post)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, origin=None, **kwargs):
+    """
+    Уменьшает счетчик активных комментариев поста при удалении комментария.
+    Подключается раньше invalidate_comment_caches, чтобы при сбросе кешей
+    счетчик был актуален
+    """
+    if instance.active and not _deleted_with_post(origin):
+        adjust_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_caches(sender, instance, origin=None, **kwargs):
+    """
+    Сбрасывает кеши страницы поста при изменении его комментариев.
+    Если комментарий перенесен к другому посту, то и страницу прежнего поста
+    """
+    if _deleted_with_post(origin):
+        return
+    post_ids = {instance.post_id, getattr(instance, '_loaded_values', {}).get('post_id')}
+    post_comments_changed(post_ids - {None})
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    """ Обновляет пост в поисковом индексе """
+    get_backend().index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    """ Удаляет пост из поискового индекса """
+    get_backend().remove_posts([instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def refresh_similar_on_tags_change(sender, instance, action, **kwargs):
+    """ Ставит пост в очередь пересчета похожих постов при изменении его тегов """
+    if isinstance(instance, Post) and action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_similar_refresh([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def refresh_similar_on_status_change(sender, instance, created, **kwargs):
+    """ Ставит пост в очередь пересчета похожих постов при публикации или снятии с публикации """
+    if not created and instance.status_changed():
+        schedule_similar_refresh([instance.pk])
+
+
+@receiver(pre_delete, sender=Post)
+def remember_similar_referrers(sender, instance, **kwargs):
+    """ Запоминает посты, у которых удаляемый пост числится похожим """
+    instance._similar_referrers = list(
+        SimilarPost.objects.filter(neighbor=instance).values_list('post_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def refresh_similar_on_delete(sender, instance, **kwargs):
+    """ Ставит в очередь пересчета посты, из списков похожих которых выбыл удаленный пост """
+    referrers = getattr(instance, '_similar_referrers', [])
+    if referrers:
+        schedule_similar_refresh(referrers)
+
+
+def _tag_slugs(post) -> list:
+    return list(post.tags.values_list('slug', flat=True))
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    """ Сбрасывает новостные ленты, в которые входит или входил сохраненный пост """
+    if instance.status == Post.Status.PUBLISHED or instance.status_changed():
+        invalidate_feeds(_tag_slugs(instance))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_tag_feeds(sender, instance, action, pk_set, **kwargs):
+    """ Сбрасывает ленты тегов, добавленных опубликованному посту или снятых с него """
+    if not isinstance(instance, Post) or instance.status != Post.Status.PUBLISHED:
+        return
+    if action == 'pre_clear':
+        # После очистки тегов поста их уже нельзя узнать
+        instance._feed_tag_slugs = _tag_slugs(instance)
+    elif action == 'post_clear':
+        invalidate_feeds(getattr(instance, '_feed_tag_slugs', []))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_feeds(Tag.objects.filter(pk__in=pk_set).values_list('slug', flat=True))
+
+
+@receiver(pre_delete, sender=Post)
+def remember_feed_tags(sender, instance, **kwargs):
+    """ Запоминает теги удаляемого опубликованного поста """
+    if instance.status == Post.Status.PUBLISHED:
+        instance._feed_tag_slugs = _tag_slugs(instance)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_feeds_on_delete(sender, instance, **kwargs):
+    """ Сбрасывает ленты, в которые входил удаленный пост """
+    if hasattr(instance, '_feed_tag_slugs'):
+        invalidate_feeds(instance._feed_tag_slugs)
+
+
+def _tag_ids(post) -> list:
+    return list(post.tags.values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def refresh_stats_on_tags_change(sender, instance, action, pk_set, **kwargs):
+    """
+    Пересчитывает данные тегов (см. blog.tagstats), добавленных опубликованному
+    посту или снятых с него, и сбрасывает страницы, на которых видны теги
+    """
+    if not isinstance(instance, Post) or instance.status != Post.Status.PUBLISHED:
+        return
+    if action == 'pre_clear':
+        instance._stats_tag_ids = _tag_ids(instance)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        refresh_tag_stats(pk_set if action != 'post_clear' else getattr(instance, '_stats_tag_ids', []))
+        content_changed()
+
+
+@receiver(post_save, sender=Post)
+def refresh_stats_on_status_change(sender, instance, **kwargs):
+    """
+    Пересчитывает данные тегов поста при его публикации, снятии с
+    публикации или смене даты публикации (она задает порядок постов тега)
+    """
+    publish_changed = getattr(instance, '_loaded_values', {}).get('publish') != instance.publish
+    if instance.status_changed() or (instance.status == Post.Status.PUBLISHED and publish_changed):
+        refresh_tag_stats(_tag_ids(instance))
+
+
+@receiver(pre_delete, sender=Post)
+def remember_stats_tags(sender, instance, **kwargs):
+    """ Запоминает теги удаляемого опубликованного поста """
+    if instance.status == Post.Status.PUBLISHED:
+        instance._stats_tag_ids = _tag_ids(instance)
+
+
+@receiver(post_delete, sender=Post)
+def refresh_stats_on_delete(sender, instance, **kwargs):
+    """ Пересчитывает данные тегов удаленного поста """
+    if hasattr(instance, '_stats_tag_ids'):
+        refresh_tag_stats(instance._stats_tag_ids)
+
+
+@receiver(post_save, sender=Post)
+def refresh_archive_on_status_change(sender, instance, **kwargs):
+    """
+    Пересчитывает архив (см. blog.archive) за годы прежней и новой даты
+    публикации при публикации, снятии с публикации или переносе поста
+    """
+    loaded = getattr(instance, '_loaded_values', {})
+    published = Post.Status.PUBLISHED in (loaded.get('status'), instance.status)
+    if published and (instance.status_changed() or loaded.get('publish') != instance.publish):
+        refresh_archive([loaded.get('publish'), instance.publish])
+        # Боковая панель могла быть закеширована заново до пересчета
+        content_changed()
+
+
+@receiver(post_delete, sender=Post)
+def refresh_archive_on_delete(sender, instance, **kwargs):
+    """ Пересчитывает архив за год удаленного опубликованного поста """
+    if instance.status == Post.Status.PUBLISHED:
+        refresh_archive([instance.publish])
+        content_changed()
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    """ Подключает учет SQL-запросов в метриках запроса (см. blog.perf) """
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
@@ -0,0 +1,186 @@
+import heapq
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from taggit.models import TaggedItem
+
+from .models import Post, SimilarPost, SimilarRefresh
+
+
+def _tagged_items():
+    """ Возвращает строки связи тегов с постами """
+    return TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Post))
+
+
+def jaccard(a: set, b: set) -> float:
+    """ Коэффициент Жаккара двух наборов тегов """
+    if not a or not b:
+        return 0.0
+    overlap = len(a & b)
+    return overlap / (len(a) + len(b) - overlap)
+
+
+def load_tag_sets(post_ids=None) -> dict[int, set[int]]:
+    """
+    Возвращает наборы идентификаторов тегов опубликованных постов.
+    Если post_ids не задан, то загружаются наборы тегов всех постов.
+    """
+    posts = Post.published.all()
+    if post_ids is not None:
+        posts = posts.filter(id__in=post_ids)
+    tag_sets = defaultdict(set)
+    rows = _tagged_items().filter(object_id__in=posts.values('id')).values_list('object_id', 'tag_id')
+    for post_id, tag_id in rows.iterator(chunk_size=5000):
+        tag_sets[post_id].add(tag_id)
+    return tag_sets
+
+
+def top_neighbors(post_id, tag_sets, index, publish, limit) -> list[tuple[float, int]]:
+    """
+    Возвращает не более limit пар (сходство, идентификатор) наиболее
+    похожих на пост постов. Кандидаты берутся из инвертированного индекса
+    тег -> посты, поэтому перебираются только посты с общими тегами.
+    """
+    tags = tag_sets.get(post_id, set())
+    candidates = set()
+    for tag_id in tags:
+        candidates.update(index[tag_id])
+    candidates.discard(post_id)
+
+    scored = (
+        (jaccard(tags, tag_sets[neighbor]), publish.get(neighbor), neighbor)
+        for neighbor in candidates
+    )
+    # При равном сходстве выше стоят более новые посты
+    best = heapq.nlargest(limit, scored, key=lambda item: (item[0], item[1]))
+    return [(score, neighbor) for score, _, neighbor in best if score > 0]
+
+
+def _index(tag_sets):
+    """ Возвращает инвертированный индекс тег -> посты и даты публикации постов """
+    index = defaultdict(set)
+    for candidate, tags in tag_sets.items():
+        for tag_id in tags:
+            index[tag_id].add(candidate)
+    publish = dict(Post.published.filter(id__in=tag_sets.keys()).values_list('id', 'publish'))
+    return index, publish
+
+
+def _sharing_tags(post_ids):
+    """ Подзапрос идентификаторов постов, имеющих общие теги с постами post_ids """
+    tags = _tagged_items().filter(object_id__in=post_ids).values('tag_id')
+    return _tagged_items().filter(tag_id__in=tags).values('object_id')
+
+
+def _build_rows(post_ids, tag_sets, limit) -> list[SimilarPost]:
+    """ Вычисляет строки SimilarPost для постов post_ids """
+    index, publish = _index(tag_sets)
+    return [
+        SimilarPost(post_id=post_id, neighbor_id=neighbor, score=score)
+        for post_id in post_ids if post_id in tag_sets
+        for score, neighbor in top_neighbors(post_id, tag_sets, index, publish, limit)
+    ]
+
+
+def refresh_similar_posts(post_ids) -> int:
+    """
+    Пересчитывает похожие посты для постов post_ids и затронутых ими
+    постов: наиболее похожих на них или ссылающихся на них как на
+    похожие. Возвращает число пересчитанных постов.
+    """
+    post_ids = set(post_ids)
+    limit = settings.BLOG_SIMILAR_POSTS
+
+    # Измененный пост может войти в число похожих только у наиболее
+    # похожих на него постов (коэффициент Жаккара симметричен), поэтому
+    # вместо всех постов с общими тегами (для популярного тега - почти
+    # всех постов) пересчитываются не более BLOG_SIMILAR_REFRESH_LIMIT
+    # ближайших к каждому измененному посту. Остальные списки
+    # уточняются командой rebuild_similar_posts.
+    tag_sets = load_tag_sets(_sharing_tags(post_ids))
+    index, publish = _index(tag_sets)
+    nearest = {
+        neighbor
+        for post_id in post_ids if post_id in tag_sets
+        for _, neighbor in top_neighbors(
+            post_id, tag_sets, index, publish, settings.BLOG_SIMILAR_REFRESH_LIMIT
+        )
+    }
+    affected = post_ids | nearest | set(
+        SimilarPost.objects.filter(neighbor_id__in=post_ids).values_list('post_id', flat=True)
+    )
+
+    # Кандидатами в похожие для затронутых постов могут быть только
+    # посты, имеющие с ними хотя бы один общий тег
+    tag_sets = load_tag_sets(_sharing_tags(affected))
+
+    rows = _build_rows(affected, tag_sets, limit)
+    pairs = {(row.post_id, row.neighbor_id) for row in rows}
+    with transaction.atomic():
+        # Строки заменяются через INSERT ... ON CONFLICT, а удаляются только
+        # выбывшие пары, поэтому параллельный пересчет тех же постов не
+        # нарушает уникальность пары (post, neighbor)
+        existing = SimilarPost.objects.filter(post_id__in=affected).values_list(
+            'id', 'post_id', 'neighbor_id'
+        )
+        SimilarPost.objects.filter(
+            id__in=[pk for pk, *pair in existing if tuple(pair) not in pairs]
+        ).delete()
+        SimilarPost.objects.bulk_create(
+            rows,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['post', 'neighbor'],
+            update_fields=['score'],
+        )
+    return len(affected)
+
+
+def schedule_similar_refresh(post_ids) -> None:
+    """
+    Ставит посты post_ids в очередь пересчета похожих постов. Строка
+    очереди пишется в текущей транзакции и откатывается вместе с ней,
+    а повторная постановка поста (сохранение поста и set() его тегов,
+    например в панели администратора) обновляет ту же строку.
+    """
+    now = timezone.now()
+    SimilarRefresh.objects.bulk_create(
+        [SimilarRefresh(post_id=post_id, requested=now) for post_id in set(post_ids)],
+        update_conflicts=True,
+        unique_fields=['post_id'],
+        update_fields=['requested'],
+    )
+
+
+def refresh_queued_posts(batch_size: int = 100) -> int:
+    """
+    Пересчитывает похожие посты для порции постов из очереди и удаляет
+    их из очереди. Пост, поставленный в очередь повторно во время
+    пересчета, остается в ней. Возвращает число пересчитанных постов.
+    """
+    queued = list(
+        SimilarRefresh.objects.order_by('requested')
+        .values_list('post_id', 'requested')[:batch_size]
+    )
+    if not queued:
+        return 0
+    refresh_similar_posts([post_id for post_id, _ in queued])
+    done = (Q(post_id=post_id, requested=requested) for post_id, requested in queued)
+    SimilarRefresh.objects.filter(reduce(operator.or_, done)).delete()
+    return len(queued)
+
+
+def rebuild_similar_posts(batch_size=1000) -> int:
+    """ Полностью пересчитывает таблицу похожих постов. Возвращает число строк """
+    tag_sets = load_tag_sets()
+    rows = _build_rows(list(tag_sets), tag_sets, settings.BLOG_SIMILAR_POSTS)
+    with transaction.atomic():
+        SimilarPost.objects.all().delete()
+        SimilarPost.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
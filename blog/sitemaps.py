@@ -1,6 +1,18 @@
+import math
+from datetime import datetime
+from itertools import batched, islice
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.sitemaps import Sitemap
+from django.contrib.sites.shortcuts import get_current_site
+from django.db.models import Count, Max
+from django.db.models.functions import TruncMonth
+from django.http import Http404
+from django.urls import reverse
 
-from .models import Post
+from .models import Post, period_range
 
 
 class PostSitemap(Sitemap):
@@ -14,8 +26,167 @@ class PostSitemap(Sitemap):
 
     def items(self):
         """ Возвращает объекты, подлежащие вулючению в карту сайта """
-        return Post.published.all()
+        return Post.published.for_links()
     
     def lastmod(self, obj):
         """ Возвращает время последнего изменения объекта """
-        return obj.updated
\ No newline at end of file
+        return obj.updated
+
+
+# Карта сайта разбита на части по месяцам публикации постов. Индекс
+# (sitemap.xml) перечисляет части с временем их последнего изменения,
+# а каждая часть формируется потоком из кортежей values_list без
+# создания объектов моделей. Месяц, в котором постов больше
+# BLOG_SITEMAP_LIMIT, делится на страницы (GET-параметр p).
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+XML_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+# Число элементов url, отправляемых клиенту одним фрагментом ответа
+STREAM_CHUNK_SIZE = 500
+
+
+def month_posts(year: int, month: int):
+    """ Возвращает опубликованные посты месяца """
+    # Месяц 0 в period_range означает весь год, поэтому проверяется отдельно
+    if not 1 <= month <= 12:
+        raise Http404('Invalid sitemap section')
+    try:
+        start, end = period_range(year, month)
+    except ValueError:
+        raise Http404('Invalid sitemap section')
+    return Post.published.filter(publish__gte=start, publish__lt=end)
+
+
+def sections_queryset():
+    """
+    Возвращает набор запросов частей карты сайта: месяц, число постов
+    и время последнего изменения постов месяца (одним запросом GROUP BY)
+    """
+    return Post.published.annotate(month=TruncMonth('publish')).order_by().values(
+        'month'
+    ).annotate(count=Count('id'), lastmod=Max('updated')).order_by('-month')
+
+
+def _section_state(request, state):
+    """ Запоминает состояние части в запросе и проверяет ее существование """
+    if not state['count']:
+        raise Http404('Empty sitemap section')
+    request._blog_sitemap_section = state
+    return state
+
+
+def section_state(request, year: int, month: int) -> dict:
+    """
+    Возвращает число постов и время последнего изменения части карты сайта.
+    Значение вычисляется один раз на запрос (его используют оба валидатора)
+    """
+    if hasattr(request, '_blog_sitemap_section'):
+        return request._blog_sitemap_section
+    state = month_posts(year, month).aggregate(count=Count('id'), lastmod=Max('updated'))
+    return _section_state(request, state)
+
+
+async def asection_state(request, year: int, month: int) -> dict:
+    """ Асинхронная версия section_state() """
+    if hasattr(request, '_blog_sitemap_section'):
+        return request._blog_sitemap_section
+    state = await month_posts(year, month).aaggregate(
+        count=Count('id'), lastmod=Max('updated')
+    )
+    return _section_state(request, state)
+
+
+def section_last_modified(request, year, month):
+    """ Возвращает время последнего изменения части карты сайта """
+    return section_state(request, year, month)['lastmod']
+
+
+def section_etag(request, year, month):
+    """
+    Возвращает ETag части карты сайта. Число постов входит в ETag, так как
+    удаление поста может не изменить время последнего изменения части
+    """
+    state = section_state(request, year, month)
+    return f'{int(state["lastmod"].timestamp() * 1_000_000):x}-{state["count"]}'
+
+
+def section_page(request, count: int) -> int:
+    """ Возвращает номер страницы части из GET-параметра p """
+    try:
+        page = int(request.GET.get('p', 1))
+    except ValueError:
+        raise Http404('Invalid sitemap page')
+    if not 1 <= page <= math.ceil(count / settings.BLOG_SITEMAP_LIMIT):
+        raise Http404('Sitemap page out of range')
+    return page
+
+
+def section_rows(year: int, month: int, page: int):
+    """ Возвращает набор запросов кортежей (slug, publish, updated) страницы части """
+    offset = (page - 1) * settings.BLOG_SITEMAP_LIMIT
+    return month_posts(year, month).order_by('publish', 'id').values_list(
+        'slug', 'publish', 'updated'
+    )[offset:offset + settings.BLOG_SITEMAP_LIMIT]
+
+
+def site_url(request) -> str:
+    """ Возвращает адрес сайта для абсолютных url-адресов карты сайта """
+    return f'{request.scheme}://{get_current_site(request).domain}'
+
+
+def _lastmod(value: datetime) -> str:
+    return value.isoformat(timespec='seconds')
+
+
+def render_index(base_url: str, sections) -> str:
+    """ Возвращает XML индекса карты сайта """
+    parts = [XML_HEADER, f'<sitemapindex xmlns="{XML_NAMESPACE}">\n']
+    for section in sections:
+        month = section['month']
+        location = base_url + reverse('sitemap_section', args=[month.year, month.month])
+        pages = math.ceil(section['count'] / settings.BLOG_SITEMAP_LIMIT)
+        for page in range(1, pages + 1):
+            url = location if page == 1 else f'{location}?p={page}'
+            parts.append(
+                f'<sitemap><loc>{escape(url)}</loc>'
+                f'<lastmod>{_lastmod(section["lastmod"])}</lastmod></sitemap>\n'
+            )
+    parts.append('</sitemapindex>\n')
+    return ''.join(parts)
+
+
+def render_urls(base_url: str, rows) -> str:
+    """ Возвращает фрагмент XML с элементами url для кортежей rows """
+    return ''.join(
+        f'<url><loc>{escape(base_url + reverse("blog:post_detail", args=[publish.year, publish.month, publish.day, slug]))}</loc>'
+        f'<lastmod>{_lastmod(updated)}</lastmod>'
+        f'<changefreq>{PostSitemap.changefreq}</changefreq>'
+        f'<priority>{PostSitemap.priority}</priority></url>\n'
+        for slug, publish, updated in rows
+    )
+
+
+URLSET_OPEN = f'{XML_HEADER}<urlset xmlns="{XML_NAMESPACE}">\n'
+URLSET_CLOSE = '</urlset>\n'
+
+
+def stream_urls(base_url: str, rows):
+    """ Генерирует XML части карты сайта фрагментами по STREAM_CHUNK_SIZE постов """
+    yield URLSET_OPEN
+    for chunk in batched(rows.iterator(chunk_size=2000), STREAM_CHUNK_SIZE):
+        yield render_urls(base_url, chunk)
+    yield URLSET_CLOSE
+
+
+async def astream_urls(base_url: str, rows):
+    """ Асинхронная версия stream_urls() """
+    # QuerySet.aiterator() не подходит для values_list: итератор кортежей
+    # выполняет запрос при создании, то есть в асинхронном контексте.
+    # Поэтому фрагменты выбираются из синхронного итератора в потоке
+    iterator = rows.iterator(chunk_size=2000)
+    next_chunk = sync_to_async(lambda: list(islice(iterator, STREAM_CHUNK_SIZE)))
+    yield URLSET_OPEN
+    while chunk := await next_chunk():
+        yield render_urls(base_url, chunk)
+    yield URLSET_CLOSE
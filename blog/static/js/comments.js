@@ -0,0 +1,14 @@
+// Подгрузка следующих страниц комментариев на странице поста. Ссылка
+// "Load more comments" заменяется фрагментом html следующей страницы,
+// который содержит ссылку на страницу после нее.
+document.addEventListener('click', async (event) => {
+    const link = event.target.closest('.more-comments a');
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    const response = await fetch(link.href);
+    if (response.ok) {
+        link.parentElement.outerHTML = await response.text();
+    }
+});
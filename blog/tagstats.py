@@ -0,0 +1,95 @@
+import math
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Post, TagStats
+
+
+# Число размеров шрифта в облаке тегов (классы tag-weight-1 ... tag-weight-5)
+TAG_CLOUD_WEIGHTS = 5
+
+
+def _published_links(tag_ids=None):
+    """
+    Возвращает пары (тег, пост) опубликованных постов в порядке списка
+    постов (-publish, -id). Если tag_ids не задан, то для всех тегов.
+    """
+    # Условия на теги задаются одним вызовом filter(), чтобы связь
+    # с тегами соединялась один раз
+    lookups = {'tags__id__in': tag_ids} if tag_ids is not None else {'tags__isnull': False}
+    posts = Post.published.filter(**lookups)
+    return posts.order_by('-publish', '-id').values_list('tags__id', 'id')
+
+
+def _collect(links) -> dict[int, list[int]]:
+    """ Группирует идентификаторы постов по тегам, сохраняя порядок """
+    post_ids = defaultdict(list)
+    for tag_id, post_id in links.iterator(chunk_size=5000):
+        post_ids[tag_id].append(post_id)
+    return post_ids
+
+
+def _stats(post_ids: dict[int, list[int]]) -> list[TagStats]:
+    return [
+        TagStats(tag_id=tag_id, post_count=len(ids), post_ids=ids)
+        for tag_id, ids in post_ids.items()
+    ]
+
+
+def refresh_tag_stats(tag_ids) -> None:
+    """
+    Пересчитывает данные заданных тегов. Теги без опубликованных
+    постов удаляются из таблицы, поэтому не попадают в облако тегов.
+    """
+    tag_ids = set(tag_ids) - {None}
+    if not tag_ids:
+        return
+    rows = _stats(_collect(_published_links(tag_ids)))
+    with transaction.atomic():
+        TagStats.objects.filter(tag_id__in=tag_ids).exclude(
+            tag_id__in=[row.tag_id for row in rows]
+        ).delete()
+        TagStats.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['tag'],
+            update_fields=['post_count', 'post_ids'],
+        )
+
+
+def rebuild_tag_stats(batch_size=1000) -> int:
+    """
+    Полностью пересчитывает данные всех тегов одним проходом по связям
+    тегов с опубликованными постами. Возвращает число тегов.
+    """
+    rows = _stats(_collect(_published_links()))
+    with transaction.atomic():
+        TagStats.objects.all().delete()
+        TagStats.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def tag_cloud_entries(count: int) -> list[dict]:
+    """
+    Возвращает не более count самых популярных тегов в алфавитном порядке
+    с весом от 1 до TAG_CLOUD_WEIGHTS. Вес растет логарифмически с числом
+    постов, чтобы редкие теги не терялись рядом с самыми популярными.
+    """
+    stats = list(
+        TagStats.objects.select_related('tag').defer('post_ids')
+        .order_by('-post_count', 'tag__name')[:count]
+    )
+    if not stats:
+        return []
+    scale = math.log(stats[0].post_count) or 1
+    entries = [
+        {
+            'name': row.tag.name,
+            'slug': row.tag.slug,
+            'post_count': row.post_count,
+            'weight': 1 + round((TAG_CLOUD_WEIGHTS - 1) * math.log(row.post_count) / scale),
+        }
+        for row in stats
+    ]
+    return sorted(entries, key=lambda entry: entry['name'].lower())
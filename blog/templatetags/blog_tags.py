@@ -1,10 +1,12 @@
-import markdown
-
 from django import template
-from django.db.models import Count
 from django.utils.safestring import mark_safe
 
+from ..archive import archive_tree as archive_periods
+from ..cache import cached_sidebar, remember_most_commented
 from ..models import Post
+from ..perf import timed
+from ..rendering import render_markdown
+from ..tagstats import tag_cloud_entries
 
 
 # В каждом содержащем шаблонные теги модуле должна быть определена
@@ -17,27 +19,68 @@ register = template.Library()
 # Регистрируем как простой тег. Django будет использовать имя функции
 # в качестве имени тега. Если нужно зарегистрировать под другим именем
 # нужно указать атрибут name, например @register.simple_tag(name='my_tag')
+#
+# Данные боковой панели кешируются (см. blog.cache) и сбрасываются
+# сигналами при изменении постов и комментариев, поэтому в установившемся
+# режиме теги боковой панели не выполняют запросов к базе данных.
+# Время их выполнения учитывается в метрике sidebar (см. blog.perf).
 @register.simple_tag
+@timed('sidebar')
 def total_posts() -> int:
     """ Возвращает количество опубликованных постов """
-    return Post.published.count()
+    return cached_sidebar('total_posts', Post.published.count)
 
 
 @register.inclusion_tag('blog/post/latest_posts.html')
+@timed('sidebar')
 def show_latest_posts(count=5):
     """ Возвращает последние опубликованные посты """
-    latest_posts = Post.published.order_by('-publish')[:count]
+    latest_posts = cached_sidebar(
+        'latest_posts',
+        lambda: list(
+            Post.published.for_links().order_by('-publish')[:count]
+        ),
+        count,
+    )
     return {'latest_posts': latest_posts}
 
 
 @register.simple_tag
+@timed('sidebar')
 def get_most_commented_posts(count=5):
-    """ Возвращает посты с наибольшим числом комментариев """
-    return Post.published.annotate(total_comments=Count('comments')
-                                   ).order_by('-total_comments')[:count]
+    """
+    Возвращает посты с наибольшим числом комментариев. Выведенный список
+    запоминается, чтобы комментарий, меняющий его, сбрасывал все страницы
+    (см. blog.models.post_comments_changed)
+    """
+    def compute():
+        posts = list(Post.published.most_commented(count))
+        remember_most_commented(post.id for post in posts)
+        return posts
+
+    return cached_sidebar('most_commented_posts', compute, count)
+
+
+@register.inclusion_tag('blog/post/tag_cloud.html')
+@timed('sidebar')
+def tag_cloud(count=30):
+    """ Возвращает облако самых популярных тегов (см. blog.tagstats) """
+    return {'tags': cached_sidebar('tag_cloud', lambda: tag_cloud_entries(count), count)}
+
+
+@register.inclusion_tag('blog/post/archive_tree.html')
+@timed('sidebar')
+def archive_tree():
+    """ Возвращает годы и месяцы архива с числом постов (см. blog.archive) """
+    return {'years': cached_sidebar('archive_tree', archive_periods)}
 
 
 @register.filter(name='markdown')
+@timed('markdown')
 def markdown_format(text):
-    """ Фильтр для конвертации markdown в html"""
-    return mark_safe(markdown.markdown(text=text, extensions=['extra', 'codehilite']))
+    """
+    Фильтр для конвертации markdown в html. Результат кешируется в
+    ограниченном LRU-кеше, поэтому повторный текст не прорисовывается заново.
+    Для тел постов следует использовать post.rendered_body.
+    """
+    return mark_safe(render_markdown(text))
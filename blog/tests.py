@@ -1,3 +1,1494 @@
-from django.test import TestCase
+import io
+import json
+import re
+import tempfile
+from datetime import datetime, timedelta
+from smtplib import SMTPException
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.template import Context, Template, engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import AsyncRequestFactory, Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from taggit.models import Tag
+
+from . import async_views, views
+from .archive import archive_tree, refresh_archive
+from .benchmark import TEMPLATE_LOADERS
+from .cache import cached_sidebar, set_last_modified, shown_most_commented, sidebar_key
+from .comments import comment_buffer, comment_paginator
+from .corpus import generate_corpus
+from .http import CSRF_TOKEN_PLACEHOLDER
+from .mail import send_queued_mail
+from .models import ArchivePeriod, Comment, OutgoingEmail, Post, SimilarPost, SimilarRefresh, TagStats
+from .pagination import EstimatedCountPaginator, InvalidCursor, KeysetPaginator
+from .perf import warm_templates, warm_templates_on_startup
+from .rendering import body_hash, render_markdown
+from .routers import STICKY_COOKIE, ReplicaRouter, _read_from_replicas, reads_from_replicas
+from .search import get_backend, search_posts
+from .search.sqlite import FTS_TABLE, SQLiteSearchBackend, build_match_query
+from .similarity import (
+    rebuild_similar_posts, refresh_queued_posts, refresh_similar_posts, schedule_similar_refresh,
+)
+from .sitemaps import month_posts
+from .templatetags.blog_tags import get_most_commented_posts, show_latest_posts
+
+
+class BlogTestCase(TestCase):
+    """ Базовый класс тестов блога с опубликованными постами """
+
+    # Число постов в тестовых данных
+    posts_count = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', password='secret')
+        cls.posts = []
+        for i in range(cls.posts_count):
+            post = Post.objects.create(
+                title=f'Django post {i}',
+                slug=f'django-post-{i}',
+                body=f'Body of **post {i}** about django.\n\n```python\nprint({i})\n```',
+                author=cls.author,
+                status=Post.Status.PUBLISHED,
+            )
+            post.tags.add('django', f'tag-{i % 3}')
+            Comment.objects.create(post=post, name='reader', email='r@example.com', body='Nice')
+            cls.posts.append(post)
+
+    def setUp(self):
+        # Кеш сбрасывается, чтобы учитывать запросы при промахе кеша.
+        # При пустом кеше ограничения включают два запроса вычисления
+        # времени последнего изменения содержимого (см. blog.http)
+        cache.clear()
+
+
+class QueryCountTestCase(BlogTestCase):
+    """ Базовый класс тестов с ограничением числа запросов к базе данных """
+
+    # Ограничения на число запросов не должны зависеть от числа постов
+    # в тестовых данных, иначе в представлении появился N+1
+
+    def assertMaxQueries(self, limit, url):
+        """ Проверяет, что запрос url выполняет не больше limit запросов """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        executed = len(context.captured_queries)
+        self.assertLessEqual(
+            executed, limit,
+            f'{url} executed {executed} queries (limit {limit}):\n'
+            + '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+        return response
+
+
+class ViewQueryCountTests(QueryCountTestCase):
+    """ Ограничения числа запросов публичных представлений """
+
+    def test_post_list(self):
+        self.assertMaxQueries(9, reverse('blog:post_list'))
+
+    def test_post_list_by_tag(self):
+        self.assertMaxQueries(10, reverse('blog:post_list_by_tag', args=['django']))
+
+    def test_post_list_offset_page(self):
+        self.assertMaxQueries(10, reverse('blog:post_list') + '?page=2')
+
+    def test_post_detail(self):
+        self.assertMaxQueries(10, self.posts[0].get_absolute_url())
+
+    def test_post_search(self):
+        self.assertMaxQueries(10, reverse('blog:post_search') + '?query=django')
+
+    def test_post_feed(self):
+        self.assertMaxQueries(2, reverse('blog:post_feed'))
+
+    def test_post_feed_is_cached(self):
+        """ Повторный запрос ленты отдается из кеша без запросов """
+        url = reverse('blog:post_feed')
+        self.client.get(url)
+        self.assertMaxQueries(0, url)
+
+    def test_sitemap_index(self):
+        self.assertMaxQueries(4, reverse('sitemap_index'))
+
+    def test_sitemap_section(self):
+        publish = self.posts[0].publish
+        url = reverse('sitemap_section', args=[publish.year, publish.month])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+            content = b''.join(response)
+        # Состояние части, сайт и поток кортежей постов
+        self.assertLessEqual(len(context.captured_queries), 3)
+        self.assertEqual(content.count(b'<url>'), self.posts_count)
+
+    def test_sidebar_is_cached(self):
+        """ При прогретом кеше боковая панель не выполняет запросов """
+        # Теги панели прорисовываются напрямую, в обход кеша страниц
+        template = Template(
+            '{% load blog_tags %}{% total_posts %}{% tag_cloud 30 %}{% archive_tree %}'
+            '{% show_latest_posts 3 %}{% get_most_commented_posts as most_commented_posts %}'
+            '{% for post in most_commented_posts %}{{ post.title }}{% endfor %}'
+        )
+        html = template.render(Context())
+        with self.assertNumQueries(0):
+            self.assertEqual(template.render(Context()), html)
+
+    def test_page_is_cached(self):
+        """ Повторный запрос страницы отдается из кеша без запросов """
+        url = reverse('blog:post_list')
+        self.client.get(url)
+        self.assertMaxQueries(0, url)
+
+    def test_head_served_from_get_cache(self):
+        """ Ответ на HEAD не сохраняется, но отдается из кеша страницы GET """
+        url = reverse('blog:post_list')
+        with mock.patch('blog.http.learn_cache_key') as learn:
+            self.client.head(url)
+        learn.assert_not_called()
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.head(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_detail_is_cached(self):
+        """
+        Страница поста с формой комментария отдается из кеша без запросов,
+        а в форму подставляется действующий CSRF-токен посетителя
+        """
+        url = self.posts[0].get_absolute_url()
+        self.client.get(url)
+        self.client = Client(enforce_csrf_checks=True)
+        response = self.assertMaxQueries(0, url)
+        self.assertNotContains(response, CSRF_TOKEN_PLACEHOLDER)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode())[1]
+        response = self.client.post(
+            reverse('blog:post_comment', args=[self.posts[0].id]),
+            {'name': 'new', 'email': 'n@example.com', 'body': 'Hi', 'csrfmiddlewaretoken': token},
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class RenderedBodyTests(BlogTestCase):
+    """ Хранимый html тела поста и команда render_posts """
+
+    posts_count = 3
+
+    def test_body_rendered_on_save(self):
+        post = Post.objects.get(pk=self.posts[0].pk)
+        self.assertIn('<strong>post 0</strong>', post.body_html)
+        self.assertIn('codehilite', post.body_html)
+        self.assertTrue(post.body_excerpt)
+        self.assertEqual(post.body_hash, body_hash(post.body))
+
+        post.body = 'New *body*'
+        post.save(update_fields=['body'])
+        post.refresh_from_db()
+        self.assertEqual(post.body_html, '<p>New <em>body</em></p>')
+        self.assertEqual(post.body_hash, body_hash('New *body*'))
+
+    def test_unchanged_body_not_rendered(self):
+        post = Post.objects.get(pk=self.posts[0].pk)
+        with mock.patch('blog.models.markdown_to_html') as render:
+            post.title = 'Renamed'
+            post.save()
+        render.assert_not_called()
+
+    def test_bodies_bypass_markdown_cache(self):
+        """ Тела постов не занимают записи LRU-кеша фильтра markdown """
+        render_markdown.cache_clear()
+        Post.objects.filter(pk=self.posts[0].pk).update(body_html='', body_excerpt='')
+        post = Post.objects.get(pk=self.posts[0].pk)
+        self.assertIn('<strong>post 0</strong>', post.rendered_body)
+        self.assertIn('post 0', post.rendered_excerpt)
+        post.body = 'New *body*'
+        post.save()
+        self.assertEqual(render_markdown.cache_info().currsize, 0)
+
+    def test_render_posts(self):
+        Post.objects.filter(pk=self.posts[0].pk).update(body_html='', body_excerpt='', body_hash='')
+        out = io.StringIO()
+        call_command('render_posts', stdout=out)
+        self.assertIn('Rendered 1 post(s).', out.getvalue())
+        post = Post.objects.get(pk=self.posts[0].pk)
+        self.assertIn('<strong>post 0</strong>', post.body_html)
+        self.assertEqual(post.body_hash, body_hash(post.body))
+
+        out = io.StringIO()
+        call_command('render_posts', force=True, batch_size=2, stdout=out)
+        self.assertIn(f'Rendered {self.posts_count} post(s).', out.getvalue())
+
+
+class SidebarCacheTests(BlogTestCase):
+    """ Кеш данных боковой панели и LRU-кеш фильтра markdown """
+
+    posts_count = 3
+
+    def test_markdown_filter_is_cached(self):
+        render_markdown.cache_clear()
+        template = Template('{% load blog_tags %}{{ text|markdown }}')
+        for _ in range(2):
+            html = template.render(Context({'text': 'Some *text*'}))
+        self.assertEqual(html, '<p>Some <em>text</em></p>')
+        info = render_markdown.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+        self.assertEqual(info.maxsize, settings.BLOG_MARKDOWN_CACHE_SIZE)
+
+    def test_cached_until_post_changes(self):
+        compute = mock.Mock(return_value=['value'])
+        cached_sidebar('test', compute)
+        cached_sidebar('test', compute)
+        self.assertEqual(compute.call_count, 1)
+
+        self.posts[0].save()
+        self.assertEqual(cached_sidebar('test', compute), ['value'])
+        self.assertEqual(compute.call_count, 2)
+
+    def test_latest_posts_refreshed(self):
+        show_latest_posts()
+        post = Post.objects.create(
+            title='Newest', slug='newest', body='Body', author=self.author,
+            status=Post.Status.PUBLISHED,
+        )
+        with self.assertNumQueries(1):
+            latest_posts = show_latest_posts()['latest_posts']
+        self.assertEqual(latest_posts[0], post)
+
+    def test_total_posts_refreshed(self):
+        template = Template('{% load blog_tags %}{% total_posts %}')
+        self.assertEqual(template.render(Context()), '3')
+        with self.assertNumQueries(0):
+            template.render(Context())
+        self.posts[0].status = Post.Status.DRAFT
+        self.posts[0].save()
+        self.assertEqual(template.render(Context()), '2')
+
+    def test_comment_changes_only_comment_sidebar(self):
+        """ Комментарий сбрасывает самые комментируемые посты, но не остальные данные панели """
+        post_id = get_most_commented_posts()[0].id
+        latest_key = sidebar_key('latest_posts', 5)
+        most_commented_key = sidebar_key('most_commented_posts', 5)
+        # Пост уже возглавляет самые комментируемые посты
+        Comment.objects.create(post_id=post_id, name='new', email='n@example.com', body='Hi')
+        self.assertEqual(sidebar_key('latest_posts', 5), latest_key)
+        self.assertNotEqual(sidebar_key('most_commented_posts', 5), most_commented_key)
+
+
+class CommentCountTests(BlogTestCase):
+    """ Денормализованный счетчик активных комментариев поста """
+
+    posts_count = 2
+
+    def count(self, post) -> int:
+        return Post.objects.values_list('active_comment_count', flat=True).get(pk=post.pk)
+
+    def test_counter_follows_comments(self):
+        post, other = self.posts
+        with CaptureQueriesContext(connection) as context:
+            comment = Comment.objects.create(post=post, name='new', email='n@example.com', body='Hi')
+        # Счетчик увеличивается атомарно в базе данных, а не записью значения поста
+        self.assertTrue(any(
+            re.search(r'"active_comment_count" = \("blog_post"\."active_comment_count" \+ 1\)', query['sql'])
+            for query in context.captured_queries
+        ))
+        self.assertEqual(self.count(post), 2)
+
+        comment.active = False
+        comment.save()
+        self.assertEqual(self.count(post), 1)
+        comment.active = True
+        comment.post = other
+        comment.save()
+        self.assertEqual((self.count(post), self.count(other)), (1, 2))
+        comment.delete()
+        self.assertEqual(self.count(other), 1)
+
+    def test_post_save_keeps_counter(self):
+        """ Сохранение поста, загруженного до комментария, не сбрасывает счетчик """
+        post = Post.objects.get(pk=self.posts[0].pk)
+        Comment.objects.create(post=post, name='new', email='n@example.com', body='Hi')
+        post.title = 'Renamed'
+        post.save()
+        self.assertEqual(self.count(post), 2)
+        post.delete()
+        self.assertFalse(Comment.objects.filter(post_id=self.posts[0].pk).exists())
+
+    def test_post_delete_skips_comment_counters(self):
+        """ Каскадное удаление комментариев с постом не обновляет счетчик по каждому """
+        post = self.posts[0]
+        for i in range(3):
+            Comment.objects.create(post=post, name=f'reader {i}', email='r@example.com', body='Hi')
+        with CaptureQueriesContext(connection) as context:
+            post.delete()
+        self.assertFalse(
+            [query for query in context.captured_queries if query['sql'].startswith('UPDATE "blog_post"')]
+        )
+        self.assertFalse(Comment.objects.filter(post_id=post.pk).exists())
+
+    def test_set_active(self):
+        self.assertEqual(Comment.objects.all().set_active(False), self.posts_count)
+        self.assertEqual(Comment.objects.all().set_active(False), 0)
+        self.assertFalse(Post.objects.filter(active_comment_count__gt=0).exists())
+        Comment.objects.filter(post=self.posts[0]).set_active(True)
+        self.assertEqual((self.count(self.posts[0]), self.count(self.posts[1])), (1, 0))
+
+    def test_reconcile_comment_counts(self):
+        Post.objects.filter(pk=self.posts[0].pk).update(active_comment_count=5)
+        out = io.StringIO()
+        call_command('reconcile_comment_counts', batch_size=1, stdout=out)
+        self.assertIn('Reconciled 1 post(s).', out.getvalue())
+        self.assertEqual(self.count(self.posts[0]), 1)
+
+    def test_admin_actions(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        url = reverse('admin:blog_comment_changelist')
+        ids = [str(pk) for pk in Comment.objects.filter(post=self.posts[0]).values_list('id', flat=True)]
+        response = self.client.post(url, {'action': 'hide_comments', '_selected_action': ids}, follow=True)
+        self.assertContains(response, '1 comment(s) hidden.')
+        self.assertEqual(self.count(self.posts[0]), 0)
+        response = self.client.post(url, {'action': 'approve_comments', '_selected_action': ids}, follow=True)
+        self.assertContains(response, '1 comment(s) approved.')
+        self.assertEqual(self.count(self.posts[0]), 1)
+
+
+class KeysetPaginationTests(BlogTestCase):
+    """ Постраничная разбивка списка постов по курсору """
+
+    posts_count = 7
+
+    def test_next_and_previous(self):
+        # Посты с одинаковой датой публикации упорядочиваются по id
+        Post.objects.filter(pk__in=[post.pk for post in self.posts[2:5]]).update(
+            publish=self.posts[2].publish
+        )
+        expected = list(Post.published.order_by('-publish', '-id'))
+        paginator = KeysetPaginator(Post.published.all(), 3)
+
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([post for page in pages for post in page], expected)
+        self.assertFalse(pages[0].has_previous())
+
+        page = pages[-1]
+        for previous in reversed(pages[:-1]):
+            page = paginator.page(page.previous_cursor)
+            self.assertEqual(list(page), list(previous))
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(Post.published.all(), 3)
+        for cursor in ('garbage', 'W1siMSJdLCJuIl0'):
+            with self.subTest(cursor), self.assertRaises(InvalidCursor):
+                paginator.decode_cursor(cursor)
+        response = self.client.get(reverse('blog:post_list') + '?cursor=garbage')
+        self.assertEqual(list(response.context['posts']), list(Post.published.all()[:3]))
+
+    def test_post_list_links(self):
+        url = reverse('blog:post_list')
+        response = self.client.get(url)
+        next_cursor = response.context['posts'].next_cursor
+        self.assertContains(response, f'?cursor={next_cursor}')
+        self.assertNotContains(response, 'Page 1 of')
+
+        response = self.client.get(url, {'cursor': next_cursor})
+        self.assertEqual(list(response.context['posts']), list(Post.published.all()[3:6]))
+        self.assertContains(response, f'?cursor={response.context["posts"].previous_cursor}')
+
+    def test_page_links_still_work(self):
+        """ Старые ссылки ?page=N выдают ту же страницу классическим Paginator """
+        url = reverse('blog:post_list')
+        response = self.client.get(url, {'page': 2, 'cursor': 'ignored'})
+        self.assertContains(response, 'Page 2 of 3')
+        self.assertEqual(list(response.context['posts']), list(Post.published.all()[3:6]))
+        self.assertContains(response, '?page=3')
+        with override_settings(BLOG_PAGINATION_MODE='offset'):
+            cache.clear()
+            self.assertContains(self.client.get(url), 'Page 1 of 3')
+
+
+class SearchTests(BlogTestCase):
+    """ Полнотекстовый поиск постов с ранжированием по хранимому индексу """
+
+    posts_count = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.title_post = Post.objects.create(
+            title='Pelican watching', slug='pelican-watching', body='Birds of the coast',
+            author=cls.author, status=Post.Status.PUBLISHED,
+        )
+        cls.body_post = Post.objects.create(
+            title='Birds', slug='birds', body='Notes about a pelican colony and a pelican chick',
+            author=cls.author, status=Post.Status.PUBLISHED,
+        )
+        cls.draft = Post.objects.create(
+            title='Pelican draft', slug='pelican-draft', body='Unpublished', author=cls.author,
+        )
+
+    def test_title_ranks_above_body(self):
+        self.assertEqual(search_posts('pelican'), [self.title_post.pk, self.body_post.pk])
+
+    def test_unpublished_posts(self):
+        self.assertNotIn(self.draft.pk, search_posts('pelican'))
+        self.assertIn(self.draft.pk, get_backend().search('pelican', published_only=False))
+
+    def test_index_follows_posts(self):
+        post = self.posts[0]
+        post.title = 'Albatross sighting'
+        post.save()
+        self.assertEqual(search_posts('albatross'), [post.pk])
+        post.delete()
+        self.assertEqual(search_posts('albatross'), [])
+
+    def test_post_search_view(self):
+        response = self.client.get(reverse('blog:post_search'), {'query': 'pelican'})
+        self.assertEqual(list(response.context['results']), [self.title_post, self.body_post])
+        self.assertContains(response, 'Find 2 results')
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL stores the search vector')
+    def test_search_vector_is_stored(self):
+        self.assertFalse(Post.objects.filter(search_vector=None).exists())
+
+    def test_rebuild_search_index(self):
+        out = io.StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertIn(f'Indexed {Post.objects.count()} post(s)', out.getvalue())
+        self.assertEqual(search_posts('pelican'), [self.title_post.pk, self.body_post.pk])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 index of the SQLite search backend')
+class SQLiteSearchBackendTests(BlogTestCase):
+    """ Поисковый бэкенд SQLite на индексе FTS5 """
+
+    posts_count = 2
+
+    def rows(self, post_id) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+            return cursor.fetchone()[0]
+
+    def test_default_backend(self):
+        self.assertIsInstance(get_backend(), SQLiteSearchBackend)
+
+    def test_match_query(self):
+        # Символы синтаксиса FTS5 в запросе не интерпретируются
+        self.assertEqual(build_match_query('django OR "title": NEAR('), '"django" "OR" "title" "NEAR"')
+        self.assertEqual(SQLiteSearchBackend().search('"*"'), [])
+        # Слова запроса объединяются через AND, а оператор ищется как слово
+        self.assertEqual(SQLiteSearchBackend().search('django AND'), [])
+
+    def test_index_search_remove(self):
+        backend = SQLiteSearchBackend()
+        post = self.posts[0]
+        self.assertEqual(backend.search('post 0'), [post.pk])
+        backend.remove_posts([post.pk])
+        self.assertEqual(self.rows(post.pk), 0)
+        self.assertEqual(backend.search('post 0'), [])
+
+        # Повторная индексация заменяет строку поста, а не добавляет ее
+        post.title = 'Heron'
+        backend.index_posts([post])
+        backend.index_posts([post])
+        self.assertEqual(self.rows(post.pk), 1)
+        self.assertEqual(backend.search('heron'), [post.pk])
+
+    def test_rebuild_removes_stale_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+                [999999, 'Stale', 'Deleted post'],
+            )
+        self.assertEqual(SQLiteSearchBackend().rebuild(batch_size=1), self.posts_count)
+        self.assertEqual(self.rows(999999), 0)
+        self.assertEqual(self.rows(self.posts[1].pk), 1)
+
+
+class ConditionalGetTests(QueryCountTestCase):
+    """ Условные GET-запросы публичных страниц """
+
+    def test_not_modified(self):
+        url = reverse('blog:post_list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def comment(self, post):
+        Comment.objects.create(post=post, name='new', email='n@example.com', body='Hi')
+
+    def test_comment_changes_only_post_etag(self):
+        """
+        Комментарий, не меняющий самые комментируемые посты, меняет
+        страницу своего поста, но не остальные страницы
+        """
+        detail_url = self.posts[0].get_absolute_url()
+        other_url = self.posts[1].get_absolute_url()
+        list_url = reverse('blog:post_list')
+        # Пост уже возглавляет самые комментируемые посты
+        self.comment(self.posts[0])
+        etags = {url: self.client.get(url)['ETag'] for url in (detail_url, other_url, list_url)}
+
+        self.comment(self.posts[0])
+
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etags[detail_url])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etags[detail_url])
+        self.assertContains(response, '3 comments')
+        for url in (other_url, list_url):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 304)
+
+    def test_most_commented_change_changes_all_etags(self):
+        """ Комментарий, меняющий самые комментируемые посты боковой панели, меняет все страницы """
+        url = reverse('blog:post_list')
+        etag = self.client.get(url)['ETag']
+        shown = shown_most_commented()
+        post = next(post for post in self.posts if post.id not in shown)
+        self.comment(post)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(shown_most_commented()[0], post.id)
+
+    def test_post_change_changes_all_etags(self):
+        url = reverse('blog:post_list')
+        etag = self.client.get(url)['ETag']
+        self.posts[1].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AsyncViewTests(QueryCountTestCase):
+    """ Асинхронные представления возвращают те же страницы, что и синхронные """
+
+    async def assertSamePage(self, name, path, **kwargs):
+        factory = AsyncRequestFactory()
+        response = await getattr(async_views, name)(factory.get(path), **kwargs)
+        self.assertEqual(response.status_code, 200)
+        await cache.aclear()
+        expected = await sync_to_async(getattr(views, name))(factory.get(path), **kwargs)
+        # Маскированный CSRF-токен формы комментария различается в каждом ответе
+        csrf_token = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]*"')
+        self.assertEqual(
+            csrf_token.sub(b'', response.content), csrf_token.sub(b'', expected.content)
+        )
+
+    async def test_post_list(self):
+        await self.assertSamePage('post_list', reverse('blog:post_list'))
+
+    async def test_post_list_by_tag(self):
+        await self.assertSamePage(
+            'post_list', reverse('blog:post_list_by_tag', args=['django']), tag_slug='django'
+        )
+
+    async def test_post_detail(self):
+        post = self.posts[0]
+        await self.assertSamePage(
+            'post_detail', post.get_absolute_url(), year=post.publish.year,
+            month=post.publish.month, day=post.publish.day, post=post.slug
+        )
+
+    async def test_post_search(self):
+        await self.assertSamePage('post_search', reverse('blog:post_search') + '?query=django')
+
+
+class SitemapTests(QueryCountTestCase):
+    """ Индекс карты сайта и ее части по месяцам """
+
+    posts_count = 3
+
+    def section_url(self, post):
+        return reverse('sitemap_section', args=[post.publish.year, post.publish.month])
+
+    def test_index_lists_sections(self):
+        response = self.client.get(reverse('sitemap_index'))
+        self.assertContains(response, self.section_url(self.posts[0]))
+        self.assertEqual(response['X-Robots-Tag'], 'noindex, noodp, noarchive')
+
+    def test_unchanged_section_not_modified(self):
+        url = self.section_url(self.posts[0])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Снятие поста с публикации меняет часть карты сайта
+        Post.objects.filter(pk=self.posts[0].pk).update(status=Post.Status.DRAFT)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response).count(b'<url>'), self.posts_count - 1)
+
+    def test_paged_section(self):
+        url = self.section_url(self.posts[0])
+        with self.settings(BLOG_SITEMAP_LIMIT=2):
+            index = self.client.get(reverse('sitemap_index'))
+            self.assertContains(index, f'{url}?p=2')
+            response = self.client.get(url, {'p': 2})
+            self.assertEqual(b''.join(response).count(b'<url>'), 1)
+            self.assertEqual(self.client.get(url, {'p': 3}).status_code, 404)
+
+    def test_empty_section(self):
+        self.assertEqual(self.client.get(reverse('sitemap_section', args=[2000, 1])).status_code, 404)
+        # Несуществующий месяц не превращается в раздел за весь год
+        for month in (0, 13):
+            self.assertEqual(self.client.get(reverse('sitemap_section', args=[2000, month])).status_code, 404)
+
+
+class FeedTests(QueryCountTestCase):
+    """ Новостные ленты, формируемые один раз до изменения их постов """
+
+    posts_count = 3
+
+    def test_not_modified(self):
+        url = reverse('blog:post_feed')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_cached_per_scheme_and_host(self):
+        url = reverse('blog:post_feed')
+        self.assertContains(self.client.get(url), 'http://example.com/')
+        # Ссылки ленты зависят от схемы запроса, поэтому лента по HTTPS
+        # формируется отдельно
+        self.assertContains(self.client.get(url, secure=True), 'https://example.com/')
+        self.assertMaxQueries(0, url)
+
+    def test_tag_feed(self):
+        response = self.client.get(reverse('blog:post_feed_by_tag', args=['tag-1']))
+        self.assertContains(response, 'posts tagged "tag-1"')
+        self.assertContains(response, self.posts[1].title)
+        self.assertNotContains(response, self.posts[0].title)
+        self.assertEqual(
+            self.client.get(reverse('blog:post_feed_by_tag', args=['missing'])).status_code, 404
+        )
+
+    def test_post_change_rebuilds_feeds(self):
+        urls = [reverse('blog:post_feed'), reverse('blog:post_feed_by_tag', args=['tag-0'])]
+        for url in urls:
+            self.client.get(url)
+
+        post = self.posts[0]
+        post.title = 'Renamed post'
+        post.save()
+        for url in urls:
+            self.assertContains(self.client.get(url), 'Renamed post')
+
+        # Комментарии не входят в ленту и не сбрасывают ее
+        Comment.objects.create(post=post, name='new', email='n@example.com', body='Hi')
+        self.assertMaxQueries(0, urls[0])
+
+    def test_tag_change_rebuilds_tag_feed(self):
+        url = reverse('blog:post_feed_by_tag', args=['tag-1'])
+        self.client.get(url)
+        self.posts[0].tags.add('tag-1')
+        self.assertContains(self.client.get(url), self.posts[0].title)
+        self.posts[0].tags.clear()
+        self.assertNotContains(self.client.get(url), self.posts[0].title)
+
+
+class SimilarPostTests(QueryCountTestCase):
+    """ Предвычисленные похожие посты """
+
+    posts_count = 6
+
+    def links(self):
+        return sorted(SimilarPost.objects.values_list('post_id', 'neighbor_id', 'score'))
+
+    def test_refresh_matches_rebuild(self):
+        rebuild_similar_posts()
+        self.posts[0].tags.set(['django', 'tag-1', 'fresh'])
+        self.posts[4].tags.add('fresh')
+        post = self.posts[2]
+        post.status = Post.Status.DRAFT
+        post.save()
+        self.posts[3].delete()
+        # Пересчет выполняется обработчиком очереди
+        self.assertTrue(SimilarRefresh.objects.exists())
+        self.assertGreater(refresh_queued_posts(), 0)
+        self.assertFalse(SimilarRefresh.objects.exists())
+        refreshed = self.links()
+        rebuild_similar_posts()
+        self.assertEqual(refreshed, self.links())
+        self.assertNotIn(post.id, {neighbor for _, neighbor, _ in refreshed})
+
+    def test_queue_deduplicates(self):
+        # Посты тестовых данных поставлены в очередь при добавлении тегов
+        SimilarRefresh.objects.all().delete()
+        post = self.posts[0]
+        with transaction.atomic():
+            post.status = Post.Status.DRAFT
+            post.save()
+            post.tags.set(['django', 'fresh'])
+        self.assertEqual(list(SimilarRefresh.objects.values_list('post_id', flat=True)), [post.id])
+
+        # Пост, поставленный в очередь повторно во время пересчета, остается в ней
+        def requeue(post_ids):
+            schedule_similar_refresh(post_ids)
+            return len(post_ids)
+
+        with mock.patch('blog.similarity.refresh_similar_posts', side_effect=requeue) as refresh:
+            self.assertEqual(refresh_queued_posts(), 1)
+        refresh.assert_called_once_with([post.id])
+        self.assertTrue(SimilarRefresh.objects.filter(post_id=post.id).exists())
+
+    @override_settings(BLOG_SIMILAR_REFRESH_LIMIT=2)
+    def test_refresh_limit(self):
+        # Все посты имеют общий тег django, но пересчитываются только
+        # измененный пост и два наиболее похожих на него
+        self.assertEqual(refresh_similar_posts([self.posts[0].id]), 3)
+
+
+class TagStatsTests(QueryCountTestCase):
+    """ Денормализованные данные тегов и облако тегов """
+
+    posts_count = 4
+
+    def stats(self, slug):
+        stats = TagStats.objects.filter(tag__slug=slug).first()
+        return (stats.post_count, stats.post_ids) if stats else (0, [])
+
+    def ids(self, *indexes):
+        # Посты тега упорядочены как список постов (-publish, -id)
+        return sorted((self.posts[i].id for i in indexes), reverse=True)
+
+    def test_maintained_by_signals(self):
+        self.assertEqual(self.stats('django'), (4, self.ids(0, 1, 2, 3)))
+        self.assertEqual(self.stats('tag-0'), (2, self.ids(0, 3)))
+
+        post = self.posts[1]
+        post.tags.add('tag-0')
+        self.assertEqual(self.stats('tag-0'), (3, self.ids(0, 1, 3)))
+        post.tags.remove('tag-0')
+        self.assertEqual(self.stats('tag-0'), (2, self.ids(0, 3)))
+
+        post.status = Post.Status.DRAFT
+        post.save()
+        self.assertEqual(self.stats('django'), (3, self.ids(0, 2, 3)))
+        self.assertEqual(self.stats('tag-1'), (0, []))
+
+        self.posts[0].tags.clear()
+        self.posts[3].delete()
+        self.assertEqual(self.stats('tag-0'), (0, []))
+        self.assertEqual(self.stats('django'), (1, self.ids(2)))
+
+    def test_tag_page(self):
+        response = self.client.get(reverse('blog:post_list_by_tag', args=['tag-1']))
+        self.assertEqual([post.id for post in response.context['posts']], self.ids(1))
+        # Тег без опубликованных постов показывает пустую страницу
+        Tag.objects.create(name='empty', slug='empty')
+        response = self.client.get(reverse('blog:post_list_by_tag', args=['empty']))
+        self.assertEqual(len(response.context['posts']), 0)
+        self.assertEqual(
+            self.client.get(reverse('blog:post_list_by_tag', args=['missing'])).status_code, 404
+        )
+
+    def test_tag_cloud(self):
+        response = self.client.get(reverse('blog:post_list'))
+        self.assertContains(response, 'class="tag-weight-5" title="4 posts">django</a>', html=False)
+        self.assertContains(response, 'title="1 post">tag-1</a>', html=False)
+
+    def test_rebuild_command(self):
+        TagStats.objects.all().delete()
+        out = io.StringIO()
+        call_command('rebuild_tag_stats', stdout=out)
+        self.assertIn('Stored stats for 4 tag(s).', out.getvalue())
+        self.assertEqual(self.stats('tag-0'), (2, self.ids(0, 3)))
+
+
+class ArchiveTests(QueryCountTestCase):
+    """ Архив публикаций по годам, месяцам и дням """
+
+    posts_count = 3
+
+    def setUp(self):
+        super().setUp()
+        # Посты распределяются по двум дням одного месяца и другому году
+        dates = [
+            timezone.make_aware(datetime(2024, 3, 5, 10)),
+            timezone.make_aware(datetime(2024, 3, 5, 23, 59)),
+            timezone.make_aware(datetime(2023, 12, 31, 12)),
+        ]
+        # Посты загружаются заново: счетчики комментариев в self.posts устарели
+        self.posts = list(Post.objects.order_by('id'))
+        for post, publish in zip(self.posts, dates):
+            post.publish = publish
+            post.save()
+
+    def counts(self):
+        return {
+            (row.year, row.month, row.day): row.post_count for row in ArchivePeriod.objects.all()
+        }
+
+    def test_maintained_by_signals(self):
+        self.assertEqual(self.counts(), {
+            (2024, 0, 0): 2, (2024, 3, 0): 2, (2024, 3, 5): 2,
+            (2023, 0, 0): 1, (2023, 12, 0): 1, (2023, 12, 31): 1,
+        })
+
+        # Перенос поста пересчитывает прежний и новый период
+        post = self.posts[2]
+        post.publish = timezone.make_aware(datetime(2024, 4, 1, 8))
+        post.save()
+        self.assertEqual(self.counts(), {
+            (2024, 0, 0): 3, (2024, 3, 0): 2, (2024, 3, 5): 2, (2024, 4, 0): 1, (2024, 4, 1): 1,
+        })
+
+        # Снятие с публикации и удаление уменьшают счетчики
+        post.status = Post.Status.DRAFT
+        post.save()
+        self.posts[1].delete()
+        self.assertEqual(self.counts(), {(2024, 0, 0): 1, (2024, 3, 0): 1, (2024, 3, 5): 1})
+
+        # Сохранение черновика архив не пересчитывает
+        with CaptureQueriesContext(connection) as context:
+            post.save(update_fields=['title'])
+        self.assertFalse([query for query in context.captured_queries if 'blog_archiveperiod' in query['sql']])
+
+    def test_refresh_updates_rows_in_place(self):
+        ids = {(row.year, row.month, row.day): row.id for row in ArchivePeriod.objects.all()}
+        refresh_archive([self.posts[0].publish])
+        self.assertEqual(
+            {(row.year, row.month, row.day): row.id for row in ArchivePeriod.objects.all()}, ids
+        )
+
+    def test_archive_pages(self):
+        responses = {}
+        for args, expected in [
+            ([2024], [1, 0]), ([2024, 3], [1, 0]), ([2024, 3, 5], [1, 0]), ([2023, 12, 31], [2]),
+        ]:
+            name = ['post_archive_year', 'post_archive_month', 'post_archive_day'][len(args) - 1]
+            response = responses[name] = self.assertMaxQueries(9, reverse(f'blog:{name}', args=args))
+            self.assertEqual(
+                [post.id for post in response.context['posts']],
+                [self.posts[i].id for i in expected],
+            )
+        response = responses['post_archive_year']
+        self.assertEqual(
+            [child.get_absolute_url() for child in response.context['children']],
+            [reverse('blog:post_archive_month', args=[2024, 3])],
+        )
+        self.assertContains(response, 'Archive: 2024')
+        for args in ([2022], [2024, 2], [2024, 3, 6], [2024, 13]):
+            name = ['post_archive_year', 'post_archive_month', 'post_archive_day'][len(args) - 1]
+            self.assertEqual(self.client.get(reverse(f'blog:{name}', args=args)).status_code, 404)
+
+    def test_sidebar_tree(self):
+        self.assertEqual(
+            [(year['period'].year, [month.month for month in year['months']]) for year in archive_tree()],
+            [(2024, [3]), (2023, [12])],
+        )
+        response = self.client.get(reverse('blog:post_list'))
+        month_url = reverse('blog:post_archive_month', args=[2023, 12])
+        self.assertContains(response, f'<a href="{month_url}">December</a> (1)')
+        # Повторно дерево архива берется из кеша боковой панели без запросов
+        with self.assertNumQueries(0):
+            Template('{% load blog_tags %}{% archive_tree %}').render(Context())
+
+    def test_rebuild_command(self):
+        ArchivePeriod.objects.all().delete()
+        out = io.StringIO()
+        call_command('rebuild_archive', stdout=out)
+        self.assertIn('Stored 6 archive period(s).', out.getvalue())
+        self.assertEqual(self.counts()[2024, 3, 5], 2)
+
+
+class ScheduledPublishingTests(QueryCountTestCase):
+    """ Отложенная публикация постов """
+
+    posts_count = 2
+
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.create(
+            title='Future post', slug='future-post', body='Soon', author=self.author,
+            status=Post.Status.PUBLISHED, publish=timezone.now() + timedelta(hours=1),
+        )
+        self.post.tags.add('django')
+
+    def test_future_post_is_scheduled(self):
+        self.assertEqual(self.post.status, Post.Status.SCHEDULED)
+        self.assertNotIn(self.post, Post.published.all())
+        self.assertNotContains(self.client.get(reverse('blog:post_feed')), 'Future post')
+        self.assertEqual(self.client.get(self.post.get_absolute_url()).status_code, 404)
+        self.assertEqual(TagStats.objects.get(tag__slug='django').post_count, self.posts_count)
+
+    def test_publish_due_posts(self):
+        self.client.get(reverse('blog:post_feed'))
+        out = io.StringIO()
+        call_command('publish_scheduled', stdout=out)
+        self.assertIn('Done: 0 post(s) published.', out.getvalue())
+
+        Post.objects.filter(pk=self.post.pk).update(publish=timezone.now() - timedelta(minutes=1))
+        call_command('publish_scheduled', stdout=out)
+        self.assertIn('Published "Future post"', out.getvalue())
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.status, Post.Status.PUBLISHED)
+        # Сигналы публикации сбросили ленту и обновили данные тегов
+        self.assertContains(self.client.get(reverse('blog:post_feed')), 'Future post')
+        stats = TagStats.objects.get(tag__slug='django')
+        self.assertEqual((stats.post_count, stats.post_ids[-1]), (self.posts_count + 1, self.post.id))
+        self.assertEqual(self.client.get(self.post.get_absolute_url()).status_code, 200)
+
+
+class PerformanceMetricsTests(QueryCountTestCase):
+    """ Метрики производительности запросов (blog.perf) """
+
+    posts_count = 2
+
+    @override_settings(BLOG_PERF_SERVER_TIMING=True)
+    def test_server_timing(self):
+        url = self.posts[0].get_absolute_url()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn(f'desc="{len(context.captured_queries)} queries"', timing)
+        for name in ('total', 'template', 'sidebar'):
+            self.assertIn(f'{name};dur=', timing)
+
+    @override_settings(BLOG_PERF_LOG_SAMPLE_RATE=1.0)
+    def test_log_and_report(self):
+        with self.assertLogs('blog.perf', 'INFO') as logs:
+            for _ in range(3):
+                self.client.get(reverse('blog:post_list'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'blog:post_list')
+        self.assertEqual(record['status'], 200)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.log') as log:
+            log.write('\n'.join(record.getMessage() for record in logs.records))
+            log.flush()
+            output = io.StringIO()
+            call_command('perf_report', log.name, '--json', stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(report['blog:post_list']['count'], 3)
+
+    @override_settings(BLOG_PERF_SERVER_TIMING=False, BLOG_PERF_LOG_SAMPLE_RATE=0.0)
+    def test_disabled(self):
+        with self.assertNoLogs('blog.perf'):
+            response = self.client.get(reverse('blog:post_list'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class BenchmarkCommandTests(TestCase):
+    """ Синтетический набор постов и нагрузочный тест страниц """
+
+    def test_generate_corpus_and_run_benchmarks(self):
+        call_command(
+            'generate_corpus', posts=12, tags=4, comments_per_post=2, seed=1, stdout=io.StringIO()
+        )
+        posts = Post.objects.filter(slug__startswith='corpus-')
+        self.assertEqual(posts.count(), 12)
+        self.assertEqual(Comment.objects.filter(post__in=posts).count(), 24)
+        self.assertFalse(posts.filter(body_html='').exists())
+        self.assertIn('codehilite', posts.first().body_html)
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'run_benchmarks', iterations=2, warmup=0, cold_cache=True, output=output.name,
+                compare=output.name, stdout=io.StringIO()
+            )
+            results = json.load(output)
+        for name in ('post_list', 'post_list_by_tag', 'post_detail', 'post_search',
+                     'post_feed', 'sitemap_index', 'sitemap_section'):
+            self.assertEqual(results['endpoints'][name]['errors'], 0, name)
+            self.assertGreater(results['endpoints'][name]['queries'], 0, name)
+
+    def test_clear_corpus(self):
+        generate_corpus(User.objects.create(username='bench'), posts=12, tags=4, seed=1)
+        # Посты удаляются без сигналов удаления, а производные данные
+        # перестраиваются один раз
+        with mock.patch('blog.signals.refresh_archive') as refresh_archive:
+            out = io.StringIO()
+            call_command('generate_corpus', posts=0, clear=True, stdout=out)
+        refresh_archive.assert_not_called()
+        self.assertIn('Deleted 12 generated post(s).', out.getvalue())
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(SimilarPost.objects.exists())
+        self.assertFalse(TagStats.objects.exists())
+        self.assertFalse(ArchivePeriod.objects.exists())
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM blog_post_fts')
+                self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class TemplateTuningTests(QueryCountTestCase):
+    """ Кеширующий загрузчик шаблонов, прогрев шаблонов и их нагрузочный тест """
+
+    posts_count = 4
+
+    def test_production_settings(self):
+        from config import settings_production
+
+        # Кеширующим загрузчиком Django оборачивает загрузчики по умолчанию
+        self.assertNotIn('loaders', settings_production.TEMPLATES[0]['OPTIONS'])
+        self.assertIsInstance(engines.all()[0].engine.template_loaders[0], CachedLoader)
+        self.assertTrue(settings_production.BLOG_TEMPLATE_WARMUP)
+
+    def test_warm_templates(self):
+        loader = engines.all()[0].engine.template_loaders[0]
+        loader.reset()
+        warmed = warm_templates()
+        self.assertIn('blog/base.html', warmed)
+        self.assertIn('pagination.html', warmed)
+        self.assertEqual(set(warmed), set(loader.get_template_cache))
+        response = self.client.get(reverse('blog:post_list'))
+        self.assertEqual(response.status_code, 200)
+        # Без кеширующего загрузчика прогревать нечего
+        with override_settings(TEMPLATES=[{**settings.TEMPLATES[0], 'APP_DIRS': False, 'OPTIONS': {
+            **settings.TEMPLATES[0]['OPTIONS'], 'loaders': TEMPLATE_LOADERS,
+        }}]):
+            self.assertEqual(warm_templates(), [])
+
+    def test_warmup_only_on_server_startup(self):
+        with mock.patch('blog.perf.warm_templates') as warm:
+            with override_settings(BLOG_TEMPLATE_WARMUP=False):
+                warm_templates_on_startup()
+            warm.assert_not_called()
+            with override_settings(BLOG_TEMPLATE_WARMUP=True):
+                warm_templates_on_startup()
+            warm.assert_called_once_with()
+
+    def test_benchmark_templates(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'benchmark_templates', iterations=2, warmup=0, output=output.name, stdout=io.StringIO()
+            )
+            results = json.load(output)
+        # Страница списка загружает base.html, pagination.html и шаблоны
+        # трех тегов включения боковой панели
+        self.assertEqual(results['blog/post/list.html']['uncached']['loads'], 6)
+        for name in ('blog/post/detail.html', 'pagination.html', 'blog/post/latest_posts.html'):
+            self.assertGreater(results[name]['cached']['p50'], 0, name)
+        with self.assertRaises(CommandError):
+            call_command('benchmark_templates', 'missing.html', iterations=1, stdout=io.StringIO())
+
+
+class QueryPlanTests(TestCase):
+    """
+    Планы выполнения частых запросов блога на синтетическом наборе постов.
+    Тест не проходит, если запрос читает таблицу блога полным просмотром,
+    а не по индексу.
+    """
+
+    # Полный просмотр таблицы в выводе EXPLAIN SQLite ("SCAN blog_post", но не
+    # "SCAN blog_post USING INDEX ...") и PostgreSQL ("Seq Scan on blog_post")
+    FULL_SCAN = re.compile(r'\bSCAN (\w+)\b(?! USING)|Seq Scan on (\w+)')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', password='secret')
+        generate_corpus(cls.author, posts=200, tags=20, comments_per_post=2, seed=1)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.post = Post.published.order_by('-publish').last()
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # На небольшом наборе данных PostgreSQL предпочитает полный
+            # просмотр, поэтому проверяется, что индекс можно использовать
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndexes(self, queryset):
+        plan = queryset.explain()
+        scanned = [
+            table for match in self.FULL_SCAN.finditer(plan) for table in match.groups()
+            if table and table.startswith(('blog_', 'taggit_'))
+        ]
+        self.assertEqual(scanned, [], f'{queryset.query}\n{plan}')
+
+    def test_hot_queries(self):
+        post, now = self.post, timezone.now()
+        paginator = KeysetPaginator(Post.published.for_list(), 3)
+        hot_queries = {
+            'post_list': Post.published.for_list().order_by('-publish', '-id')[:4],
+            'post_list_cursor': paginator._query(paginator.encode_cursor(post))[0],
+            'post_detail': Post.published.published_on(
+                post.publish.year, post.publish.month, post.publish.day
+            ).filter(slug=post.slug),
+            'post_comments': comment_paginator(post)._query(None)[0],
+            'post_share': Post.published.filter(id=post.id),
+            'similar_posts': SimilarPost.objects.filter(
+                post=post, neighbor__status=Post.Status.PUBLISHED
+            ).select_related('neighbor').order_by('-score', '-neighbor__publish')[:4],
+            'latest_posts': Post.published.for_links().order_by('-publish')[:5],
+            'most_commented_posts': Post.published.for_links().order_by('-active_comment_count')[:5],
+            'feed': Post.published.for_feed()[:5],
+            'sitemap_section': month_posts(post.publish.year, post.publish.month),
+            'tag_page': TagStats.objects.select_related('tag').filter(tag__slug='topic-1'),
+            'scheduled_posts': Post.objects.filter(status=Post.Status.SCHEDULED, publish__lte=now),
+            'mail_queue': OutgoingEmail.objects.filter(
+                status=OutgoingEmail.Status.PENDING, next_attempt__lte=now
+            ).order_by('next_attempt'),
+        }
+        for name, queryset in hot_queries.items():
+            with self.subTest(name):
+                self.assertUsesIndexes(queryset)
+
+    def test_detail_date_range(self):
+        """ Пост находится по полуинтервалу дат, а несуществующая дата дает 404 """
+        post = self.post
+        day = Post.published.published_on(post.publish.year, post.publish.month, post.publish.day)
+        self.assertIn(post, day.filter(slug=post.slug))
+        self.assertFalse(Post.published.published_on(2024, 2, 30).exists())
+        self.assertEqual(self.client.get(post.get_absolute_url()).status_code, 200)
+
+
+class TransferTests(QueryCountTestCase):
+    """ Массовый импорт и экспорт постов """
+
+    posts_count = 3
+
+    def export(self, fmt='jsonl'):
+        with tempfile.NamedTemporaryFile('r', suffix=f'.{fmt}', encoding='utf-8') as output:
+            call_command('export_posts', output.name, format=fmt, stdout=io.StringIO())
+            return output.read()
+
+    def load(self, content, fmt='jsonl'):
+        with tempfile.NamedTemporaryFile('w', suffix=f'.{fmt}', encoding='utf-8') as source:
+            source.write(content)
+            source.flush()
+            out = io.StringIO()
+            call_command('import_posts', source.name, format=fmt, batch_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_round_trip(self):
+        Comment.objects.filter(post=self.posts[0]).set_active(False)
+        exported = self.export()
+        self.assertEqual(len(exported.splitlines()), self.posts_count)
+
+        Post.objects.all().delete()
+        out = self.load(exported)
+        self.assertIn('Imported 3 post(s), 6 tag link(s) and 3 comment(s)', out)
+        self.assertIn('rows/s', out)
+        self.assertEqual(self.export(), exported)
+        self.assertEqual(Post.objects.get(pk=self.posts[0].pk).active_comment_count, 0)
+        self.assertEqual(Post.objects.get(pk=self.posts[1].pk).active_comment_count, 1)
+        self.assertEqual(TagStats.objects.get(tag__slug='django').post_count, self.posts_count)
+        self.assertTrue(Post.objects.get(pk=self.posts[1].pk).body_html)
+
+    def test_csv_upsert(self):
+        exported = self.export('csv')
+        self.assertTrue(exported.startswith('id,title,slug,author,body,publish,status,tags'))
+        changed = exported.replace('Django post 1', 'Imported title')
+        changed += ',New post,new-post,importer,Body,2024-01-02T10:00:00,PB,"django,fresh"\n'
+        self.load(changed, 'csv')
+
+        self.assertEqual(Post.objects.get(pk=self.posts[1].pk).title, 'Imported title')
+        post = Post.objects.get(slug='new-post')
+        self.assertEqual(post.author.username, 'importer')
+        self.assertEqual(sorted(post.tags.names()), ['django', 'fresh'])
+        self.assertEqual(Post.objects.count(), self.posts_count + 1)
+        # Комментарии не входят в CSV и сохраняются
+        self.assertEqual(Comment.objects.count(), self.posts_count)
+        # Производные данные импортированных постов обновлены
+        self.assertEqual(search_posts('Imported'), [self.posts[1].pk])
+        self.assertEqual(TagStats.objects.get(tag__slug='fresh').post_ids, [post.pk])
+        self.assertEqual(ArchivePeriod.objects.get(year=2024, month=1, day=2).post_count, 1)
+
+    def test_upsert_updates_timestamps(self):
+        post = Post.objects.get(pk=self.posts[0].pk)
+        comment = post.comments.get()
+        Post.objects.filter(pk=post.pk).update(updated=post.updated - timedelta(days=1))
+        Comment.objects.filter(pk=comment.pk).update(updated=comment.updated - timedelta(days=1))
+        stale = Post.objects.get(pk=post.pk).updated
+
+        record = json.loads(self.export().splitlines()[0])
+        record['title'] = 'Changed title'
+        # Комментарий без даты создания сохраняет прежнюю дату
+        del record['comments'][0]['created']
+        self.load(json.dumps(record) + '\n')
+
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.title, 'Changed title')
+        self.assertGreater(post.updated, stale)
+        changed = Comment.objects.get(pk=comment.pk)
+        self.assertGreater(changed.updated, comment.updated - timedelta(days=1))
+        self.assertEqual(changed.created, comment.created)
+
+    def test_skips_unknown_status(self):
+        records = [json.loads(line) for line in self.export().splitlines()]
+        records[0]['status'] = 'XX'
+        for record in records:
+            record['title'] = 'Reimported'
+        with mock.patch('blog.transfer.refresh_similar_posts') as refresh:
+            out = self.load(''.join(json.dumps(record) + '\n' for record in records))
+        self.assertIn('Imported 2 post(s)', out)
+        self.assertIn('Skipped 1 record(s) with an unknown status', out)
+        self.assertEqual(Post.objects.get(pk=self.posts[0].pk).title, 'Django post 0')
+        # Похожие посты пересчитываются один раз для всех порций
+        refresh.assert_called_once_with([self.posts[1].pk, self.posts[2].pk])
+
+
+class AdminTests(QueryCountTestCase):
+    """ Списки постов и комментариев панели администратора на больших таблицах """
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.force_login(self.admin)
+
+    def test_changelists_do_not_query_per_row(self):
+        for name in ('admin:blog_post_changelist', 'admin:blog_comment_changelist'):
+            with self.subTest(name), CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertLess(len(context.captured_queries), self.posts_count)
+
+    def test_search_uses_backend(self):
+        draft = Post.objects.create(
+            title='Draft about pelicans', slug='draft', body='Unpublished', author=self.author
+        )
+        response = self.client.get(reverse('admin:blog_post_changelist') + '?q=pelicans')
+        self.assertEqual(list(response.context['cl'].result_list), [draft])
+
+    def test_search_keeps_relevance_order(self):
+        post_ids = [self.posts[2].pk, self.posts[0].pk, self.posts[1].pk]
+        url = reverse('admin:blog_post_changelist') + '?q=django'
+        with mock.patch('blog.search.sqlite.SQLiteSearchBackend.search', return_value=post_ids):
+            response = self.client.get(url)
+            self.assertEqual([post.pk for post in response.context['cl'].result_list], post_ids)
+            self.assertNotContains(response, 'most relevant posts')
+            # Усечение результатов видно редактору
+            with override_settings(BLOG_SEARCH_MAX_RESULTS=3):
+                response = self.client.get(url)
+            self.assertContains(response, 'Only the 3 most relevant posts are shown.')
+
+    @override_settings(BLOG_ADMIN_LARGE_TABLES=True)
+    def test_large_tables_mode(self):
+        response = self.client.get(reverse('admin:blog_post_changelist'))
+        cl = response.context['cl']
+        self.assertIsNone(cl.date_hierarchy)
+        self.assertNotIn('created', cl.list_filter)
+        ordering = cl.get_ordering(response.wsgi_request, Post.objects.all())
+        self.assertEqual(ordering[:3], ['status', '-publish', '-id'])
+
+    def test_comment_list_defers_post_body(self):
+        response = self.client.get(reverse('admin:blog_comment_changelist'))
+        comment = response.context['cl'].result_list[0]
+        self.assertEqual(
+            comment.post.get_deferred_fields(), {'body', 'body_html', 'body_excerpt', 'search_vector'}
+        )
+
+    def test_author_filter(self):
+        other = User.objects.create_user('other')
+        post = Post.objects.create(title='Other post', slug='other', body='Body', author=other)
+        url = reverse('admin:blog_post_changelist')
+        response = self.client.get(f'{url}?author__id__exact={other.id}')
+        self.assertEqual(list(response.context['cl'].result_list), [post])
+        self.assertContains(response, 'data-ajax--url')
+
+        response = self.client.get(
+            reverse('admin:autocomplete'),
+            {'term': 'oth', 'app_label': 'blog', 'model_name': 'post', 'field_name': 'author'},
+        )
+        self.assertEqual([item['text'] for item in response.json()['results']], ['other'])
+
+    @override_settings(BLOG_ADMIN_COUNT_LIMIT=3)
+    def test_estimated_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        paginator = EstimatedCountPaginator(Post.objects.all(), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, self.posts_count)
+        # Отфильтрованные посты считаются не дальше BLOG_ADMIN_COUNT_LIMIT
+        paginator = EstimatedCountPaginator(Post.objects.filter(title__startswith='Django'), 2)
+        self.assertEqual(paginator.count, 3)
+
+    def test_bulk_moderation(self):
+        url = reverse('admin:blog_comment_changelist')
+        ids = [str(pk) for pk in Comment.objects.values_list('id', flat=True)]
+        self.client.post(url, {'action': 'hide_comments', '_selected_action': ids})
+        self.assertFalse(Comment.objects.filter(active=True).exists())
+        self.assertEqual(Post.objects.filter(active_comment_count__gt=0).count(), 0)
+
+
+class ReplicaRouterTests(TestCase):
+    """ Маршрутизация чтения данных блога на реплики """
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.router.replicas = ['replica_1']
+        self.factory = RequestFactory()
+
+    def route(self, model, **hints):
+        token = _read_from_replicas.set(True)
+        try:
+            return self.router.db_for_read(model, **hints)
+        finally:
+            _read_from_replicas.reset(token)
+
+    def test_blog_reads_go_to_replicas(self):
+        self.assertEqual(self.route(Post), 'replica_1')
+        self.assertEqual(self.route(User), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    @override_settings(DATABASES={'default': {}, 'replica_1': {}})
+    def test_replica_requests(self):
+        set_last_modified(timezone.now() - timedelta(minutes=1))
+        self.assertTrue(reads_from_replicas(self.factory.get('/blog/')))
+        self.assertFalse(reads_from_replicas(self.factory.post('/blog/1/comment/')))
+        self.assertFalse(reads_from_replicas(self.factory.get(reverse('admin:index'))))
+
+        request = self.factory.get('/blog/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertFalse(reads_from_replicas(request))
+
+        # Сразу после изменения содержимого реплики могут отставать
+        set_last_modified(timezone.now())
+        self.assertFalse(reads_from_replicas(self.factory.get('/blog/')))
+
+    def test_post_sets_sticky_cookie(self):
+        post = Post.objects.create(
+            title='Post', slug='post', body='Body', status=Post.Status.PUBLISHED,
+            author=User.objects.create_user(username='author'),
+        )
+        response = self.client.post(
+            reverse('blog:post_comment', args=[post.id]),
+            {'name': 'reader', 'email': 'r@example.com', 'body': 'Hi'},
+        )
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertNotIn(STICKY_COOKIE, self.client.get(reverse('blog:post_list')).cookies)
+
+
+class CommentWriteTests(QueryCountTestCase):
+    """ Ограничение частоты и буферизованная запись комментариев """
+
+    posts_count = 2
+
+    def comment(self, post, ip='10.0.0.1'):
+        return self.client.post(
+            reverse('blog:post_comment', args=[post.id]),
+            {'name': 'reader', 'email': 'r@example.com', 'body': 'Hi'},
+            REMOTE_ADDR=ip,
+        )
+
+    @override_settings(BLOG_COMMENT_RATE_LIMITS={'comment_ip': (2, 60), 'comment_post': (3, 60)})
+    def test_rate_limits(self):
+        post = self.posts[0]
+        self.assertEqual(self.comment(post).status_code, 200)
+        self.assertEqual(self.comment(post).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.comment(post)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        # Другой клиент ограничен только корзиной поста
+        self.assertEqual(self.comment(post, ip='10.0.0.2').status_code, 200)
+        self.assertEqual(self.comment(post, ip='10.0.0.3').status_code, 429)
+        # Отклоненный по корзине поста запрос не расходует корзину клиента
+        self.assertEqual(self.comment(self.posts[1], ip='10.0.0.3').status_code, 200)
+        self.assertEqual(self.comment(self.posts[1], ip='10.0.0.3').status_code, 200)
+
+    @override_settings(BLOG_COMMENT_BUFFER=True, BLOG_COMMENT_FLUSH_INTERVAL=3600)
+    def test_buffered_comments(self):
+        post = self.posts[0]
+        for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+            self.assertContains(self.comment(post, ip=ip), 'Your comment has been added')
+        self.assertEqual(post.comments.count(), 1)
+        self.assertEqual(len(comment_buffer), 3)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(comment_buffer.flush(), 3)
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(post.comments.count(), 4)
+        post.refresh_from_db()
+        self.assertEqual(post.active_comment_count, 4)
+
+
+@override_settings(BLOG_COMMENTS_PER_PAGE=2)
+class CommentPaginationTests(QueryCountTestCase):
+    """ Страницы комментариев поста по курсору """
+
+    posts_count = 1
+
+    def setUp(self):
+        super().setUp()
+        self.post = self.posts[0]
+        for i in range(4):
+            Comment.objects.create(post=self.post, name=f'reader-{i}', email='r@example.com', body=f'Comment {i}')
+        self.url = reverse('blog:post_comments', args=[self.post.id])
+
+    def test_pages(self):
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertEqual([comment.name for comment in response.context['comments']], ['reader', 'reader-0'])
+        next_url = f'{self.url}?cursor={response.context["comments"].next_cursor}'
+        self.assertContains(response, next_url)
+
+        response = self.client.get(next_url)
+        self.assertContains(response, 'reader-1')
+        self.assertContains(response, 'reader-2')
+        self.assertNotContains(response, 'reader-0')
+
+        data = self.client.get(next_url + '&format=json').json()
+        self.assertEqual([comment['name'] for comment in data['comments']], ['reader-1', 'reader-2'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([comment['name'] for comment in data['comments']], ['reader-3'])
+        self.assertIsNone(data['next'])
+
+    def test_unknown_post(self):
+        self.assertEqual(self.client.get(reverse('blog:post_comments', args=[0])).status_code, 404)
+
+    def test_pages_are_cached_until_comments_change(self):
+        url = self.url + '?format=json'
+        etag = self.client.get(url)['ETag']
+        self.assertMaxQueries(0, url)
+
+        Comment.objects.filter(name='reader-0').set_active(False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([comment['name'] for comment in response.json()['comments']], ['reader', 'reader-1'])
+
+
+class MailQueueTests(QueryCountTestCase):
+    """ Очередь писем представления post_share """
+
+    posts_count = 1
+
+    def share(self):
+        return self.client.post(
+            reverse('blog:post_share', args=[self.posts[0].id]),
+            {'name': 'Reader', 'email': 'reader@example.com', 'to': 'friend@example.com'},
+        )
+
+    def test_share_enqueues_mail(self):
+        response = self.share()
+        self.assertContains(response, 'E-mail successfully sent')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().status, OutgoingEmail.Status.PENDING)
+
+        self.assertEqual(send_queued_mail(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['friend@example.com'])
+        self.assertEqual(OutgoingEmail.objects.get().status, OutgoingEmail.Status.SENT)
+
+    def test_failed_mail_is_retried_later(self):
+        self.share()
+        with mock.patch('blog.mail.EmailMessage.send', side_effect=SMTPException('down')):
+            self.assertEqual(send_queued_mail(), (0, 1))
+
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.status, OutgoingEmail.Status.PENDING)
+        self.assertEqual(email.attempts, 1)
+        # Следующая попытка отложена, поэтому письмо не выбирается сразу
+        self.assertEqual(send_queued_mail(), (0, 0))
 
-# Create your tests here.
@@ -0,0 +1,291 @@
+import csv
+import json
+import time
+from itertools import batched
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+from taggit.models import Tag, TaggedItem
+
+from .archive import refresh_archive
+from .cache import content_changed, invalidate_feeds
+from .models import Comment, Post
+from .search import get_backend
+from .similarity import refresh_similar_posts
+from .tagstats import refresh_tag_stats
+
+
+# Массовый импорт и экспорт постов с тегами и комментариями в форматах
+# JSON Lines (по объекту поста на строку, с тегами и комментариями) и CSV
+# (по строке на пост, теги через запятую, без комментариев). Записи
+# читаются и пишутся потоком, поэтому расход памяти не зависит от
+# размера архива. Посты и комментарии с полем id обновляются
+# (upsert по первичному ключу), без него - создаются.
+
+FORMATS = ('jsonl', 'csv')
+
+# Столбцы CSV
+CSV_FIELDS = ['id', 'title', 'slug', 'author', 'body', 'publish', 'status', 'tags']
+
+# Поля постов и комментариев, обновляемые при импорте существующих строк
+# (updated обновляется, чтобы условные GET-запросы и карта сайта
+# видели измененное содержимое)
+POST_UPDATE_FIELDS = [
+    'title', 'slug', 'author', 'body', 'body_html', 'body_excerpt', 'body_hash', 'publish', 'status',
+    'updated',
+]
+COMMENT_UPDATE_FIELDS = ['post', 'name', 'email', 'body', 'active', 'updated']
+
+
+def read_records(stream, fmt: str):
+    """ Генератор записей постов из текстового потока stream """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            tags = row.get('tags')
+            if tags is not None:
+                row['tags'] = [name.strip() for name in tags.split(',') if name.strip()]
+            yield row
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _datetime(value):
+    """ Преобразует строку ISO 8601 в дату и время с часовым поясом """
+    if not value:
+        return None
+    value = parse_datetime(value) if isinstance(value, str) else value
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+
+def _authors(records) -> dict[str, int]:
+    """ Возвращает идентификаторы авторов по именам, создавая недостающих """
+    names = {record['author'] for record in records}
+    authors = dict(User.objects.filter(username__in=names).values_list('username', 'id'))
+    missing = [User(username=name) for name in names - authors.keys()]
+    for user in missing:
+        user.set_unusable_password()
+    User.objects.bulk_create(missing)
+    authors.update(User.objects.filter(username__in=names - authors.keys()).values_list('username', 'id'))
+    return authors
+
+
+def _tags(names) -> dict[str, int]:
+    """ Возвращает идентификаторы тегов по именам, создавая недостающие """
+    tags = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - tags.keys()
+    Tag.objects.bulk_create(
+        [Tag(name=name, slug=slugify(name)) for name in missing], ignore_conflicts=True
+    )
+    tags.update(Tag.objects.filter(name__in=missing).values_list('name', 'id'))
+    # Теги, слаг которых совпал со слагом другого тега, создаются по одному:
+    # Tag.save() подбирает уникальный слаг
+    for name in missing - tags.keys():
+        tags[name] = Tag.objects.get_or_create(name=name)[0].id
+    return tags
+
+
+def _valid_status(record) -> bool:
+    """ Проверяет статус записи. Запись без статуса импортируется опубликованной """
+    return not record.get('status') or record['status'] in Post.Status.values
+
+
+def _import_batch(records, content_type, counts: dict, touched: dict) -> list[int]:
+    """
+    Импортирует порцию записей постов в одной транзакции и обновляет их
+    в поисковом индексе. Возвращает идентификаторы постов порции, а в
+    touched добавляет затронутые теги и прежние и новые даты публикации
+    """
+    now = timezone.now()
+    authors = _authors(records)
+
+    # Прежние даты публикации и теги обновляемых постов: их архив
+    # и данные тегов тоже пересчитываются
+    existing = [record['id'] for record in records if record.get('id')]
+    touched['dates'].update(Post.objects.filter(id__in=existing).values_list('publish', flat=True))
+    touched['tag_ids'].update(
+        TaggedItem.objects.filter(content_type=content_type, object_id__in=existing)
+        .values_list('tag_id', flat=True)
+    )
+
+    posts = []
+    for record in records:
+        post = Post(
+            id=record.get('id') or None,
+            title=record['title'],
+            slug=record['slug'],
+            author_id=authors[record['author']],
+            body=record['body'],
+            publish=_datetime(record.get('publish')) or now,
+            status=record.get('status') or Post.Status.PUBLISHED,
+            updated=now,
+        )
+        post.render_body()
+        post.schedule()
+        posts.append(post)
+
+    Post.objects.bulk_create(
+        posts, update_conflicts=True, unique_fields=['id'], update_fields=POST_UPDATE_FIELDS
+    )
+    counts['posts'] += len(posts)
+    touched['dates'].update(post.publish for post in posts)
+
+    # Теги записей заменяют прежние теги постов
+    tagged = [(post, record['tags']) for post, record in zip(posts, records) if 'tags' in record]
+    tags = _tags({name for _, names in tagged for name in names})
+    touched['tag_ids'].update(tags.values())
+    TaggedItem.objects.filter(
+        content_type=content_type, object_id__in=[post.id for post, _ in tagged]
+    ).delete()
+    tagged_items = TaggedItem.objects.bulk_create([
+        TaggedItem(tag_id=tags[name], content_type=content_type, object_id=post.id)
+        for post, names in tagged
+        for name in dict.fromkeys(names)
+    ])
+    counts['tagged_items'] += len(tagged_items)
+
+    comments = [
+        Comment(
+            id=data.get('id') or None,
+            post_id=post.id,
+            name=data['name'],
+            email=data['email'],
+            body=data['body'],
+            active=data.get('active', True),
+            created=_datetime(data.get('created')),
+            updated=now,
+        )
+        for post, record in zip(posts, records)
+        for data in record.get('comments', ())
+    ]
+    if comments:
+        # auto_now_add перезаписывает дату создания при INSERT, поэтому
+        # даты из архива восстанавливаются одним UPDATE. Дата создания
+        # комментариев без нее в записи не меняется
+        created = [comment.created for comment in comments]
+        Comment.objects.bulk_create(
+            comments, update_conflicts=True, unique_fields=['id'], update_fields=COMMENT_UPDATE_FIELDS
+        )
+        dated = []
+        for comment, value in zip(comments, created):
+            if value is not None:
+                comment.created = value
+                dated.append(comment)
+        Comment.objects.bulk_update(dated, ['created'])
+        counts['comments'] += len(comments)
+
+    # Массовые INSERT не обновляют счетчики активных комментариев
+    active = dict(
+        Comment.objects.filter(post_id__in=[post.id for post in posts], active=True)
+        .order_by().values_list('post_id').annotate(total=Count('id'))
+    )
+    for post in posts:
+        post.active_comment_count = active.get(post.id, 0)
+    Post.objects.bulk_update(posts, ['active_comment_count'])
+
+    # Строки индекса заменяются по одной, поэтому поиск по остальным
+    # постам во время импорта продолжает работать
+    get_backend().index_posts(posts)
+    return [post.id for post in posts]
+
+
+def import_posts(records, batch_size: int = 500, progress=None) -> dict:
+    """
+    Импортирует записи постов порциями по batch_size: посты и комментарии
+    вставляются или обновляются одним INSERT ... ON CONFLICT на порцию,
+    теги разрешаются и связываются с постами массовыми запросами.
+    Записи с неизвестным статусом пропускаются. Возвращает число
+    импортированных объектов, пропущенных записей и время импорта.
+    Функция progress вызывается после каждой порции с промежуточными
+    итогами.
+    """
+    content_type = ContentType.objects.get_for_model(Post)
+    counts = {'posts': 0, 'tagged_items': 0, 'comments': 0, 'skipped': 0}
+    touched = {'tag_ids': set(), 'dates': set()}
+    post_ids = []
+    started = time.perf_counter()
+
+    # Массовые INSERT не отправляют сигналы, поэтому производные данные
+    # импортированных постов пересчитываются явно: поисковый индекс -
+    # после каждой порции, похожие посты, данные тегов и архив - один
+    # раз в конце
+    for batch in batched(records, batch_size):
+        valid = [record for record in batch if _valid_status(record)]
+        counts['skipped'] += len(batch) - len(valid)
+        if valid:
+            with transaction.atomic():
+                post_ids += _import_batch(valid, content_type, counts, touched)
+        if progress is not None:
+            progress({**counts, 'seconds': time.perf_counter() - started})
+
+    refresh_similar_posts(post_ids)
+    refresh_tag_stats(touched['tag_ids'])
+    refresh_archive(touched['dates'])
+    content_changed()
+    invalidate_feeds(Tag.objects.filter(id__in=touched['tag_ids']).values_list('slug', flat=True))
+    return {**counts, 'seconds': time.perf_counter() - started}
+
+
+def export_records(chunk_size: int = 2000, include_comments: bool = True):
+    """
+    Генератор записей всех постов в порядке id. Посты читаются порциями
+    по chunk_size через iterator(), а теги, авторы и комментарии
+    загружаются для каждой порции отдельными запросами.
+    """
+    posts = (
+        Post.objects.order_by('id')
+        .select_related('author')
+        .defer('body_html', 'body_excerpt', 'search_vector')
+        .prefetch_related('tags')
+    )
+    if include_comments:
+        posts = posts.prefetch_related(
+            Prefetch('comments', queryset=Comment.objects.order_by('created', 'id'))
+        )
+
+    for post in posts.iterator(chunk_size=chunk_size):
+        record = {
+            'id': post.id,
+            'title': post.title,
+            'slug': post.slug,
+            'author': post.author.username,
+            'body': post.body,
+            'publish': post.publish.isoformat(),
+            'status': post.status,
+            'tags': [tag.name for tag in post.tags.all()],
+        }
+        if include_comments:
+            record['comments'] = [
+                {
+                    'id': comment.id,
+                    'name': comment.name,
+                    'email': comment.email,
+                    'body': comment.body,
+                    'active': comment.active,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in post.comments.all()
+            ]
+        yield record
+
+
+def write_records(records, stream, fmt: str) -> int:
+    """ Записывает записи постов в текстовый поток stream. Возвращает их число """
+    total = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for total, record in enumerate(records, 1):
+            writer.writerow({**record, 'tags': ','.join(record['tags'])})
+        return total
+    for total, record in enumerate(records, 1):
+        stream.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False))
+        stream.write('\n')
+    return total
@@ -1,28 +1,39 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
-from .feeds import LatestPostaFeed
+from . import async_views, views
 
 
 app_name = 'blog'
 
+# Публичные страницы обслуживаются асинхронными представлениями, если
+# включен параметр BLOG_ASYNC_VIEWS (по умолчанию при запуске через ASGI)
+read_views = async_views if settings.BLOG_ASYNC_VIEWS else views
+
 
 urlpatterns = [
     # Шаблон url-адреса, который не принимает аргументов
     # и соотносится с представлением post_list 
-    path('', view=views.post_list, name='post_list'),
+    path('', view=read_views.post_list, name='post_list'),
 
     # Шаблон url-адреса, который не принимает аргументов
     # и соотносится с представлением рефлизованным в виде класса
     # PostListView
     # path('', view=views.PostListView.as_view(), name='post_list'),
 
+    # Архив постов за год, месяц и день (см. blog.archive)
+    path('<int:year>/', view=read_views.post_archive, name='post_archive_year'),
+    path('<int:year>/<int:month>/', view=read_views.post_archive, name='post_archive_month'),
+    path('<int:year>/<int:month>/<int:day>/', view=read_views.post_archive, name='post_archive_day'),
+
     # Шаблон url-адреса, который принимает один аргумент
     # id и соотносится с представлением post_detail
-    path('<int:year>/<int:month>/<int:day>/<slug:post>/', view=views.post_detail, name='post_detail'),
+    path('<int:year>/<int:month>/<int:day>/<slug:post>/', view=read_views.post_detail, name='post_detail'),
     path('<int:post_id>/share/', view=views.post_share, name='post_share'),
     path('<int:post_id>/comment/', view=views.post_comment, name='post_comment'),
-    path('tag/<slug:tag_slug>/', view=views.post_list, name='post_list_by_tag'),
-    path('feed/', view=LatestPostaFeed(), name='post_feed'),
-    path('search/', view=views.post_search, name='post_search'),
+    path('<int:post_id>/comments/', view=read_views.post_comments, name='post_comments'),
+    path('tag/<slug:tag_slug>/', view=read_views.post_list, name='post_list_by_tag'),
+    path('feed/', view=read_views.post_feed, name='post_feed'),
+    path('tag/<slug:tag_slug>/feed/', view=read_views.post_feed, name='post_feed_by_tag'),
+    path('search/', view=read_views.post_search, name='post_search'),
 ]
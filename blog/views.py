@@ -1,51 +1,61 @@
+import math
+
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.views.generic import ListView
-from django.core.mail import send_mail
 from django.conf import settings
-from django.views.decorators.http import require_POST
-from django.db.models import Count
-from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
-
-from .models import Post, Comment
+from django.contrib.sitemaps.views import x_robots_tag
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_POST
+from django.utils.decorators import method_decorator
+
+from .archive import archive_children
+from .models import ArchivePeriod, Post, Comment, SimilarPost, TagStats
+from .feeds import feed_etag, feed_last_modified, load_feed
 from .forms import EmailPostForm, CommentForm, SearchForm
+from .http import public_page
+from .comments import comment_page_json, comment_paginator, save_comment
+from .mail import enqueue_mail
+from .pagination import InvalidCursor, paginate_ids, paginate_posts
+from .ratelimit import client_ip, take_tokens
+from .search import search_posts
+from .sitemaps import (
+    render_index, section_etag, section_last_modified, section_page,
+    section_rows, section_state, sections_queryset, site_url, stream_urls,
+)
 from taggit.models import Tag
 
 
+# Декоратор public_page отвечает на условные GET-запросы кодом 304 и
+# кеширует страницу целиком до изменения постов или комментариев
+@public_page
 def post_list(request, tag_slug=None):
     """ Представление списка постов на странице """
 
-    # Извлекаем все посты со статусом PUBLISHED
-    # используя созданый ранее менеджер
-    posts = Post.published.all()
+    # Извлекаем все посты со статусом PUBLISHED используя созданый
+    # ранее менеджер. for_list() загружает авторов и теги постов
+    # без дополнительных запросов на каждый пост
+    posts = Post.published.for_list()
 
     tag = None
 
     if tag_slug:
-        # Извлекаем объекты tag с полученым слагом
-        tag = get_object_or_404(Tag, slug=tag_slug)
-        # Фильтруем посты по тегам
-        posts = posts.filter(tags__in=[tag])
-
-    # Постраничная разбивка с 3 постами на странице
-    painator = Paginator(posts, 3)
-
-    # Извлекаем GET-параметр page и сохраняем его в переменной page_number
-    # Этот параметр содержин запрошеный номер страницы. Если параметра нет
-    # то используется стандартное значение 1, чтобы загрузить первую страницу.
-    page_number = request.GET.get('page', 1)
-
-    try:
-        # Получаем объект для желаемой страницы, вызывая метод page()
-        # класса Paginator, который возвращает объект Page
-        posts = painator.page(page_number)
-    except PageNotAnInteger:
-        # Если page_number не целое число, то выдать первую страницу
-        posts = painator.page(1)
-    except EmptyPage:
-        # Если page_number находиться вне диапазона, то
-        # выдать последнюю страницу
-        posts = painator.page(painator.num_pages)
+        # Тег и упорядоченный список идентификаторов его постов хранятся
+        # в таблице TagStats (см. blog.tagstats), поэтому страница тега
+        # не соединяет посты с таблицей связей тегов. Тег без
+        # опубликованных постов в ней отсутствует.
+        stats = TagStats.objects.select_related('tag').filter(tag__slug=tag_slug).first()
+        if stats is None:
+            tag, post_ids = get_object_or_404(Tag, slug=tag_slug), []
+        else:
+            tag, post_ids = stats.tag, stats.post_ids
+        # Список разбивается на страницы по 3 поста в памяти
+        posts = paginate_ids(request, post_ids, 3, posts)
+    else:
+        # Постраничная разбивка с 3 постами на странице. По умолчанию
+        # страница выбирается по курсору (GET-параметр cursor) на полях
+        # (publish, id), а старые ссылки с GET-параметром page
+        # обрабатываются классическим Paginator (см. blog.pagination).
+        posts = paginate_posts(request, posts, 3)
 
     # Контекстные переменные, чтобы прорисовать шаблон
     context = {
@@ -58,7 +68,28 @@ def post_list(request, tag_slug=None):
     return render(request=request, template_name=template, context=context)
 
 
+@public_page
+def post_archive(request, year, month=None, day=None):
+    """ Представление архива постов за год, месяц или день """
+
+    # Число постов за период хранится в таблице ArchivePeriod (см.
+    # blog.archive). Периоды без опубликованных постов в ней отсутствуют,
+    # поэтому для них возвращается ошибка 404 без запроса к постам.
+    period = get_object_or_404(ArchivePeriod, year=year, month=month or 0, day=day or 0)
+
+    # Посты периода выбираются по полуинтервалу дат публикации
+    # и разбиваются на страницы так же, как в post_list
+    posts = Post.published.for_list().published_on(year, month, day)
+    posts = paginate_posts(request, posts, 3)
+
+    context = {
+        'posts': posts, 'period': period, 'children': list(archive_children(period))
+    }
+    return render(request=request, template_name='blog/post/list.html', context=context)
+
+
 # Альтернативное представление списка постов реализованное в виде класса
+@method_decorator(public_page, name='dispatch')
 class PostListView(ListView):
     """ Класс представления списка постов """
 
@@ -66,7 +97,7 @@ class PostListView(ListView):
     # набор запросов QyerySet, не извлекая все объекты. Вместо определения
     # атрибута queryset мы могли бы указать model=Post, и Django сформировал
     # бы типовой набор запросов Post.objects.all()
-    queryset = Post.published.all()
+    queryset = Post.published.for_list()
 
     # Контекстная переменная, используется для результатов запроса.
     # Если не указана, то по умолчанию исрользуется переменная object_list. 
@@ -79,45 +110,45 @@ class PostListView(ListView):
     # Шаблон для прорисовки страницы
     template_name = 'blog/post/list.html'
 
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Разбивает набор запросов на страницы так же, как post_list.
+        Вместо списка объектов возвращается сама страница, чтобы шаблон
+        pagination.html получил ее через контекстную переменную posts.
+        """
+        page = paginate_posts(self.request, queryset, page_size)
+        return page.paginator, page, page, page.has_other_pages()
+
     
+@public_page
 def post_detail(request, year, month, day, post):
     """ Представление одиночного поста на странице """
 
     # Извлекаем объект, соответствующий переданным параметрам.
     # Если объект не найден вернется мсключение HTTP с кодом
-    # состояния 404.
+    # состояния 404. День публикации задается полуинтервалом дат,
+    # поэтому запрос использует индекс (slug, publish).
     post = get_object_or_404(
-        Post,  
-        status=Post.Status.PUBLISHED,
+        Post.published.published_on(year, month, day).select_related('author'),
         slug=post,
-        publish__year=year,
-        publish__month=month,
-        publish__day=day
     )
 
-    # Список активных комментариев к этому посту
-    comments = post.comments.filter(active=True)
+    # Первая страница активных комментариев к этому посту. Следующие
+    # страницы загружаются по запросу представлением post_comments
+    comments = comment_paginator(post).page()
 
     # Форма для комментирования пользователями
     form = CommentForm()
 
-    # Получаем список идентификаторов тегов текущего поста.
-    # values_list() - возвращает кортежи со значениями заданных полей
-    # float=True - чтобы получить одиночные значения [1, 2, 3, ...]
-    post_tag_ids = post.tags.values_list('id', flat=True)
-
-    # Берутся все посты, содержащие любой из этих тегов, за исключением
-    # текущего поста
-    similar_posts = Post.published.filter(tags__in=post_tag_ids
-    ).exclude(id=post.id)
-
-    # Применяется функция агрегирования Count. Её работа - генерировать
-    # вычисляемое поле - same_tags, которое содержит число тегов, общих
-    # со всеми запрошенными тегами. Результат упорядочивается по числу
-    # общих тегов (в убывающем порядке). Резульнат нарезается, чтобы
-    # получить только первые четыре поста
-    similar_posts = similar_posts.annotate(same_tags=Count('tags')
-    ).order_by('-same_tags', '-publish')[:4]
+    # Похожие посты предвычислены в таблице SimilarPost (см. blog.similarity)
+    # по сходству наборов тегов, поэтому выбираются одним запросом по индексу
+    # (post, -score). Связи упорядочены по убыванию сходства, а при равном
+    # сходстве - по дате публикации.
+    similar_posts = [
+        link.neighbor for link in SimilarPost.objects.filter(
+            post=post, neighbor__status=Post.Status.PUBLISHED
+        ).select_related('neighbor').order_by('-score', '-neighbor__publish')[:4]
+    ]
 
     # Контекстные переменные, чтобы прорисовать шаблон
     context = {
@@ -165,8 +196,9 @@ def post_share(request, post_id):
                 f'{cd['name']}\'s comments: {cd['comments']}'
             )
 
-            # Отправляем электронное письмо
-            send_mail(
+            # Ставим электронное письмо в очередь отправки. Письмо
+            # отправит команда send_queued_mail, не задерживая ответ
+            enqueue_mail(
                 subject=subject, # Тема
                 message=message, # Сообщение
                 from_email=settings.EMAIL_HOST_USER, # почта отправки сообщений
@@ -184,14 +216,53 @@ def post_share(request, post_id):
     return render(request=request, template_name=template, context=context)
 
 
+@public_page
+def post_comments(request, post_id):
+    """
+    Представление страницы комментариев поста после курсора (GET-параметр
+    cursor): фрагмент html для подгрузки на странице поста или JSON
+    (GET-параметр format=json). Страница кешируется до изменения
+    комментариев поста (см. blog.models.post_comments_changed)
+    """
+    post = get_object_or_404(Post.published.only('id'), id=post_id)
+
+    paginator = comment_paginator(post)
+    try:
+        comments = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        # Если курсор поврежден, то выдать первую страницу
+        comments = paginator.page()
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse(comment_page_json(post, comments))
+
+    context = {'post': post, 'comments': comments}
+
+    template = 'blog/post/includes/comments.html'
+
+    return render(request=request, template_name=template, context=context)
+
+
 @require_POST
 def post_comment(request, post_id):
     """ Представление для отиравки комментария """
 
+    # Частота комментариев ограничивается для ip-адреса клиента и для
+    # поста (см. blog.ratelimit) до обращения к базе данных, поэтому
+    # волна спама не создает нагрузку на основную базу данных
+    # Жетоны забираются, только если их хватает в обеих корзинах
+    retry_after = take_tokens([
+        (scope, identity, *settings.BLOG_COMMENT_RATE_LIMITS[scope])
+        for scope, identity in (('comment_ip', client_ip(request)), ('comment_post', post_id))
+    ])
+    if retry_after:
+        response = HttpResponse('Too many comments. Please try again later.', status=429)
+        response['Retry-After'] = math.ceil(retry_after)
+        return response
+
     post = get_object_or_404(
-        Post,
+        Post.published.only('id', 'title', 'slug', 'publish'),
         id=post_id,
-        status=Post.Status.PUBLISHED
     )
 
     comment =None
@@ -203,8 +274,9 @@ def post_comment(request, post_id):
         comment = form.save(commit=False)
         # Назначить пост комментарию
         comment.post = post
-        # Сохранить комментарий в базе данных
-        comment.save()
+        # Сохранить комментарий в базе данных (сразу или через буфер
+        # комментариев, см. blog.comments)
+        save_comment(comment)
 
     context = {'post': post, 'form': form, 'comment': comment}
 
@@ -213,6 +285,7 @@ def post_comment(request, post_id):
     return render(request=request, template_name=template, context=context)
 
 
+@public_page
 def post_search(request):
     """ Представление для поиска """
 
@@ -224,14 +297,45 @@ def post_search(request):
         form = SearchForm(request.GET)
         if form.is_valid():
             query = form.cleaned_data['query']
-            search_vector = SearchVector('title', weight='A') + SearchVector('body', weight='B')
-            search_query = SearchQuery(query)
-            results = Post.published.annotate(
-                search=search_vector, rank=SearchRank(search_vector, search_query)
-            ).filter(rank__gte=0.3).order_by('-rank')
-    
+            # Поисковый бэкенд (см. blog.search) возвращает идентификаторы
+            # постов по убыванию релевантности. Разбиваем их на страницы
+            # по 10 постов и загружаем только посты текущей страницы.
+            results = paginate_ids(request, search_posts(query), 10, Post.published.for_list())
+
     context = {'form': form, 'query': query, 'results': results}
 
     template = 'blog/post/search.html'
 
-    return render(request=request, template_name=template, context=context)
\ No newline at end of file
+    return render(request=request, template_name=template, context=context)
+
+
+@condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
+def post_feed(request, tag_slug=None):
+    """
+    Представление новостной ленты (общей или по тегу). Лента отдается
+    готовым XML из кеша, который сбрасывается при изменении ее постов
+    """
+    feed = load_feed(request, tag_slug)
+    return HttpResponse(feed['content'], content_type=feed['content_type'])
+
+
+@x_robots_tag
+@public_page
+def sitemap_index(request):
+    """ Представление индекса карты сайта с частями по месяцам публикации """
+    xml = render_index(site_url(request), sections_queryset())
+    return HttpResponse(xml, content_type='application/xml')
+
+
+@x_robots_tag
+@condition(etag_func=section_etag, last_modified_func=section_last_modified)
+def sitemap_section(request, year, month):
+    """
+    Представление части карты сайта за месяц. Часть передается потоком,
+    не загружая посты месяца в память, а неизменившаяся часть
+    отдается ответом 304 по времени последнего изменения ее постов
+    """
+    page = section_page(request, section_state(request, year, month)['count'])
+    rows = section_rows(year, month, page)
+    return StreamingHttpResponse(stream_urls(site_url(request), rows), content_type='application/xml')
+
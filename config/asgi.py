@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
+# Через ASGI публичные страницы блога по умолчанию обслуживаются
+# асинхронными представлениями (см. blog.async_views)
+os.environ.setdefault('BLOG_ASYNC_VIEWS', 'True')
+
 application = get_asgi_application()
+
+# Шаблоны блога прогреваются только в процессах сервера (см. blog.perf)
+from blog.perf import warm_templates_on_startup  # noqa: E402
+
+warm_templates_on_startup()
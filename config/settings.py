@@ -49,6 +49,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Метрики производительности запросов (см. blog.perf)
+    'blog.perf.performance_middleware',
+    # Чтение данных блога с реплик базы данных (см. blog.routers)
+    'blog.routers.replica_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,7 +66,8 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Бэкенд DjangoTemplates, учитывающий время прорисовки шаблонов
+        'BACKEND': 'blog.perf.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -71,6 +76,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'blog.http.csrf_token_placeholder',
             ],
         },
     },
@@ -82,24 +88,84 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# База данных задается переменными окружения (см. load_dotenv выше).
+# DB_ENGINE - sqlite3 (по умолчанию) или postgresql. Для SQLite DB_NAME
+# задает файл базы, а DB_REPLICAS - файлы реплик через запятую. Для
+# PostgreSQL параметры основного сервера задаются переменными PG_*,
+# а DB_REPLICAS - хосты реплик (host или host:port) через запятую.
+#
+# Реплики получают псевдонимы replica_1, replica_2, ... Чтение данных
+# блога в безопасных запросах направляется на реплики маршрутизатором
+# blog.routers.ReplicaRouter, запись и остальные запросы - на default.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite3')
+DB_REPLICAS = [replica.strip() for replica in os.getenv('DB_REPLICAS', '').split(',') if replica.strip()]
+
+# Постоянные соединения: время жизни соединения в секундах (0 - закрывать
+# после каждого запроса) и проверка соединения перед повторным использованием.
+# DB_POOL включает пул соединений PostgreSQL (требуется psycopg 3 с
+# дополнением pool), при этом постоянные соединения отключаются.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+
+
+def _database(**params) -> dict:
+    """ Возвращает настройки соединения с базой данных """
+    database = {'CONN_MAX_AGE': DB_CONN_MAX_AGE, 'CONN_HEALTH_CHECKS': True, **params}
+    if DB_ENGINE == 'postgresql':
+        database.update({
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('PG_NAME'),
+            'USER': os.getenv('PG_USER'),
+            'PASSWORD': os.getenv('PG_PASSWORD'),
+            'HOST': params.get('HOST', os.getenv('PG_HOST')),
+            'PORT': int(params.get('PORT', os.getenv('PG_PORT', 5432))),
+        })
+        if DB_POOL:
+            database['CONN_MAX_AGE'] = 0
+            database['OPTIONS'] = {
+                'pool': {'min_size': DB_POOL_MIN_SIZE, 'max_size': DB_POOL_MAX_SIZE}
+            }
+    else:
+        database.setdefault('NAME', os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'))
+        database['ENGINE'] = 'django.db.backends.sqlite3'
+    return database
+
+
+def _replica(address: str) -> dict:
+    """ Возвращает настройки соединения с репликой """
+    if DB_ENGINE == 'postgresql':
+        host, _, port = address.partition(':')
+        params = {'HOST': host, 'PORT': port} if port else {'HOST': host}
+    else:
+        params = {'NAME': address}
+    # В тестах реплика является зеркалом основной базы данных
+    return _database(**params, TEST={'MIRROR': 'default'})
+
+
 DATABASES = {
+    'default': _database(),
+    **{f'replica_{number}': _replica(address) for number, address in enumerate(DB_REPLICAS, 1)},
+}
+
+DATABASE_ROUTERS = ['blog.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# Бэкенд кеша задается переменными окружения, например:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://127.0.0.1:6379
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': os.getenv('PG_NAME'),
-#         'USER': os.getenv('PG_USER'),
-#         'PASSWORD': os.getenv('PG_PASSWORD'),
-#         'HOST': os.getenv('PG_HOST'),
-#         'PORT': int(os.getenv('PG_PORT')),
-#     }
-# }
-
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -149,3 +215,121 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_PASSWORD')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT'))
 EMAIL_USE_TLS = os.getenv('EMAIL_TLS', 'False') == 'True'
 EMAIL_USE_SSL = os.getenv('EMAIL_SSL', 'False') == 'True'
+
+# Настройки приложения blog
+
+# Размер LRU-кеша фильтра markdown для произвольного текста
+BLOG_MARKDOWN_CACHE_SIZE = int(os.getenv('BLOG_MARKDOWN_CACHE_SIZE', 256))
+
+# Число слов в отрывке поста, который выводится в списке постов
+BLOG_EXCERPT_WORDS = 30
+
+# Время жизни (в секундах) кешированных данных боковой панели
+BLOG_SIDEBAR_CACHE_TIMEOUT = int(os.getenv('BLOG_SIDEBAR_CACHE_TIMEOUT', 300))
+
+# Режим постраничной разбивки списка постов: 'keyset' - по курсору
+# на полях (publish, id) без COUNT(*) и OFFSET, 'offset' - классический
+# Paginator с номерами страниц
+BLOG_PAGINATION_MODE = os.getenv('BLOG_PAGINATION_MODE', 'keyset')
+
+# Поисковый бэкенд (путь к классу). Если не задан, то выбирается по
+# типу базы данных: полнотекстовый поиск PostgreSQL или индекс FTS5 SQLite
+BLOG_SEARCH_BACKEND = os.getenv('BLOG_SEARCH_BACKEND')
+
+# Максимальное число постов в результатах поиска
+BLOG_SEARCH_MAX_RESULTS = 1000
+
+# Число предвычисленных похожих постов для каждого поста
+BLOG_SIMILAR_POSTS = 4
+
+# Число наиболее похожих постов, списки которых пересчитываются при
+# изменении поста (см. blog.similarity.refresh_similar_posts)
+BLOG_SIMILAR_REFRESH_LIMIT = int(os.getenv('BLOG_SIMILAR_REFRESH_LIMIT', 200))
+
+# Время жизни (в секундах) закешированных публичных страниц блога.
+# Страницы также сбрасываются при изменении постов и комментариев
+BLOG_PAGE_CACHE_TIMEOUT = int(os.getenv('BLOG_PAGE_CACHE_TIMEOUT', 600))
+
+# Очередь писем: максимальное число попыток отправки, базовая задержка
+# (в секундах) перед повторной попыткой, удваиваемая после каждой неудачи,
+# и время (в секундах), на которое обработчик очереди резервирует письма
+BLOG_MAIL_MAX_ATTEMPTS = 5
+BLOG_MAIL_RETRY_DELAY = 60
+BLOG_MAIL_LEASE = 300
+
+# Обслуживать публичные страницы блога асинхронными представлениями
+# (blog.async_views). Включается по умолчанию в config/asgi.py
+BLOG_ASYNC_VIEWS = os.getenv('BLOG_ASYNC_VIEWS', 'False') == 'True'
+
+# Максимальное число url-адресов в одной части карты сайта
+# (ограничение протокола sitemaps.org - 50000)
+BLOG_SITEMAP_LIMIT = int(os.getenv('BLOG_SITEMAP_LIMIT', 50000))
+
+# Время жизни (в секундах) готового XML новостных лент. Ленты также
+# сбрасываются при изменении опубликованных постов
+BLOG_FEED_CACHE_TIMEOUT = int(os.getenv('BLOG_FEED_CACHE_TIMEOUT', 86400))
+
+# Метрики производительности запросов (blog.perf): заголовок Server-Timing
+# и доля запросов, записываемых в журнал blog.perf. Журнал пишется в файл
+# BLOG_PERF_LOG_FILE (если задан) и обрабатывается командой perf_report
+BLOG_PERF_SERVER_TIMING = os.getenv('BLOG_PERF_SERVER_TIMING', str(DEBUG)) == 'True'
+BLOG_PERF_LOG_FILE = os.getenv('BLOG_PERF_LOG_FILE')
+BLOG_PERF_LOG_SAMPLE_RATE = float(
+    os.getenv('BLOG_PERF_LOG_SAMPLE_RATE', 1.0 if BLOG_PERF_LOG_FILE else 0.0)
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'perf': {
+            'class': 'logging.FileHandler', 'filename': BLOG_PERF_LOG_FILE, 'formatter': 'message'
+        } if BLOG_PERF_LOG_FILE else {
+            'class': 'logging.StreamHandler', 'formatter': 'message'
+        },
+    },
+    'loggers': {
+        'blog.perf': {'handlers': ['perf'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Допустимая задержка репликации (в секундах). В течение этого времени
+# после POST-запроса клиента его чтение, а после любого изменения
+# содержимого блога - любое чтение выполняется с основной базы данных
+BLOG_REPLICA_STICKY_SECONDS = int(os.getenv('BLOG_REPLICA_STICKY_SECONDS', 10))
+
+# Ограничения частоты комментариев (token bucket): емкость корзины и
+# время (в секундах) ее полного наполнения для ip-адреса клиента и для поста
+BLOG_COMMENT_RATE_LIMITS = {
+    'comment_ip': (5, 60),
+    'comment_post': (30, 60),
+}
+
+# Буферизованная запись комментариев (см. blog.comments): комментарии
+# записываются одним INSERT раз в BLOG_COMMENT_FLUSH_INTERVAL секунд
+# или при накоплении BLOG_COMMENT_BUFFER_SIZE комментариев
+BLOG_COMMENT_BUFFER = os.getenv('BLOG_COMMENT_BUFFER', 'False') == 'True'
+BLOG_COMMENT_FLUSH_INTERVAL = float(os.getenv('BLOG_COMMENT_FLUSH_INTERVAL', 1.0))
+BLOG_COMMENT_BUFFER_SIZE = int(os.getenv('BLOG_COMMENT_BUFFER_SIZE', 100))
+
+# Число комментариев на странице комментариев поста. Первая страница
+# выводится на странице поста, следующие загружаются по запросу
+BLOG_COMMENTS_PER_PAGE = int(os.getenv('BLOG_COMMENTS_PER_PAGE', 50))
+
+# Число строк, до которого списки панели администратора считаются точно.
+# Число строк больших таблиц берется из статистики базы данных
+# (см. blog.pagination.EstimatedCountPaginator)
+BLOG_ADMIN_COUNT_LIMIT = int(os.getenv('BLOG_ADMIN_COUNT_LIMIT', 10000))
+
+# Режим списка постов панели администратора для больших таблиц: порядок
+# по индексу (status, -publish, -id), без навигации по иерархии дат
+# и без фильтра по дате создания
+BLOG_ADMIN_LARGE_TABLES = os.getenv('BLOG_ADMIN_LARGE_TABLES', 'False') == 'True'
+
+# Загрузка и компиляция шаблонов блога при запуске процесса сервера
+# (config/wsgi.py, config/asgi.py) в кеширующий загрузчик шаблонов, которым
+# Django оборачивает загрузчики по умолчанию (см. blog.perf.warm_templates)
+BLOG_TEMPLATE_WARMUP = os.getenv('BLOG_TEMPLATE_WARMUP', 'False') == 'True'
@@ -0,0 +1,23 @@
+"""
+Production settings for config project.
+
+Extends config.settings: disables DEBUG and enables template warmup at
+server startup. Django already wraps the default template loaders in the
+cached loader, so templates are compiled once per process. Select with
+DJANGO_SETTINGS_MODULE=config.settings_production.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+
+
+DEBUG = os.getenv('DEBUG', 'False') == 'True'
+
+ALLOWED_HOSTS = [host for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host]
+
+# Шаблоны блога загружаются в кеш при запуске процесса сервера
+# (см. config/wsgi.py и config/asgi.py)
+BLOG_TEMPLATE_WARMUP = os.getenv('BLOG_TEMPLATE_WARMUP', 'True') == 'True'
+
+# Значение по умолчанию зависит от DEBUG
+BLOG_PERF_SERVER_TIMING = os.getenv('BLOG_PERF_SERVER_TIMING', str(DEBUG)) == 'True'
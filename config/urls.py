@@ -14,16 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from django.contrib.sitemaps.views import sitemap
 
-from blog.sitemaps import PostSitemap
+from blog import async_views, views
 
 
-sitemaps = {
-    'posts': PostSitemap,
-}
+# Карта сайта обслуживается асинхронными представлениями так же,
+# как публичные страницы блога (см. blog.urls)
+sitemap_views = async_views if settings.BLOG_ASYNC_VIEWS else views
 
 
 urlpatterns = [
@@ -35,6 +35,9 @@ urlpatterns = [
     # включены в рамки пути 'blog/'. Эти шаблоны вставляются 
     # в рамки именованного простпанства namespace='blog'.
     path('blog/', include('blog.urls', namespace='blog')),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps},
-         name='django.contrib.sitemaps.views.sitemap'),
+
+    # Индекс карты сайта и ее части по месяцам публикации постов
+    path('sitemap.xml', sitemap_views.sitemap_index, name='sitemap_index'),
+    path('sitemap-<int:year>-<int:month>.xml', sitemap_views.sitemap_section,
+         name='sitemap_section'),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Шаблоны блога прогреваются только в процессах сервера (см. blog.perf)
+from blog.perf import warm_templates_on_startup  # noqa: E402
+
+warm_templates_on_startup()